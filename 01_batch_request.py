@@ -8,14 +8,16 @@ import copy
 from datetime import datetime
 import os
 from datetime import date
+import sys
+from dataset_cache import load_filtered_dataset
+from batch_shards import ShardWriter, MAX_REQUESTS_PER_FILE, MAX_BYTES_PER_FILE
+from response_cache import open_cache, split_cached, write_cached_responses
+from cost_forecast import forecast_batch, load_calibration, print_forecast, count_input_tokens
+from prompt_serialization import SERIALIZATIONS, serialize, compact_schema
 
 class NotInRangeError(Exception):
     pass
 
-def load_data(file_path):
-    """Load data from an Excel file."""
-    return pd.read_excel(file_path)
-
 def load_json(file_path):
     """Load JSON data from a file."""
     with open(file_path, "r") as f:
@@ -28,131 +30,101 @@ def load_prompt(prompt_file):
     
     return prompt
 
-def filter_data(data):
-    """Filter the data based on specific criteria."""
-    filtered_data = data[
-        ((data["Dataset"] == "Desar") & (data["Code"] == "g")) | 
-        ((data["Dataset"] == "Desar") & (data["Code"] == "c")) 
-    ]
-
-    filtered_data['UUID'] = filtered_data['Nummer'].astype(str) + '_' + filtered_data['Klas'].astype(str) + '_' + filtered_data['Tekstnaam'].astype(str)
-    
-    return filtered_data
-
-def group_data(data):
-    """Group data by 'Nummer', 'Klas', and 'Tekstnaam'."""
-    return data.groupby(["Nummer", "Klas", "Tekstnaam"])
-
-def create_student_responses(grouped_data):
-    """Create a dictionary of student responses."""
-    # Defining empty student response object. 
-    student_responses = {}
-    
-    # Looping through grouped data to fill student_responses
-    for (Nummer, Klas, Tekstnaam), group in grouped_data:
-        
-        # Setting unique ID, Class, and Text combination as Key
-        student_text_key = f"{Nummer}_{Klas}_{Tekstnaam}"
-        
-        # Saving Group as value in student_response
-        student_responses[student_text_key] = group
-    
-    return student_responses
-        
-def choose_settings():
-    # Defining potential settings to test
-    settings = {
-        # S1: Model Given = No, Model Created = No, Examples = 0
-        "V1.1_woTruth_0Examples_allUserPrompt": {
-            "Prompt": "base_prompt.txt",
-            "User_Prompt": "prompt_v1.1_woTruth_allUserPrompt.txt",
-            "Notes": "prompt_v1.1_woTruth_allUserPrompt_NOTES.txt",
-            "Truth": False,
-            "Examples": 0,
-            "Schema": "response_schema_v0.1.json"
-        },
-
-        # S2: Model Given = No, Model Created = No, Examples = 5
-        "V1.1_woTruth_5Examples_allUserPrompt": {
-            "Prompt": "base_prompt.txt",
-            "User_Prompt": "prompt_v1.1_woTruth_allUserPrompt.txt",
-            "Notes": "prompt_v1.1_woTruth_allUserPrompt_NOTES.txt",
-            "Truth": False,
-            "Examples": 5,
-            "Schema": "response_schema_v0.1.json"
-        },
-
-        # S3: Model Given = No, Model Created = No, Examples = 25
-        "V1.1_woTruth_25Examples_allUserPrompt": {
-            "Prompt": "base_prompt.txt",
-            "User_Prompt": "prompt_v1.1_woTruth_allUserPrompt.txt",
-            "Notes": "prompt_v1.1_woTruth_allUserPrompt_NOTES.txt",
-            "Truth": False,
-            "Examples": 25,
-            "Schema": "response_schema_v0.1.json"
-        },
-
-        # S4: Model Given = Yes, Model Created = No, Examples = 0
-        "V1.1_wTruth_0Examples_allUserPrompt": {
-            "Prompt": "base_prompt.txt",
-            "User_Prompt": "prompt_v1.1_wTruth_allUserPrompt.txt",
-            "Notes": "prompt_v1.1_woTruth_allUserPrompt_NOTES.txt",
-            "Truth": True,
-            "Examples": 0,
-            "Schema": "response_schema_v0.1.json"
-        },
-
-        # S5: Model Given = Yes, Model Created = No, Examples = 5
-        "V1.1_wTruth_5Examples_allUserPrompt": {
-            "Prompt": "base_prompt.txt",
-            "User_Prompt": "prompt_v1.1_wTruth_allUserPrompt.txt",
-            "Notes": "prompt_v1.1_woTruth_allUserPrompt_NOTES.txt",
-            "Truth": True,
-            "Examples": 5,
-            "Schema": "response_schema_v0.1.json"
-        },
-
-        # S6: Model Given = Yes, Model Created = No, Examples = 25
-        "V1.1_wTruth_25Examples_allUserPrompt": {
-            "Prompt": "base_prompt.txt",
-            "User_Prompt": "prompt_v1.1_wTruth_allUserPrompt.txt",
-            "Notes": "prompt_v1.1_woTruth_allUserPrompt_NOTES.txt",
-            "Truth": True,
-            "Examples": 25,
-            "Schema": "response_schema_v0.1.json"
-        },
-
-        # S7: Model Given = No, Model Created = Yes, Examples = 0
-        "V1.1_woTruth_0Examples_allUserPrompt_wDiagramCreation": {
-            "Prompt": "base_prompt.txt",
-            "User_Prompt": "prompt_v1.1_woTruth_allUserPrompt.txt",
-            "Notes": "prompt_v1.1_woTruth_allUserPrompt_NOTES.txt",
-            "Truth": False,
-            "Examples": 0,
-            "Schema": "response_schema_v0.1_wDiagramCreation.json"
-        },
-
-        # S8: Model Given = No, Model Created = Yes, Examples = 5
-        "V1.1_woTruth_5Examples_allUserPrompt_wDiagramCreation": {
-            "Prompt": "base_prompt.txt",
-            "User_Prompt": "prompt_v1.1_woTruth_allUserPrompt.txt",
-            "Notes": "prompt_v1.1_woTruth_allUserPrompt_NOTES.txt",
-            "Truth": False,
-            "Examples": 5,
-            "Schema": "response_schema_v0.1_wDiagramCreation.json"
-        },
-
-        # S9: Model Given = No, Model Created = Yes, Examples = 25
-        "V1.1_woTruth_25Examples_allUserPrompt_wDiagramCreation": {
-            "Prompt": "base_prompt.txt",
-            "User_Prompt": "prompt_v1.1_woTruth_allUserPrompt.txt",
-            "Notes": "prompt_v1.1_woTruth_allUserPrompt_NOTES.txt",
-            "Truth": False,
-            "Examples": 25,
-            "Schema": "response_schema_v0.1_wDiagramCreation.json"
-        }
+# Defining potential settings to test (shared by the interactive menu and the grid mode)
+SETTINGS = {
+    # S1: Model Given = No, Model Created = No, Examples = 0
+    "V1.1_woTruth_0Examples_allUserPrompt": {
+        "Prompt": "base_prompt.txt",
+        "User_Prompt": "prompt_v1.1_woTruth_allUserPrompt.txt",
+        "Notes": "prompt_v1.1_woTruth_allUserPrompt_NOTES.txt",
+        "Truth": False,
+        "Examples": 0,
+        "Schema": "response_schema_v0.1.json"
+    },
+
+    # S2: Model Given = No, Model Created = No, Examples = 5
+    "V1.1_woTruth_5Examples_allUserPrompt": {
+        "Prompt": "base_prompt.txt",
+        "User_Prompt": "prompt_v1.1_woTruth_allUserPrompt.txt",
+        "Notes": "prompt_v1.1_woTruth_allUserPrompt_NOTES.txt",
+        "Truth": False,
+        "Examples": 5,
+        "Schema": "response_schema_v0.1.json"
+    },
+
+    # S3: Model Given = No, Model Created = No, Examples = 25
+    "V1.1_woTruth_25Examples_allUserPrompt": {
+        "Prompt": "base_prompt.txt",
+        "User_Prompt": "prompt_v1.1_woTruth_allUserPrompt.txt",
+        "Notes": "prompt_v1.1_woTruth_allUserPrompt_NOTES.txt",
+        "Truth": False,
+        "Examples": 25,
+        "Schema": "response_schema_v0.1.json"
+    },
+
+    # S4: Model Given = Yes, Model Created = No, Examples = 0
+    "V1.1_wTruth_0Examples_allUserPrompt": {
+        "Prompt": "base_prompt.txt",
+        "User_Prompt": "prompt_v1.1_wTruth_allUserPrompt.txt",
+        "Notes": "prompt_v1.1_woTruth_allUserPrompt_NOTES.txt",
+        "Truth": True,
+        "Examples": 0,
+        "Schema": "response_schema_v0.1.json"
+    },
+
+    # S5: Model Given = Yes, Model Created = No, Examples = 5
+    "V1.1_wTruth_5Examples_allUserPrompt": {
+        "Prompt": "base_prompt.txt",
+        "User_Prompt": "prompt_v1.1_wTruth_allUserPrompt.txt",
+        "Notes": "prompt_v1.1_woTruth_allUserPrompt_NOTES.txt",
+        "Truth": True,
+        "Examples": 5,
+        "Schema": "response_schema_v0.1.json"
+    },
+
+    # S6: Model Given = Yes, Model Created = No, Examples = 25
+    "V1.1_wTruth_25Examples_allUserPrompt": {
+        "Prompt": "base_prompt.txt",
+        "User_Prompt": "prompt_v1.1_wTruth_allUserPrompt.txt",
+        "Notes": "prompt_v1.1_woTruth_allUserPrompt_NOTES.txt",
+        "Truth": True,
+        "Examples": 25,
+        "Schema": "response_schema_v0.1.json"
+    },
+
+    # S7: Model Given = No, Model Created = Yes, Examples = 0
+    "V1.1_woTruth_0Examples_allUserPrompt_wDiagramCreation": {
+        "Prompt": "base_prompt.txt",
+        "User_Prompt": "prompt_v1.1_woTruth_allUserPrompt.txt",
+        "Notes": "prompt_v1.1_woTruth_allUserPrompt_NOTES.txt",
+        "Truth": False,
+        "Examples": 0,
+        "Schema": "response_schema_v0.1_wDiagramCreation.json"
+    },
+
+    # S8: Model Given = No, Model Created = Yes, Examples = 5
+    "V1.1_woTruth_5Examples_allUserPrompt_wDiagramCreation": {
+        "Prompt": "base_prompt.txt",
+        "User_Prompt": "prompt_v1.1_woTruth_allUserPrompt.txt",
+        "Notes": "prompt_v1.1_woTruth_allUserPrompt_NOTES.txt",
+        "Truth": False,
+        "Examples": 5,
+        "Schema": "response_schema_v0.1_wDiagramCreation.json"
+    },
+
+    # S9: Model Given = No, Model Created = Yes, Examples = 25
+    "V1.1_woTruth_25Examples_allUserPrompt_wDiagramCreation": {
+        "Prompt": "base_prompt.txt",
+        "User_Prompt": "prompt_v1.1_woTruth_allUserPrompt.txt",
+        "Notes": "prompt_v1.1_woTruth_allUserPrompt_NOTES.txt",
+        "Truth": False,
+        "Examples": 25,
+        "Schema": "response_schema_v0.1_wDiagramCreation.json"
     }
+}
 
+def choose_settings():
+    settings = SETTINGS
 
     for idx, (key, value) in enumerate(settings.items()):
         print(f"{idx}: {key}")
@@ -179,9 +151,22 @@ def choose_settings():
             
     return list(settings.items())[value]
 
+# ADDED: gpt-5 and gpt-5-mini to the options
+MODELS = ["gpt-5", "gpt-5-mini", "gpt-4o-2024-08-06", "o4-mini-2025-04-16"]
+
+REASONING_EFFORTS = ("low", "medium", "high")
+
+# Memo of rendered example blocks: {(example key, Truth, serialization): "Input / Desired Output" block}, shared by all runs of a session
+EXAMPLE_BLOCKS = {}
+
+# Prompt layouts: "default" keeps the original order, "prefix_cache" orders content from most to least shared
+PROMPT_LAYOUTS = ("default", "prefix_cache")
+
+# Keys every grid spec must contain (all others have defaults)
+GRID_SPEC_REQUIRED = ("n",)
+
 def choose_model():
-    # ADDED: gpt-5 and gpt-5-mini to the options
-    models = ["gpt-5", "gpt-5-mini", "gpt-4o-2024-08-06", "o4-mini-2025-04-16"]
+    models = MODELS
 
     for idx, model in enumerate(models):
         print(f"{idx}: {model}")
@@ -198,8 +183,8 @@ def is_reasoning_model(model: str) -> bool:
 
 def select_random_responses(student_responses, n=1):
     """Select n random items from student responses."""
-    selected_responses = random.sample(list(student_responses.items()), n)
-    return dict(selected_responses)
+    selected_keys = random.sample(list(student_responses.keys()), n)
+    return {key: student_responses[key] for key in selected_keys}
 
 def load_text(text_name):
     with open(f"Texts/{text_name}.txt", "r") as f:
@@ -211,103 +196,157 @@ def get_original_text(text_name, model_diagrams):
     text = model_diagrams[text_name]["text"]
     return text
 
-def building_model_diagram(model_diagrams, text_name, setting, response):
-    model_diagram = copy.deepcopy(model_diagrams[text_name])
+def compile_diagram_templates(model_diagrams):
+    """Precompile the diagram structure per (text, Truth on/off): the model diagram without the original text and, without Truth, without the Truth keys of the boxes."""
+    diagram_templates = {}
+    for text_name, model_diagram in model_diagrams.items():
+        for truth in (True, False):
+            template = {}
+            for box, content in model_diagram.items():
+                if box == "text":
+                    continue
+                if not truth and box.startswith("Box_"):
+                    content = {field: value for field, value in content.items() if field != "Truth"}
+                template[box] = content
+            
+            diagram_templates[(text_name, truth)] = template
     
-    if "text" in model_diagram:
-        del model_diagram["text"]
-
-    if setting[1]["Truth"] == False:
-        try:
-            del model_diagram["Box_1"]["Truth"]
-            del model_diagram["Box_2"]["Truth"]
-            del model_diagram["Box_3"]["Truth"]  
-            del model_diagram["Box_4"]["Truth"]
-        except:
-            pass
+    return diagram_templates
 
-    for row in response.iterrows():
-        field = row[1]["Veld"]
-        field_number = row[1]["Veldnummer"]
+def fill_diagram_template(template, field_numbers, fields):
+    """Fill a diagram template with the student's answers (Veld) for the given boxes (Veldnummer)."""
+    model_diagram = {box: dict(content) for box, content in template.items()}
+    
+    for field_number, field in zip(field_numbers, fields):
         model_diagram[f"Box_{field_number}"]["Student Response"] = field
-        
+    
     return model_diagram
 
-def get_examples(key, filtered_data, setting, text_name, model_diagrams):
-    # Creating a df for potential examples to draw (by filtering out the diagrams selected for evaluation)
-    example_df = filtered_data[
-        (~filtered_data["UUID"].str.contains(key, case=False, na=False, regex=False)) & # this removes the diagram that is currently prepared from the list of potential examples
-        (filtered_data["Tekstnaam"]==text_name) # this makes sure that we are only getting examples of the same text as the target diagram
-    ]
+def build_model_diagrams(diagram_templates, filtered_data, truth, keys=None):
+    """Build the model diagrams with student responses for the given diagram keys (all diagrams if None) in one pass over the data."""
+    if keys is not None:
+        filtered_data = filtered_data[filtered_data["UUID"].isin(keys)]
+    
+    # Collecting the boxes and answers of every diagram from plain arrays (rows keep their order within a diagram)
+    diagram_fields = {}
+    for key, text_name, field_number, field in zip(filtered_data["UUID"].to_numpy(), filtered_data["Tekstnaam"].to_numpy(),
+                                                   filtered_data["Veldnummer"].to_numpy(), filtered_data["Veld"].to_numpy()):
+        if key not in diagram_fields:
+            diagram_fields[key] = (text_name, [], [])
+        diagram_fields[key][1].append(field_number)
+        diagram_fields[key][2].append(field)
+    
+    return {
+        key: fill_diagram_template(diagram_templates[(text_name, truth)], field_numbers, fields)
+        for key, (text_name, field_numbers, fields) in diagram_fields.items()
+    }
+
+def building_desired_response(response, response_template):
+    """Build the desired output (the human coding in response.json format) for an example diagram."""
+    model_response = copy.deepcopy(response_template)
     
-    ## Formatting and selecting n (from settings) examples
-    examples_grouped = group_data(example_df)
-    example_responses = create_student_responses(examples_grouped)
-    selected_examples = select_random_responses(student_responses=example_responses, n=setting[1]["Examples"])
-
-    ## For each selected example, build example input that will be sent to GPT
-    input_examples = []
-    model_responses = []
-    for example_key, selected_response in selected_examples.items():
+    ### Looping through selected response to fill in appropriate input from model response into desired response
+    for idx, row in response.iterrows():
         
-        # Building the example input for the current example
-        input_example = building_model_diagram(model_diagrams, text_name, setting, response=selected_response)
-        input_examples.append(input_example)
+        ### Getting human code from example
+        model_response[f'Box_{row["Veldnummer"]}']['Extraction'] = row["Code"]
+
+        ### Applying Position code to model response
+        if row["Code"] == "c":
+            model_response[f'Box_{row["Veldnummer"]}']["Position"] = 2
         
-        # Building desired response for current example
-        ## Loading model response
-        model_response = load_json("response.json")
+        elif row["Veldnummer"] == row["Verbandnummer"]:
+            model_response[f'Box_{row["Veldnummer"]}']["Position"] = 1
         
-        ### Looping through selected response to fill in appropriate input from model response into desired response
-        for idx, row in selected_response.iterrows():
-            
-            ### Getting human code from example
-            model_response[f'Box_{row["Veldnummer"]}']['Extraction'] = row["Code"]
+        elif row["Veldnummer"] != row["Verbandnummer"]:
+            model_response[f'Box_{row["Veldnummer"]}']["Position"] = 0
+        
+        else:
+            print(f"Something must have gone wrong in extracting the Position of {idx, row}")
+        
+        ### Applying Correct Position to Model Response
+        model_response[f'Box_{row["Veldnummer"]}']["Correct Position"] = row["Verbandnummer"]
+        
+    for i in range(1, 5):
+        if model_response[f"Box_{i}"]["Extraction"] == None:
+            model_response[f"Box_{i}"]["Extraction"] = "o"
+        
+        if model_response[f"Box_{i}"]["Position"] == None:
+            model_response[f"Box_{i}"]["Position"] = "9"
+        
+        if model_response[f"Box_{i}"]["Correct Position"] == None:
+            model_response[f"Box_{i}"]["Correct Position"] = "9"
 
-            ### Applying Position code to model response
-            if row["Code"] == "c":
-                model_response[f'Box_{row["Veldnummer"]}']["Position"] = 2
-            
-            elif row["Veldnummer"] == row["Verbandnummer"]:
-                model_response[f'Box_{row["Veldnummer"]}']["Position"] = 1
-            
-            elif row["Veldnummer"] != row["Verbandnummer"]:
-                model_response[f'Box_{row["Veldnummer"]}']["Position"] = 0
-            
-            else:
-                print(f"Something must have gone wrong in extracting the Position of {idx, row}")
-            
-            ### Applying Correct Position to Model Response
-            model_response[f'Box_{row["Veldnummer"]}']["Correct Position"] = row["Verbandnummer"]
-            
-        for i in range(1, 5):
-            if model_response[f"Box_{i}"]["Extraction"] == None:
-                model_response[f"Box_{i}"]["Extraction"] = "o"
-            
-            if model_response[f"Box_{i}"]["Position"] == None:
-                model_response[f"Box_{i}"]["Position"] = "9"
-            
-            if model_response[f"Box_{i}"]["Correct Position"] == None:
-                model_response[f"Box_{i}"]["Correct Position"] = "9"
+    return model_response
 
-                
-        model_responses.append(model_response)
+def build_example_index(student_responses):
+    """Index all diagrams per text together with their desired output, so examples can be drawn without rescanning the dataset.
+
+    Returns {Tekstnaam: {key: (student response, desired response)}}.
+    """
+    response_template = load_json("response.json")
+    
+    example_index = {}
+    for key, response in student_responses.items():
+        text_name = response["Tekstnaam"].iloc[0]
+        example_index.setdefault(text_name, {})[key] = (response, building_desired_response(response, response_template))
+    
+    return example_index
 
-    return input_examples, model_responses
+def draw_stable_example_keys(example_index, text_name, n_examples):
+    """Draw one example set per text that is reused for every target diagram of that text.
 
-def create_examples_for_prompt(model_inputs, model_responses):
-    """This function generates the Exampes that are part of the final promtp"""
-    examples = []
-    for input_idx, input in enumerate(model_inputs):
-        example = f"""## Example {input_idx+1}
+    One spare example is drawn, so the set still holds n examples when the target itself is part of it.
+    """
+    pool = list(example_index[text_name])
+    return random.sample(pool, min(n_examples + 1, len(pool)))
+
+def get_examples(key, example_index, setting, text_name, stable_keys=None):
+    # Potential examples are all diagrams of the same text as the target diagram, except the target diagram itself
+    if stable_keys is not None:
+        candidate_keys = [example_key for example_key in stable_keys if example_key != key]
+    else:
+        candidate_keys = [example_key for example_key in example_index[text_name] if example_key != key]
+    
+    ## A too small pool is an error, also for the stable set (never silently fewer examples than the setting asks for)
+    n_examples = setting[1]["Examples"]
+    if len(candidate_keys) < n_examples:
+        raise ValueError(f"Only {len(candidate_keys)} potential examples for {key} ({text_name}), setting {setting[0]} needs {n_examples}")
+
+    ## Selecting n (from settings) examples (the stable set is used as is, in its fixed order)
+    if stable_keys is not None:
+        selected_keys = candidate_keys[:n_examples]
+    else:
+        selected_keys = random.sample(candidate_keys, n_examples)
+
+    ## Taking the rendered example blocks from the memo (see render_example_blocks)
+    return [EXAMPLE_BLOCKS[(example_key, setting[1]["Truth"], serialization)] for example_key in selected_keys]
+
+def render_example_block(model_input, model_response):
+    """Render the "Input / Desired Output" part of one example."""
+    return f"""
         Input:
-        {input}
+        {serialize(model_input, serialization)}
         
         Desired Output:
-        {model_responses[input_idx]}
+        {serialize(model_response, serialization)}
         """
-        
-        examples.append(example)
+
+def render_example_blocks(example_index, diagram_templates, truth):
+    """Render the example block of every diagram in the example index once per Truth setting (and serialization) and keep it in EXAMPLE_BLOCKS."""
+    missing_keys = [key for examples in example_index.values() for key in examples if (key, truth, serialization) not in EXAMPLE_BLOCKS]
+    if not missing_keys:
+        return
+    
+    built_diagrams = build_model_diagrams(diagram_templates, filtered_data, truth, keys=missing_keys)
+    for examples in example_index.values():
+        for key, (_, desired_response) in examples.items():
+            if key in built_diagrams:
+                EXAMPLE_BLOCKS[(key, truth, serialization)] = render_example_block(built_diagrams[key], desired_response)
+
+def create_examples_for_prompt(example_blocks):
+    """This function generates the Exampes that are part of the final promtp"""
+    examples = [f"## Example {block_idx+1}" + block for block_idx, block in enumerate(example_blocks)]
         
     prompt_examples = "# Examples" + "\n" + "\n".join(examples)
 
@@ -342,34 +381,71 @@ def prep_batch(system_prompt, user_prompt, response_schema, key, model, reasonin
     return batch_request
 
 
+def prefix_cache_user_prompt(setting, text, input_for_prompt, examples_for_prompt=None):
+    """Put together the user prompt from most to least shared content, so the provider's automatic prefix caching can reuse it.
+
+    Instructions and notes are identical for every request, the original text and the stable examples
+    for every request of the same text, and only the target diagram at the end differs per request.
+    """
+    prompt_parts = []
+    if setting[1]["Prompt"] == "base_prompt.txt":
+        prompt_parts.append(load_prompt(setting[1]["User_Prompt"]))
+        prompt_parts.append(load_prompt(setting[1]["Notes"]))
+    
+    prompt_parts.append(f"# Original Text\n{text}")
+    
+    if examples_for_prompt is not None:
+        prompt_parts.append(examples_for_prompt)
+    
+    prompt_parts.append(input_for_prompt)
+    
+    return "\n\n".join(prompt_parts)
+
 def processing_responses(selected_diagrams):
     """This function puts together the user prompt and calls GPT for each selected diagram"""
     model_diagrams = load_json("model_diagrams.json")
+    diagram_templates = compile_diagram_templates(model_diagrams)
+    
+    # Building all target diagrams of this run at once, and rendering the example blocks (once per Truth setting)
+    built_diagrams = build_model_diagrams(diagram_templates, filtered_data, setting[1]["Truth"], keys=list(selected_diagrams))
+    if setting[1]["Examples"] > 0:
+        render_example_blocks(example_index, diagram_templates, setting[1]["Truth"])
     
     # Defining list to capture batch_requests    
     batch_requests = []
     
+    # With the prefix cache layout, requests of the same text are kept together and share one example set per text
+    diagrams = list(selected_diagrams.items())
+    stable_example_keys = {}
+    if prompt_layout == "prefix_cache":
+        diagrams.sort(key=lambda item: item[0].split("_", 2)[-1])
+    
     # Looping through selected diagrams to prepare prompt and call on GPT
-    for key, response in selected_diagrams.items():
+    for key, response in diagrams:
         # Getting original text for current student response
         text_name = key.split("_", 2)[-1]
         text = get_original_text(text_name, model_diagrams)
         
         # Building appropriate diagram structure and filling it with student responses
-        model_diagram_with_student_response = building_model_diagram(model_diagrams, text_name, setting, response)
+        model_diagram_with_student_response = built_diagrams[key]
 
-        input_for_prompt = f"#Input\n{model_diagram_with_student_response}"
+        input_for_prompt = f"#Input\n{serialize(model_diagram_with_student_response, serialization)}"
 
         
         # Putting tohether user prompt either with or without exampels       
         if setting[1]["Examples"] > 0:
-            # Get Model_Inputs and associated Model Responses
-            model_inputs, model_responses = get_examples(key=key, filtered_data=filtered_data, setting=setting, text_name=text_name, model_diagrams=model_diagrams)
+            if prompt_layout == "prefix_cache" and text_name not in stable_example_keys:
+                stable_example_keys[text_name] = draw_stable_example_keys(example_index, text_name, setting[1]["Examples"])
+            
+            # Get the rendered blocks (Input & Desired Output) of the selected examples
+            example_blocks = get_examples(key=key, example_index=example_index, setting=setting, text_name=text_name, stable_keys=stable_example_keys.get(text_name))
             
             # Creating Examples for final prompt
-            examples_for_prompt = create_examples_for_prompt(model_inputs=model_inputs, model_responses=model_responses)
+            examples_for_prompt = create_examples_for_prompt(example_blocks=example_blocks)
 
-            if setting[1]["Prompt"] == "base_prompt.txt":
+            if prompt_layout == "prefix_cache":
+                user_prompt = prefix_cache_user_prompt(setting, text, input_for_prompt, examples_for_prompt)
+            elif setting[1]["Prompt"] == "base_prompt.txt":
                 instructions = load_prompt(setting[1]["User_Prompt"])
                 notes = load_prompt(setting[1]["Notes"])
                 
@@ -379,7 +455,9 @@ def processing_responses(selected_diagrams):
                 user_prompt = f"# Original Text\n{text}\n\n" + input_for_prompt + "\n\n" + examples_for_prompt
         
         else:
-            if setting[1]["Prompt"] == "base_prompt.txt":
+            if prompt_layout == "prefix_cache":
+                user_prompt = prefix_cache_user_prompt(setting, text, input_for_prompt)
+            elif setting[1]["Prompt"] == "base_prompt.txt":
                 instructions = load_prompt(setting[1]["User_Prompt"])
                 notes = load_prompt(setting[1]["Notes"])
                 
@@ -420,62 +498,256 @@ def order_batch(batch_input_file, client, batch_file_name):
     
     return batch_info
 
-# Setting up OpenAI Client
+def load_grid_spec(spec_path):
+    """Load a grid specification (JSON) and expand it into the list of runs to build.
+
+    The spec lists the setting names (keys of SETTINGS or "all"), the models, the number of
+    diagrams n and optionally the reasoning effort (one value or a model -> effort dict),
+    a random seed and whether the batch files should be uploaded / ordered.
+    """
+    spec = load_json(spec_path)
+
+    # Checking required keys before anything else is resolved
+    missing = [key for key in GRID_SPEC_REQUIRED if key not in spec]
+    if missing:
+        raise ValueError(f"Grid spec {spec_path} is missing required key(s): {', '.join(missing)}")
+
+    # Resolving settings
+    setting_names = spec.get("settings", "all")
+    if setting_names == "all":
+        setting_names = list(SETTINGS.keys())
+    for setting_name in setting_names:
+        if setting_name not in SETTINGS:
+            raise ValueError(f"Unknown setting in grid spec: {setting_name}")
+
+    # Resolving models
+    models = spec.get("models", MODELS)
+    for grid_model in models:
+        if grid_model not in MODELS:
+            raise ValueError(f"Unknown model in grid spec: {grid_model}")
+
+    # Resolving reasoning effort per model (only used for reasoning models)
+    effort_spec = spec.get("reasoning_effort", "medium")
+    runs = []
+    for setting_name in setting_names:
+        for grid_model in models:
+            effort = None
+            if is_reasoning_model(grid_model):
+                effort = effort_spec.get(grid_model, "medium") if isinstance(effort_spec, dict) else effort_spec
+                if effort not in REASONING_EFFORTS:
+                    raise ValueError(f"Invalid reasoning effort for {grid_model}: {effort}")
+            runs.append(((setting_name, SETTINGS[setting_name]), grid_model, effort))
+
+    if spec.get("prompt_layout", "default") not in PROMPT_LAYOUTS:
+        raise ValueError(f"Unknown prompt layout in grid spec: {spec['prompt_layout']}")
+
+    if spec.get("serialization", "repr") not in SERIALIZATIONS:
+        raise ValueError(f"Unknown serialization in grid spec: {spec['serialization']}")
+
+    try:
+        n = int(spec["n"])
+    except (TypeError, ValueError):
+        raise ValueError(f"Grid spec 'n' must be a number of diagrams, got {spec['n']!r}")
+    if n < 1:
+        raise ValueError("Grid spec 'n' must be a positive number of diagrams")
+
+    return runs, spec
+
+def apply_response_cache(batch_file_name, batch_requests):
+    """Reuse cached responses for identical requests and return only the requests that still have to be sent."""
+    connection = open_cache()
+    misses, cached_records = split_cached(batch_requests, connection)
+    connection.close()
+    
+    write_cached_responses(batch_file_name, cached_records)
+    print(f"{len(cached_records)} of {len(batch_requests)} requests answered from the response cache")
+    
+    return misses
+
+def layout_tag(prompt_layout, serialization="repr"):
+    """Suffix added to the setting in the batch file name, so runs with a non-default layout / serialization stay distinguishable."""
+    tag = "_prefixCache" if prompt_layout == "prefix_cache" else ""
+    if serialization != "repr":
+        tag += f"_compact{serialization.capitalize()}"
+    return tag
+
+def load_response_schema(setting, serialization):
+    """Load the response schema of a setting (de-duplicated for the compact serializations)."""
+    response_schema = load_json(setting[1]["Schema"])
+    return response_schema if serialization == "repr" else compact_schema(response_schema)
+
+def measure_serialization(selected_diagrams):
+    """Build the requests of the current run in every serialization on the same diagrams and examples, and return the input tokens of each."""
+    global serialization, response_schema
+    random_state = random.getstate()
+    measured_serialization = serialization
+    
+    tokens = {}
+    for serialization in SERIALIZATIONS:
+        # Restoring the random state, so every serialization draws the same examples
+        random.setstate(random_state)
+        response_schema = load_response_schema(setting, serialization)
+        batch_requests = processing_responses(selected_diagrams=selected_diagrams)
+        tokens[serialization] = sum(count_input_tokens(request) for request in batch_requests)
+        tokens[f"{serialization} schema"] = count_input_tokens({"body": {"messages": [], "response_format": response_schema}})
+    
+    serialization = measured_serialization
+    return tokens
+
+def write_batch_file(batch_file_name, batch_requests, max_requests=MAX_REQUESTS_PER_FILE, max_bytes=MAX_BYTES_PER_FILE):
+    """Store the batch requests as jsonl shard(s) in 'Batch Input Files' and return the shard names."""
+    writer = ShardWriter(batch_file_name, max_requests=max_requests, max_bytes=max_bytes)
+    for request in batch_requests:
+        writer.write(request)
+    
+    return writer.close()
+
+# Setting up OpenAI Client (set OPENAI_BASE_URL, e.g. to the local mock server in mock_openai_server.py, to use another endpoint)
 client = OpenAI(
-    api_key="",     # paste your OpenAI API key here or set as environmental variable
-    project=""      # If you have a specific project defined via the OpenAI Platform or API, you can paste its ID here
+    api_key=os.environ.get("OPENAI_API_KEY"),     # paste your OpenAI API key here or set as environmental variable
+    project=None      # If you have a specific project defined via the OpenAI Platform or API, you can paste its ID here
 )
 
-# Loading data and creating a filtered dataset
+# Loading the filtered dataset and the student-class-text diagrams from the dataset cache
 file_path = "Data/20220704_student_answers_all_datasets.xlsx" # Exchange with the true path to data here
-data_raw = load_data(file_path)
-filtered_data = filter_data(data_raw)
+filtered_data, student_responses = load_filtered_dataset(file_path)
 
-# Grouping & randomly selecting student responses based on student-class-text diagram combination
-grouped_data = group_data(filtered_data)
-student_responses = create_student_responses(grouped_data)
+# Indexing potential examples per text once (shared by every request and run)
+example_index = build_example_index(student_responses)
 
-# Get settings to be tested from user
-setting = choose_settings()
-n = int(input("How many diagrams do you want to evaluate\n"))
-model = choose_model()
+today = date.today()
+formatted_date = today.strftime('%Y-%m-%d')
 
-# Ask for effort whenever a reasoning model is chosen (o-series or gpt-5 family).
-reasoning_effort = None
-if is_reasoning_model(model):
-    _eff = (input("Reasoning effort (low|medium|high) [medium]:\n") or "medium").strip().lower()
-    reasoning_effort = _eff if _eff in ("low", "medium", "high") else "medium"
+if len(sys.argv) > 1:
+    # Grid mode: `python 01_batch_request.py grid_spec.json` builds every setting x model of the spec in one pass;
+    # with `--runs-file <path>` the names of the written runs are stored in that file, one per line (used by batch_orchestrator.py)
+    runs, grid_spec = load_grid_spec(sys.argv[1])
+    runs_file = sys.argv[sys.argv.index("--runs-file") + 1] if "--runs-file" in sys.argv else None
+    written_runs = []
+    n = int(grid_spec["n"])
+    prompt_layout = grid_spec.get("prompt_layout", "default")
+    serialization = grid_spec.get("serialization", "repr")
+
+    if "seed" in grid_spec:
+        random.seed(grid_spec["seed"])
+
+    # Calibrating the token forecast once for all runs
+    calibration = load_calibration()
+
+    # The same random subset of n diagrams is coded in every run of the grid
+    selected_diagrams = select_random_responses(student_responses, n=n)
+    serialization_report = []
+
+    for setting, model, reasoning_effort in runs:
+        # Selecting correct System Prompt & Response Schema
+        system_prompt = load_prompt(setting[1]["Prompt"])
+        response_schema = load_response_schema(setting, serialization)
+
+        # Measurement mode: only report the input tokens of every serialization, nothing is written or uploaded
+        if grid_spec.get("measure_serialization", False):
+            tokens = measure_serialization(selected_diagrams)
+            serialization_report.append({"setting": setting[0], "model": model, "diagrams": n, **tokens})
+            print(f"{setting[0]} / {model}: " + ", ".join(
+                f"{name} {tokens[name]} ({round((1 - tokens[name] / tokens['repr']) * 100, 1)}% saved)" for name in SERIALIZATIONS
+            ))
+            continue
+
+        # Getting a list of batch requests
+        batch_requests = processing_responses(selected_diagrams=selected_diagrams)
+
+        batch_file_name = f"{formatted_date}_{setting[0]}{layout_tag(prompt_layout, serialization)}_{model}_n{n}"
+
+        # Only sending requests that are not in the response cache (if requested in the spec)
+        if grid_spec.get("use_response_cache", False):
+            batch_requests = apply_response_cache(batch_file_name, batch_requests)
+            if len(batch_requests) == 0:
+                # A manifest without shards: the orchestrator hands the run straight to processing
+                write_batch_file(batch_file_name, batch_requests)
+                print(f"{batch_file_name}: all requests were answered from the response cache, there is nothing to upload")
+                written_runs.append(batch_file_name)
+                continue
+
+        shard_names = write_batch_file(
+            batch_file_name, batch_requests,
+            max_requests=grid_spec.get("max_requests_per_shard", MAX_REQUESTS_PER_FILE),
+            max_bytes=grid_spec.get("max_bytes_per_shard", MAX_BYTES_PER_FILE)
+        )
+        print(f"Wrote: Batch Input Files/{batch_file_name}.jsonl ({len(batch_requests)} requests in {len(shard_names)} shard(s))")
+        print_forecast(forecast_batch(batch_requests, calibration=calibration))
+        written_runs.append(batch_file_name)
+
+        # Uploading Batch File(s) and Creating Batch Order(s) (only if requested in the spec)
+        if grid_spec.get("upload", False):
+            for shard_name in shard_names:
+                batch_input_file = upload_batch_file(file_name=shard_name, client=client)
+
+                if grid_spec.get("order", False):
+                    batch_info = order_batch(batch_input_file, client, shard_name)
+                    print(f"Ordered batch {batch_info.id} for {shard_name}")
+
+    if runs_file is not None:
+        with open(runs_file, "w") as f:
+            f.writelines(f"{run_name}\n" for run_name in written_runs)
+
+    if serialization_report:
+        os.makedirs("documentation", exist_ok=True)
+        pd.DataFrame(serialization_report).to_csv("documentation/serialization_token_report.csv", index=False)
+        print("Wrote: documentation/serialization_token_report.csv")
+
+else:
+    # Get settings to be tested from user
+    setting = choose_settings()
+    n = int(input("How many diagrams do you want to evaluate\n"))
+    model = choose_model()
+
+    # Ask for effort whenever a reasoning model is chosen (o-series or gpt-5 family).
+    reasoning_effort = None
+    if is_reasoning_model(model):
+        _eff = (input("Reasoning effort (low|medium|high) [medium]:\n") or "medium").strip().lower()
+        reasoning_effort = _eff if _eff in REASONING_EFFORTS else "medium"
 
-# Selecting correct System Prompt & Response Schema
-system_prompt = load_prompt(setting[1]["Prompt"])
-response_schema = load_json(setting[1]["Schema"])
+    _layout = (input("Prompt layout (default|prefix_cache) [default]:\n") or "default").strip().lower()
+    prompt_layout = _layout if _layout in PROMPT_LAYOUTS else "default"
 
-# Select a random subset of n diagrams
-selected_diagrams = select_random_responses(student_responses, n=n)
+    _serialization = (input("Serialization of diagrams & examples (repr|json|table) [repr]:\n") or "repr").strip().lower()
+    serialization = _serialization if _serialization in SERIALIZATIONS else "repr"
 
-# Getting a list of batch requests
-batch_requests = processing_responses(selected_diagrams=selected_diagrams)
+    use_response_cache = input("Do you want to reuse cached responses for identical requests (y/n)?\n") == "y"
 
-# Storing the batch requests as a jsonl file
-today = date.today()
-formatted_date = today.strftime('%Y-%m-%d')
+    # Selecting correct System Prompt & Response Schema
+    system_prompt = load_prompt(setting[1]["Prompt"])
+    response_schema = load_response_schema(setting, serialization)
 
-batch_file_name = f"{formatted_date}_{setting[0]}_{model}_n{n}"
+    # Select a random subset of n diagrams
+    selected_diagrams = select_random_responses(student_responses, n=n)
 
-with open(f"Batch Input Files/{batch_file_name}.jsonl", "w") as f:
-    for request in batch_requests:
-        json.dump(request, f)
-        f.write("\n")
-    
-    f.close()
-
-# Uploading Batch File and Creating Batch Order    
-upload_choice = input("Do you want to upload the batch file (y/n)?\n")
-print()
-if upload_choice == "y":
-    batch_input_file = upload_batch_file(file_name=batch_file_name, client=client)
-
-order_choice = input("Do you want to order the batch (y/n)?\n")
-print()
-if order_choice == "y":
-    batch_info = order_batch(batch_input_file, client, batch_file_name)
\ No newline at end of file
+    # Getting a list of batch requests
+    batch_requests = processing_responses(selected_diagrams=selected_diagrams)
+
+    # Storing the batch requests as a jsonl file (only the cache misses if cached responses are reused)
+    batch_file_name = f"{formatted_date}_{setting[0]}{layout_tag(prompt_layout, serialization)}_{model}_n{n}"
+    if use_response_cache:
+        batch_requests = apply_response_cache(batch_file_name, batch_requests)
+
+    if len(batch_requests) == 0:
+        print("All requests were answered from the response cache, there is nothing to upload.")
+    else:
+        shard_names = write_batch_file(batch_file_name, batch_requests)
+        if len(shard_names) > 1:
+            print(f"The batch was split into {len(shard_names)} shards to stay within the provider's file limits")
+
+        # Forecasting tokens & costs before anything is uploaded
+        print()
+        print_forecast(forecast_batch(batch_requests))
+
+        # Uploading Batch File and Creating Batch Order    
+        upload_choice = input("Do you want to upload the batch file (y/n)?\n")
+        print()
+        if upload_choice == "y":
+            batch_input_files = [upload_batch_file(file_name=shard_name, client=client) for shard_name in shard_names]
+
+        order_choice = input("Do you want to order the batch (y/n)?\n")
+        print()
+        if order_choice == "y":
+            for shard_name, batch_input_file in zip(shard_names, batch_input_files):
+                batch_info = order_batch(batch_input_file, client, shard_name)
@@ -1,38 +1,25 @@
+import os
 import pandas as pd
-import json
+import time
+import argparse
 from openai import OpenAI
+from batch_poller import list_batches, batches_by_status, wait_for_batches, batch_description
+from batch_download import download_batch
 
 
 ####################
 """Defining Functions"""
 
-def get_batches(client, limit=25):
-    """A function that allows the user to select which batch to download"""
+def get_batches(client, prefix="", created_after=None):
+    """Retrieve all batches (paging through the whole list), optionally only those whose description starts with prefix"""
     # Get batches
     print("\n####################\n")
-    print("Retrieving Latest Batches:")
-    batches = client.batches.list(limit=limit)
+    print("Retrieving Batches" + (f" starting with '{prefix}'" if prefix else "") + ":")
+    batches = list_batches(client, prefix=prefix, created_after=created_after)
+    print(f"{len(batches)} batches found\n")
 
     return batches
 
-def batches_by_status(batches):
-    # Separate into Active and Completed Batches
-    active_batches = []
-    complete_batches = []
-    failed_batches = []
-
-    for idx, batch in enumerate(batches.data):
-        if batch.status == "completed":
-            complete_batches.append(batch)
-        elif batch.status == "in_progress":
-            active_batches.append(batch)
-        elif batch.status == "failed":
-            failed_batches.append(batch)
-        else:
-            pass
-            
-    return active_batches, complete_batches, failed_batches
-
 def get_var_name(var):
     for name, value in locals().items():
         if value is var:
@@ -47,7 +34,7 @@ def show_batches(batch_list):
         print(f"{list_name}:")
         # List active batches
         for idx, batch in enumerate(batch_list):
-            print(f"{idx}: {batch.metadata["description"]}:")
+            print(f"{idx}: {batch_description(batch)}:")
             print(f"     Batch ID: {batch.id}")
             print(f"     Status: {batch.status}")
             
@@ -68,49 +55,56 @@ def get_batch_choices():
 def process_copmpleted_batches(batch_choices):
     for i in batch_choices:
         retrieved_batch = complete_batches[i]
-        batch_description = retrieved_batch.metadata["description"]
-        file_id = retrieved_batch.output_file_id
-        file_response = client.files.content(file_id)
-        
-        with open(f"Batch Response Files/{batch_description}.jsonl", "w") as f:
-            f.write(file_response.text)
-        
-        responses = []
-        for line in file_response.text.splitlines():
-            json_line = json.loads(line)
-            responses.append(json.loads(json_line["response"]["body"]["choices"][0]["message"]["content"]))
+        description = retrieved_batch.metadata["description"]
+
+        # Streaming output (and error) file to disk, see batch_download.py
+        downloads = download_batch(client, retrieved_batch, description)
+
+        for kind, download in downloads.items():
+            state = "already complete" if download["skipped"] else f"{round(download['bytes'] / 1024 / 1024, 1)} MB"
+            print(f"{description} ({kind}): {download['path']} ({state}, sha256 {download['sha256'][:12]})")
 
 
 ####################
 """Defining required variables and calling functions"""
 
+# Command line options, e.g. "python 02_batch_retrieve.py --prefix 2025-09-01_ --wait --all"
+parser = argparse.ArgumentParser(description="Retrieve finished OpenAI batches into 'Batch Response Files'.")
+parser.add_argument("--prefix", default="", help="only batches whose description (batch file name) starts with this prefix")
+parser.add_argument("--days", type=float, default=None, help="only batches created in the last n days")
+parser.add_argument("--wait", action="store_true", help="wait until all active batches are finished before downloading")
+parser.add_argument("--all", action="store_true", help="download all completed batches instead of choosing them by index")
+parser.add_argument("--base-url", default=None, help="e.g. a local mock server: http://127.0.0.1:8000/v1")
+args = parser.parse_args()
+
 # Defining OpenAI client
 client = OpenAI(
-    api_key="",     # paste your OpenAI API key here or set as environmental variable
-    project=""      # If you have a specific project defined via the OpenAI Platform or API, you can paste its ID here
+    api_key=os.environ.get("OPENAI_API_KEY"),     # paste your OpenAI API key here or set as environmental variable
+    project=None,     # If you have a specific project defined via the OpenAI Platform or API, you can paste its ID here
+    base_url=args.base_url  # (or OPENAI_BASE_URL), e.g. the local mock server in mock_openai_server.py
 )
 
-# Retrieving top n batches and split into active and completed batches
-batches = get_batches(client, limit = 25)
-
-"""
-for idx, batch in enumerate(batches):
-    if idx == 0:
-        print(batch.json())
-    else:
-        continue
-"""
+# Retrieving all (matching) batches and split into active, completed and failed batches
+created_after = time.time() - args.days * 86400 if args.days is not None else None
+batches = get_batches(client, prefix=args.prefix, created_after=created_after)
 
 active_batches, complete_batches, failed_batches = batches_by_status(batches=batches)
 
+# Waiting for the active batches to finish (polling with exponential backoff)
+if args.wait and len(active_batches) > 0:
+    print(f"Waiting for {len(active_batches)} active batches...")
+    finished = wait_for_batches(client, [batch.id for batch in active_batches])
+    batches = [finished.get(batch.id, batch) for batch in batches]
+    active_batches, complete_batches, failed_batches = batches_by_status(batches=batches)
+
 # Give user an overview of all batches
 show_batches(batch_list=active_batches)
 show_batches(batch_list=failed_batches)
 show_batches(batch_list=complete_batches)
 
-# Letting user choose what completed batches to process
+# Letting user choose what completed batches to process (or taking all of them)
 if len(complete_batches) > 0:
-    batch_choices = get_batch_choices()
+    batch_choices = list(range(len(complete_batches))) if args.all else get_batch_choices()
     process_copmpleted_batches(batch_choices)
 
 print()
@@ -1,225 +1,54 @@
-import json
 import pandas as pd
+from dataset_cache import load_filtered_dataset
+from batch_shards import run_name_from_file
+from batch_retry import load_request_schema, collect_failures, summarize_failures
+from response_parser import parse_response_file, columns_to_responses
+from cost_ledger import cost_ledger, cost_summary, cost_value, unpriced_models
+from comparison_table import creating_comparison_df
+from agreement_measures import binary_measures, grouped_agreement
+from bootstrap_ci import bootstrap_ci, add_confidence_intervals, N_REPLICATES
+from run_artifacts import write_run_artifacts, write_excel_report
+from results_warehouse import store_run
 
 """Defining Functions"""
 
 
-def load_batch_responses(file_name):
-    """A function that loads a specific batch response file and returns the llm response & used tokens"""
-    # Creating array to capture each response (one per line)
-    responses = {}
-    input_tokens = []
-    output_tokens = []
+def load_batch_responses(file_name, model=None):
+    """A function that loads a specific batch response file and returns the llm response & its cost ledger"""
+    # Parsing the file into columns (custom_id, status, box fields, usage), see response_parser.py; the response
+    # schema of the requests is used to recognise incomplete codings (see batch_retry.py)
+    columns = parse_response_file(f"Batch Response Files/{file_name}", schema=load_request_schema(file_name))
     
-    # Loading jsonl response file and looping through lines to add to responses array
-    with open(f"Batch Response Files/{file_name}", "r") as f:
-        for line in f:
-            json_line = json.loads(line)
-
-            key = json_line["custom_id"].replace("request-", "")
-            value = json.loads(json_line["response"]["body"]["choices"][0]["message"]["content"])
-            
-            input_token = json_line["response"]["body"]["usage"]["prompt_tokens"]
-            output_token = json_line["response"]["body"]["usage"]["completion_tokens"]
-            
-            responses[key] = value
-            
-            input_tokens.append(input_token)
-            output_tokens.append(output_token)
-    
-    return responses, input_tokens, output_tokens
-
-def token_sum(tokens):
-    """A function summing the tokens retrieved from the load_batch_responses function"""
-    # Setting up token sum counter
-    summed_tokens = 0
-    
-    # Looping through array of tokens derived from load_batch_function and adding each to summed_tokens counter
-    for token in tokens:
-        summed_tokens += token
-        
-    return summed_tokens
-
-def cost_calc(input, output, model):
-    """A function calculating the costs of the diagram analysis based on the model that was used"""
-    # Defining model costs based on https://openai.com/api/pricing/
-    models = {
-        "gpt-4o-2024-08-06": {
-            "input cost": 1.25,
-            "output cost": 5
-        },
-        "o4-mini-2025-04-16": {
-            "input cost": 0.55,
-            "output cost": 2.2
-        },
-        "gpt-5": {
-            "input cost": 0.625,
-            "output cost": 5
-        },
-        "gpt-5-mini": {
-            "input cost": 0.125,
-            "output cost": 1
-        }
-    }
-    
-    # Calculating costs by applying costs per 1M tokens
-    input_costs = models[model]["input cost"] * (input / 1000000)
-    output_costs = models[model]["output cost"] * (output / 1000000)
-    total_costs = input_costs + output_costs
-    
-    return input_costs, output_costs, total_costs
-
-def load_data(file_path="Data/20220704_student_answers_all_datasets.xlsx"): # Set path to data here
-    """Load data from an Excel file."""
-    return pd.read_excel(file_path)
-
-def filter_data(data):
-    """Filter the data based on specific criteria."""
-    filtered_data = data[
-        ((data["Dataset"] == "Desar") & (data["Code"] == "g")) | 
-        ((data["Dataset"] == "Desar") & (data["Code"] == "c")) 
-    ]
-
-    filtered_data['UUID'] = filtered_data['Nummer'].astype(str) + '_' + filtered_data['Klas'].astype(str) + '_' + filtered_data['Tekstnaam'].astype(str)
-    
-    return filtered_data
-
-def group_data(data):
-    """Group data by 'Nummer', 'Klas', and 'Tekstnaam'."""
-    return data.groupby(["Nummer", "Klas", "Tekstnaam"])
-
-def create_student_responses(grouped_data):
-    """Create a dictionary of student responses."""
-    # Defining empty student response object. 
-    student_responses = {}
-    
-    # Looping through grouped data to fill student_responses
-    for (Nummer, Klas, Tekstnaam), group in grouped_data:
-        
-        # Setting unique ID, Class, and Text combination as Key
-        student_text_key = f"{Nummer}_{Klas}_{Tekstnaam}"
-        
-        # Saving Group as value in student_response
-        student_responses[student_text_key] = group
-    
-    return student_responses
-
-def calculating_confusion_matrix(row, Code_Field, LLM_Code_Field, Agreement_Field, ConMat_Field, Correct, Incorrect):
-    if row[Code_Field] == Correct and row[LLM_Code_Field] == Correct:
-        row[Agreement_Field] = 1
-        row[ConMat_Field] = "TP"
-    elif row[Code_Field] == Correct and row[LLM_Code_Field] == Incorrect:
-        row[Agreement_Field] = 0
-        row[ConMat_Field] = "FN"
-    elif row[Code_Field] == Incorrect and row[LLM_Code_Field] == Correct:
-        row[Agreement_Field] = 0
-        row[ConMat_Field] = "FP"
-    elif row[Code_Field] == Incorrect and row[LLM_Code_Field] == Incorrect:
-        row[Agreement_Field] = 1
-        row[ConMat_Field] = "TN"
-
-def creating_comparison_df(responses, student_responses):
-    # Setting up rows to capture each row with original response and llm coding
-    rows = []
-
-    # Looping through llm responses to attach the llm coding to the right row 
-    for key, value in responses.items():
-        # Determining correct original responses for current llm coding
-        original_response = student_responses[key]
-        llm_response = value
-
-        # Looping through the rows of the current response to add the llm coding to the right field (i.e., row)
-        for row in original_response.iterrows():
-            content = row[1]
-            field_number = content["Veldnummer"]
-            
-            content["LLM_Code"] = llm_response[f"Box_{field_number}"]["Extraction"]
-            content["LLM_PositionCode"] = llm_response[f"Box_{field_number}"]["Position"]
-            content["LLM_CorrectPosition"] = llm_response[f"Box_{field_number}"]["Correct Position"]
-            rows.append(content)
-    
-    for row in rows:
-        # Adding columns for agreement (0, 1) and response categorisation (TP, TN, FP, FN)
-        calculating_confusion_matrix(row=row, Code_Field="Code", LLM_Code_Field="LLM_Code", Agreement_Field="Extraction Agreement", ConMat_Field="Extraction ConMat", Correct="g", Incorrect="c")
-        
-        # Adding columns for Position to compare coding between 
-        ## Adding PositionCode clolumn with boolean whether Veldnummer & Verbandnummer match
-        if row["Code"] == "c":
-            row["PositionCode"] = 2
-        elif row["Veldnummer"] == row["Verbandnummer"]:
-            row["PositionCode"] = 1
-        else:
-            row["PositionCode"] = 0
-        
-        ## Adding position Code Agreement
-        calculating_confusion_matrix(row=row, Code_Field="PositionCode", LLM_Code_Field="LLM_PositionCode", Agreement_Field="PositionCode Agreement", ConMat_Field="PositionCode ConMat", Correct=1, Incorrect=0)
-        
-        ## Adding CorrectPosition Agreemant
-        if row["Verbandnummer"] == row["LLM_CorrectPosition"]:
-            row["Position Agreement"] = 1
-        else:
-            row["Position Agreement"] = 0
-        
-            
-
-    return pd.DataFrame(rows) 
-
-
-def calculating_measures(comparison_df, ConMat_Field):
-    # Calculating Measures for Extraction
-    ## Getting Counts for Confusion Matrix
-    TP = comparison_df[ConMat_Field].value_counts().get("TP", 0)
-    FN = comparison_df[ConMat_Field].value_counts().get("FN", 0)
-    FP = comparison_df[ConMat_Field].value_counts().get("FP", 0)
-    TN = comparison_df[ConMat_Field].value_counts().get("TN", 0)
-    
-    ## Calculating Kappa
-    ### Calculating observed and expeted proportions
-    p_o = (TP+TN)/(TP+FN+FP+TN)
-
-    p_true = ((TP+FN)/(TP+FN+FP+TN))*((TP+FP)/(TP+FN+FP+TN))
-    p_false = ((FP+TN)/(TP+FN+FP+TN))*((FN+TN)/(TP+FN+FP+TN))
-    p_e = p_true + p_false
-
-    k = (p_o-p_e)/(1-p_e)
-
-    ## Calculating Accuracy
-    Acc = (TP+TN)/(TP+FN+FP+TN)
-    
-    ## Calculating Precision
-    Prec = (TP)/(TP+FP)
-    
-    ## Calculating Recall
-    Rec = (TP)/(TP+FN)
-    
-    ## Calculating F_1
-    F_1 = (2*(Prec*Rec))/(Prec+Rec)
+    # Only complete codings are compared, the failed requests of the run are collected by batch_retry.py
+    responses, _ = columns_to_responses(columns)
     
+    # Tokens and costs of every line (responses reused from the response cache were not paid for in this run, failed
+    # requests without usage neither), see cost_ledger.py; the model of the file name is used for lines without one
+    ledger = cost_ledger(columns, file_name, default_model=model)
     
-    # Calculating Accuracy for 
-
-    return k, Acc, Prec, Rec, F_1, TP, FN, FP, TN
-
+    return responses, ledger
 
 """Executing Code"""
-# Get filename for file to be processed and model name & number of diagrams for cost calc
+# Get filename for file to be processed and model name for lines without a model
 file_name = input("Please paste the name of the file you want to process:\n")
 llm_model = file_name.split("_")[-2:][0]
-n_diagrams = int(file_name.split("_")[-1:][0].replace(".jsonl", "").replace("n", ""))
 
-# Getting Batch Responses & tokens
-responses, input_tokens, output_tokens = load_batch_responses(file_name)
+# Getting Batch Responses & cost ledger
+responses, ledger = load_batch_responses(file_name, model=llm_model)
+# Failed lines, lines of the error files and requests without any response, exactly the requests batch_retry.py resubmits
+failures = collect_failures(run_name_from_file(file_name))
+if failures:
+    print(f"Warning: {len(failures)} failed requests ({summarize_failures(failures)}) are left out, resubmit them with: python batch_retry.py {run_name_from_file(file_name)}")
 
-# Calculating Costs
-summed_input_tokens = token_sum(tokens=input_tokens)
-summed_output_tokens = token_sum(tokens=output_tokens)
-input_costs, output_costs, total_costs = cost_calc(input=summed_input_tokens, output=summed_output_tokens, model=llm_model)
+# Calculating Costs (per diagram over the diagrams actually returned, see cost_ledger.py)
+costs = cost_summary(ledger)
+cache_hit_rate = costs["cached tokens"] / costs["input tokens"] if costs["input tokens"] != 0 else 0
+print(f"Cached input tokens: {costs['cached tokens']} of {costs['input tokens']} ({round(cache_hit_rate * 100, 1)}%)")
+if unpriced_models(ledger):
+    print(f"Warning: no price known for {', '.join(unpriced_models(ledger))}, costs are N/A (add it to PRICES in cost_ledger.py)")
 
-# Loading & Filtering & Group Original Dataset to create student responses
-data = load_data()
-filtered_data = filter_data(data)
-grouped_data = group_data(data = filtered_data)
-student_responses = create_student_responses(grouped_data=grouped_data)
+# Loading filtered Original Dataset & student responses from the dataset cache
+filtered_data, student_responses = load_filtered_dataset()
 
 # Integrating originl student responses with llm codings
 comparison_df = creating_comparison_df(responses, student_responses)
@@ -227,7 +56,7 @@ comparison_df = creating_comparison_df(responses, student_responses)
 
 # Calculating Measures
 ## For Extraction
-Kappa_Ext, Accuracy_Ext, Precision_Ext, Recall_Ext, F_1_Ext, TP_Ext, FN_Ext, FP_Ext, TN_Ext = calculating_measures(comparison_df=comparison_df, ConMat_Field="Extraction ConMat")
+Kappa_Ext, Accuracy_Ext, Precision_Ext, Recall_Ext, F_1_Ext, TP_Ext, FN_Ext, FP_Ext, TN_Ext = binary_measures(comparison_df, truth_field="Code", predicted_field="LLM_Code", positive="g", negative="c")
 
 ## For Position
 ### filtering Comparison DF to only include rows where human and AI agreed that extraction was correct
@@ -237,7 +66,11 @@ position_DF = comparison_df[
 ]
 
 ### Calculating Measures
-Kappa_Pos, Accuracy_Pos, Precision_Pos, Recall_Pos, F_1_Pos, TP_Pos, FN_Pos, FP_Pos, TN_Pos = calculating_measures(comparison_df=comparison_df, ConMat_Field="PositionCode ConMat")
+Kappa_Pos, Accuracy_Pos, Precision_Pos, Recall_Pos, F_1_Pos, TP_Pos, FN_Pos, FP_Pos, TN_Pos = binary_measures(comparison_df, truth_field="PositionCode", predicted_field="LLM_PositionCode", positive=1, negative=0)
+
+## Multi-class agreement on all codes (PositionCode 0/1/2/9, Correct Position 1-4/9), overall and per text and box (see agreement_measures.py)
+agreement_df = grouped_agreement(comparison_df, groupings=["Tekstnaam", "Veldnummer"])
+overall_agreement = agreement_df[agreement_df["Tekstnaam"].isna() & agreement_df["Veldnummer"].isna()].set_index("Field")
 
 # Preparing Measures DF to write it to documentation file
 measures_data = [
@@ -268,26 +101,50 @@ measures_data = [
     ("TN", TN_Pos),
     ("", ""),
     ("COSTS", ""),
-    ("Input", round(input_costs, 3)),
-    ("Output", round(output_costs, 3)),
-    ("Total", round(total_costs, 3)),
-    ("Per Diagram", round(total_costs / n_diagrams, 4))
+    ("Input", cost_value(costs["input cost"], 3)),
+    ("Output", cost_value(costs["output cost"], 3)),
+    ("Total", cost_value(costs["total cost"], 3)),
+    ("Per Diagram", cost_value(costs["cost per diagram"], 4)),
+    ("", ""),
+    ("PROMPT CACHE", ""),
+    ("Cached Input Tokens", costs["cached tokens"]),
+    ("Cache Hit Rate", round(cache_hit_rate, 3)),
+    ("", ""),
+    ("FAILED REQUESTS", ""),
+    ("Failed", len(failures)),
+    ("", ""),
+    ("MULTI-CLASS AGREEMENT", ""),
+    ("PositionCode Accuracy", round(overall_agreement.loc["PositionCode", "Accuracy"], 3)),
+    ("PositionCode Kappa", round(overall_agreement.loc["PositionCode", "Kappa"], 3)),
+    ("PositionCode Macro F_1", round(overall_agreement.loc["PositionCode", "Macro F_1"], 3)),
+    ("Correct Position Accuracy", round(overall_agreement.loc["Correct Position", "Accuracy"], 3)),
+    ("Correct Position Kappa", round(overall_agreement.loc["Correct Position", "Kappa"], 3)),
+    ("Correct Position Weighted Kappa", round(overall_agreement.loc["Correct Position", "Weighted Kappa"], 3)),
+    ("Correct Position Macro F_1", round(overall_agreement.loc["Correct Position", "Macro F_1"], 3)),
+    ("", ""),
+    ("COST BREAKDOWN", ""),
+    ("Cached Input", cost_value(costs["cached input cost"], 3)),
+    ("Reasoning Output", cost_value(costs["reasoning cost"], 3)),
+    ("Batch Discount", cost_value(costs["batch discount"], 3)),
+    ("Input Tokens", costs["input tokens"]),
+    ("Output Tokens", costs["output tokens"]),
+    ("Reasoning Tokens", costs["reasoning tokens"]),
+    ("Billed Requests", costs["billed requests"]),
+    ("Diagrams", costs["diagrams"]),
+    ("Pricing", costs["pricing"] or "N/A")
 ]
 
 # Create a DataFrame from the list of tuples
 measures_df = pd.DataFrame(measures_data, columns=["Measure", "Value"])
 
-# Reorder comparison_df for more logical variable order
-comparison_df = comparison_df[["Dataset", "UUID", "Veld", "Code", "LLM_Code", "Extraction Agreement", "Extraction ConMat", "Veldnummer", "Verbandnummer", "PositionCode", "LLM_PositionCode", "LLM_CorrectPosition","PositionCode Agreement","PositionCode ConMat", "Position Agreement"]]
-
-with pd.ExcelWriter(f"documentation/{file_name}.xlsx", engine="xlsxwriter") as writer:
-    measures_df.to_excel(writer, sheet_name="Measures", index=False)
-    comparison_df.to_excel(writer, sheet_name="Data", index=False)
-    
-    workbook = writer.book
-    measures_sheet = writer.sheets["Measures"]
-    data_sheet = writer.sheets["Data"]
-    
-    measures_sheet.autofit()
-    data_sheet.autofit()
-    data_sheet.set_column("C:C", 80)
\ No newline at end of file
+# Adding bootstrap confidence intervals (resampling whole diagrams) to the extraction and position measures (see bootstrap_ci.py)
+measures_df = add_confidence_intervals(measures_df, {
+    "EXTRACTION DATA": bootstrap_ci(comparison_df, truth_field="Code", predicted_field="LLM_Code", labels=["g", "c"], n_replicates=N_REPLICATES),
+    "POSITION DATA": bootstrap_ci(comparison_df, truth_field="PositionCode", predicted_field="LLM_PositionCode", labels=[1, 0], n_replicates=N_REPLICATES)
+})
+
+# Write the tables as Parquet and the Excel workbook of the file (see run_artifacts.py)
+write_run_artifacts(file_name, measures_df, comparison_df, agreement_df, ledger)
+# Replacing the rows of the run in the results warehouse queried by 05 and 06 (see results_warehouse.py)
+store_run(file_name, measures_df, comparison_df)
+print(f"Wrote: {write_excel_report(file_name)}")
@@ -1,308 +1,297 @@
-import json
+import io
 import os
+import sys
 import glob
+import argparse
+import contextlib
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
+from dataset_cache import load_filtered_dataset, cache_signature
+from batch_shards import run_name_from_file, load_manifest, is_cached_file, is_retry_file
+from batch_retry import load_request_schema, collect_failures, summarize_failures
+from response_parser import parse_response_file, columns_to_responses
+from cost_ledger import cost_ledger, cost_summary, cost_value, unpriced_models
+from comparison_table import creating_comparison_df
+from agreement_measures import binary_measures, grouped_agreement
+from response_cache import open_cache, store_responses
+from bootstrap_ci import bootstrap_ci, add_confidence_intervals, N_REPLICATES
+from run_artifacts import write_run_artifacts, write_excel_report, report_is_current
+from results_warehouse import store_run
+from processing_manifest import load_processing_manifest, save_processing_manifest, code_version, file_states, is_up_to_date, record_run, NO_VALID_CODINGS
 
 """Defining Functions"""
 
 
-def load_batch_responses(file_name):
-    """A function that loads a specific batch response file and returns the llm response & used tokens"""
-    # Creating array to capture each response (one per line)
-    responses = {}
-    input_tokens = []
-    output_tokens = []
+def load_batch_responses(file_name, model=None):
+    """A function that loads a specific batch response file and returns the llm response & its cost ledger"""
+    # Parsing the file into columns (custom_id, status, box fields, usage), see response_parser.py; the response
+    # schema of the requests is used to recognise incomplete codings (see batch_retry.py)
+    columns = parse_response_file(f"Batch Response Files/{file_name}", schema=load_request_schema(file_name))
     
-    # Loading jsonl response file and looping through lines to add to responses array
-    with open(f"Batch Response Files/{file_name}", "r") as f:
-        for line in f:
-            json_line = json.loads(line)
-
-            key = json_line["custom_id"].replace("request-", "")
-            value = json.loads(json_line["response"]["body"]["choices"][0]["message"]["content"])
-            
-            input_token = json_line["response"]["body"]["usage"]["prompt_tokens"]
-            output_token = json_line["response"]["body"]["usage"]["completion_tokens"]
-            
-            responses[key] = value
-            
-            input_tokens.append(input_token)
-            output_tokens.append(output_token)
+    # Only complete codings are compared, the failed requests of the run are collected by batch_retry.py
+    responses, _ = columns_to_responses(columns)
     
-    return responses, input_tokens, output_tokens
-
-def token_sum(tokens):
-    """A function summing the tokens retrieved from the load_batch_responses function"""
-    # Setting up token sum counter
-    summed_tokens = 0
+    # Tokens and costs of every line (responses reused from the response cache were not paid for in this run, failed
+    # requests without usage neither), see cost_ledger.py; the model of the file name is used for lines without one
+    ledger = cost_ledger(columns, file_name, default_model=model)
     
-    # Looping through array of tokens derived from load_batch_function and adding each to summed_tokens counter
-    for token in tokens:
-        summed_tokens += token
-        
-    return summed_tokens
-
-def cost_calc(input, output, model):
-    """A function calculating the costs of the diagram analysis based on the model that was used"""
-    # Defining model costs based on https://openai.com/api/pricing/
-    models = {
-        "gpt-4o-2024-08-06": {
-            "input cost": 1.25,
-            "output cost": 5
-        },
-        "o4-mini-2025-04-16": {
-            "input cost": 0.55,
-            "output cost": 2.2
-        },
-        "gpt-5": {
-            "input cost": 0.625,
-            "output cost": 5
-        },
-        "gpt-5-mini": {
-            "input cost": 0.125,
-            "output cost": 1
-        }
-    }
+    return responses, ledger
+
+def load_run_responses(shard_files, model=None):
+    """Load and merge the batch response files of all shards (and retries) that belong to one logical run"""
+    responses = {}
+    ledgers = []
     
-    # Calculating costs by applying costs per 1M tokens
-    input_costs = models[model]["input cost"] * (input / 1000000)
-    output_costs = models[model]["output cost"] * (output / 1000000)
-    total_costs = input_costs + output_costs
+    for shard_file in shard_files:
+        shard_responses, shard_ledger = load_batch_responses(shard_file, model=model)
+        responses.update(shard_responses)
+        ledgers.append(shard_ledger)
     
-    return input_costs, output_costs, total_costs
-
-def load_data(file_path="Data/20220704_student_answers_all_datasets.xlsx"): # Set path to data here
-    """Load data from an Excel file."""
-    return pd.read_excel(file_path)
+    return responses, pd.concat(ledgers, ignore_index=True)
+
+def process_run(run_name, shard_files, excel=False, bootstrap=N_REPLICATES):
+    """Compare the codings of one run with the original student responses and write its tables (and workbook) to documentation/"""
+    file_name = f"{run_name}.jsonl"
+    print(f"Processing: {file_name}" + (f" ({len(shard_files)} files)" if len(shard_files) > 1 else ""))
+
+    # Warning if not all shards of the run have been downloaded yet
+    fresh_files = [shard_file for shard_file in shard_files if not is_cached_file(shard_file)]
+    manifest = load_manifest(run_name)
+    downloaded_shards = [fresh_file for fresh_file in fresh_files if not is_retry_file(fresh_file)]
+    if manifest is not None and len(downloaded_shards) < len(manifest["shards"]):
+        print(f"Warning: only {len(downloaded_shards)} of {len(manifest['shards'])} shards of {run_name} found, measures cover the available shards only")
+
+    # Extract model name from file name (for response lines without a model)
+    llm_model = file_name.split("_")[-2:][0]
+
+    # Get Batch Responses & cost ledger
+    responses, ledger = load_run_responses(shard_files, model=llm_model)
+    # Failed lines of the output files, lines of the error files and requests without any response, exactly the
+    # requests batch_retry.py resubmits (failures that succeeded in a retry are left out)
+    failures = collect_failures(run_name)
+    if failures:
+        print(f"Warning: {len(failures)} failed requests ({summarize_failures(failures)}) are left out, resubmit them with: python batch_retry.py {run_name}")
+    if not responses:
+        print(f"No valid codings in {file_name}, skipped\n")
+        return None
+
+    # Calculating Costs (per diagram over the diagrams actually returned, see cost_ledger.py)
+    costs = cost_summary(ledger)
+    cache_hit_rate = costs["cached tokens"] / costs["input tokens"] if costs["input tokens"] != 0 else 0
+    print(f"Cached input tokens: {costs['cached tokens']} of {costs['input tokens']} ({round(cache_hit_rate * 100, 1)}%)")
+    if unpriced_models(ledger):
+        print(f"Warning: no price known for {', '.join(unpriced_models(ledger))}, costs are N/A (add it to PRICES in cost_ledger.py)")
+
+    # Integrating original student responses with llm codings
+    comparison_df = creating_comparison_df(responses, student_responses)
+
+    # Calculating Measures
+    ## For Extraction
+    Kappa_Ext, Accuracy_Ext, Precision_Ext, Recall_Ext, F_1_Ext, TP_Ext, FN_Ext, FP_Ext, TN_Ext = binary_measures(comparison_df, truth_field="Code", predicted_field="LLM_Code", positive="g", negative="c")
+
+    ## For Position
+    ### filtering Comparison DF to only include rows where human and AI agreed that extraction was correct
+    position_DF = comparison_df[
+        (comparison_df["Code"] == "g") &
+        (comparison_df["Extraction Agreement"] == 1)
+    ]
 
-def filter_data(data):
-    """Filter the data based on specific criteria."""
-    filtered_data = data[
-        ((data["Dataset"] == "Desar") & (data["Code"] == "g")) | 
-        ((data["Dataset"] == "Desar") & (data["Code"] == "c")) 
+    ### Calculating Measures (kept exactly as in your original code)
+    Kappa_Pos, Accuracy_Pos, Precision_Pos, Recall_Pos, F_1_Pos, TP_Pos, FN_Pos, FP_Pos, TN_Pos = binary_measures(comparison_df, truth_field="PositionCode", predicted_field="LLM_PositionCode", positive=1, negative=0)
+
+    ## Multi-class agreement on all codes (PositionCode 0/1/2/9, Correct Position 1-4/9), overall and per text and box (see agreement_measures.py)
+    agreement_df = grouped_agreement(comparison_df, groupings=["Tekstnaam", "Veldnummer"])
+    overall_agreement = agreement_df[agreement_df["Tekstnaam"].isna() & agreement_df["Veldnummer"].isna()].set_index("Field")
+
+    # Preparing Measures DF to write it to documentation file
+    measures_data = [
+        ("EXTRACTION DATA", ""),
+        ("Accuracy", round(Accuracy_Ext, 3)),
+        ("F_1", round(F_1_Ext, 3)),
+        ("Precision", round(Precision_Ext, 3)),
+        ("Recall", round(Recall_Ext, 3)),
+        ("ROC AUC", "N/A"),
+        ("Kappa H-H", "N/A"),
+        ("Kappa H-M", round(Kappa_Ext, 3)),
+        ("TP", TP_Ext),
+        ("FN", FN_Ext),
+        ("FP", FP_Ext),
+        ("TN", TN_Ext),
+        ("", ""),
+        ("POSITION DATA", ""),
+        ("Accuracy", round(Accuracy_Pos, 3)),
+        ("F_1", round(F_1_Pos, 3)),
+        ("Precision", round(Precision_Pos, 3)),
+        ("Recall", round(Recall_Pos, 3)),
+        ("ROC AUC", "N/A"),
+        ("Kappa H-H", "N/A"),
+        ("Kappa H-M", round(Kappa_Pos, 3)),
+        ("TP", TP_Pos),
+        ("FN", FN_Pos),
+        ("FP", FP_Pos),
+        ("TN", TN_Pos),
+        ("", ""),
+        ("COSTS", ""),
+        ("Input", cost_value(costs["input cost"], 3)),
+        ("Output", cost_value(costs["output cost"], 3)),
+        ("Total", cost_value(costs["total cost"], 3)),
+        ("Per Diagram", cost_value(costs["cost per diagram"], 4)),
+        ("", ""),
+        ("PROMPT CACHE", ""),
+        ("Cached Input Tokens", costs["cached tokens"]),
+        ("Cache Hit Rate", round(cache_hit_rate, 3)),
+        ("", ""),
+        ("FAILED REQUESTS", ""),
+        ("Failed", len(failures)),
+        ("", ""),
+        ("MULTI-CLASS AGREEMENT", ""),
+        ("PositionCode Accuracy", round(overall_agreement.loc["PositionCode", "Accuracy"], 3)),
+        ("PositionCode Kappa", round(overall_agreement.loc["PositionCode", "Kappa"], 3)),
+        ("PositionCode Macro F_1", round(overall_agreement.loc["PositionCode", "Macro F_1"], 3)),
+        ("Correct Position Accuracy", round(overall_agreement.loc["Correct Position", "Accuracy"], 3)),
+        ("Correct Position Kappa", round(overall_agreement.loc["Correct Position", "Kappa"], 3)),
+        ("Correct Position Weighted Kappa", round(overall_agreement.loc["Correct Position", "Weighted Kappa"], 3)),
+        ("Correct Position Macro F_1", round(overall_agreement.loc["Correct Position", "Macro F_1"], 3)),
+        ("", ""),
+        ("COST BREAKDOWN", ""),
+        ("Cached Input", cost_value(costs["cached input cost"], 3)),
+        ("Reasoning Output", cost_value(costs["reasoning cost"], 3)),
+        ("Batch Discount", cost_value(costs["batch discount"], 3)),
+        ("Input Tokens", costs["input tokens"]),
+        ("Output Tokens", costs["output tokens"]),
+        ("Reasoning Tokens", costs["reasoning tokens"]),
+        ("Billed Requests", costs["billed requests"]),
+        ("Diagrams", costs["diagrams"]),
+        ("Pricing", costs["pricing"] or "N/A")
     ]
 
-    filtered_data['UUID'] = filtered_data['Nummer'].astype(str) + '_' + filtered_data['Klas'].astype(str) + '_' + filtered_data['Tekstnaam'].astype(str)
-    
-    return filtered_data
+    # Create a DataFrame from the list of tuples
+    measures_df = pd.DataFrame(measures_data, columns=["Measure", "Value"])
 
-def group_data(data):
-    """Group data by 'Nummer', 'Klas', and 'Tekstnaam'."""
-    return data.groupby(["Nummer", "Klas", "Tekstnaam"])
+    # Adding bootstrap confidence intervals (resampling whole diagrams) to the extraction and position measures (see bootstrap_ci.py)
+    if bootstrap:
+        measures_df = add_confidence_intervals(measures_df, {
+            "EXTRACTION DATA": bootstrap_ci(comparison_df, truth_field="Code", predicted_field="LLM_Code", labels=["g", "c"], n_replicates=bootstrap),
+            "POSITION DATA": bootstrap_ci(comparison_df, truth_field="PositionCode", predicted_field="LLM_PositionCode", labels=[1, 0], n_replicates=bootstrap)
+        })
 
-def create_student_responses(grouped_data):
-    """Create a dictionary of student responses."""
-    # Defining empty student response object. 
-    student_responses = {}
-    
-    # Looping through grouped data to fill student_responses
-    for (Nummer, Klas, Tekstnaam), group in grouped_data:
-        # Setting unique ID, Class, and Text combination as Key
-        student_text_key = f"{Nummer}_{Klas}_{Tekstnaam}"
-        # Saving Group as value in student_response
-        student_responses[student_text_key] = group
-    
-    return student_responses
-
-def calculating_confusion_matrix(row, Code_Field, LLM_Code_Field, Agreement_Field, ConMat_Field, Correct, Incorrect):
-    if row[Code_Field] == Correct and row[LLM_Code_Field] == Correct:
-        row[Agreement_Field] = 1
-        row[ConMat_Field] = "TP"
-    elif row[Code_Field] == Correct and row[LLM_Code_Field] == Incorrect:
-        row[Agreement_Field] = 0
-        row[ConMat_Field] = "FN"
-    elif row[Code_Field] == Incorrect and row[LLM_Code_Field] == Correct:
-        row[Agreement_Field] = 0
-        row[ConMat_Field] = "FP"
-    elif row[Code_Field] == Incorrect and row[LLM_Code_Field] == Incorrect:
-        row[Agreement_Field] = 1
-        row[ConMat_Field] = "TN"
-
-def creating_comparison_df(responses, student_responses):
-    # Setting up rows to capture each row with original response and llm coding
-    rows = []
-
-    # Looping through llm responses to attach the llm coding to the right row 
-    for key, value in responses.items():
-        # Determining correct original responses for current llm coding
-        original_response = student_responses[key]
-        llm_response = value
-
-        # Looping through the rows of the current response to add the llm coding to the right field (i.e., row)
-        for row in original_response.iterrows():
-            content = row[1]
-            field_number = content["Veldnummer"]
-            
-            content["LLM_Code"] = llm_response[f"Box_{field_number}"]["Extraction"]
-            content["LLM_PositionCode"] = llm_response[f"Box_{field_number}"]["Position"]
-            content["LLM_CorrectPosition"] = llm_response[f"Box_{field_number}"]["Correct Position"]
-            rows.append(content)
-    
-    for row in rows:
-        # Adding columns for agreement (0, 1) and response categorisation (TP, TN, FP, FN)
-        calculating_confusion_matrix(row=row, Code_Field="Code", LLM_Code_Field="LLM_Code", Agreement_Field="Extraction Agreement", ConMat_Field="Extraction ConMat", Correct="g", Incorrect="c")
-        
-        # Adding columns for Position to compare coding between 
-        ## Adding PositionCode clolumn with boolean whether Veldnummer & Verbandnummer match
-        if row["Code"] == "c":
-            row["PositionCode"] = 2
-        elif row["Veldnummer"] == row["Verbandnummer"]:
-            row["PositionCode"] = 1
-        else:
-            row["PositionCode"] = 0
-        
-        ## Adding position Code Agreement
-        calculating_confusion_matrix(row=row, Code_Field="PositionCode", LLM_Code_Field="LLM_PositionCode", Agreement_Field="PositionCode Agreement", ConMat_Field="PositionCode ConMat", Correct=1, Incorrect=0)
-        
-        ## Adding CorrectPosition Agreemant
-        if row["Verbandnummer"] == row["LLM_CorrectPosition"]:
-            row["Position Agreement"] = 1
-        else:
-            row["Position Agreement"] = 0
-        
-    return pd.DataFrame(rows) 
-
-def calculating_measures(comparison_df, ConMat_Field):
-    # Calculating Measures for Extraction
-    ## Getting Counts for Confusion Matrix
-    TP = comparison_df[ConMat_Field].value_counts().get("TP", 0)
-    FN = comparison_df[ConMat_Field].value_counts().get("FN", 0)
-    FP = comparison_df[ConMat_Field].value_counts().get("FP", 0)
-    TN = comparison_df[ConMat_Field].value_counts().get("TN", 0)
-    
-    ## Calculating Kappa
-    ### Calculating observed and expeted proportions
-    p_o = (TP+TN)/(TP+FN+FP+TN) if (TP+FN+FP+TN) != 0 else 0
+    # Write the tables of the run as Parquet (see run_artifacts.py); the Excel workbook is an optional report
+    output_path = write_run_artifacts(file_name, measures_df, comparison_df, agreement_df, ledger)
+    # Replacing the rows of the run in the results warehouse queried by 05 and 06 (see results_warehouse.py)
+    store_run(file_name, measures_df, comparison_df)
+    print(f"Wrote: {output_path}")
+    if excel:
+        print(f"Wrote: {write_excel_report(file_name)}")
 
-    p_true = ((TP+FN)/(TP+FN+FP+TN))*((TP+FP)/(TP+FN+FP+TN)) if (TP+FN+FP+TN) != 0 else 0
-    p_false = ((FP+TN)/(TP+FN+FP+TN))*((FN+TN)/(TP+FN+FP+TN)) if (TP+FN+FP+TN) != 0 else 0
-    p_e = p_true + p_false
+    return output_path
 
-    k = (p_o-p_e)/(1-p_e) if (1-p_e) != 0 else 0
-
-    ## Calculating Accuracy
-    Acc = (TP+TN)/(TP+FN+FP+TN) if (TP+FN+FP+TN) != 0 else 0
-    
-    ## Calculating Precision
-    Prec = (TP)/(TP+FP) if (TP+FP) != 0 else 0
-    
-    ## Calculating Recall
-    Rec = (TP)/(TP+FN) if (TP+FN) != 0 else 0
-    
-    ## Calculating F_1
-    F_1 = (2*(Prec*Rec))/(Prec+Rec) if (Prec+Rec) != 0 else 0
-    
-    return k, Acc, Prec, Rec, F_1, TP, FN, FP, TN
+def process_run_captured(run):
+    """process_run() in a worker process, returning the printed messages so the main process prints them in run order"""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        output_path = process_run(*run)
+    return output_path, output.getvalue()
 
 
 """Executing Code (batch over folder)"""
 
+# Only processing the given runs, e.g. "python 03.2_batch_process_loop.py <run> <run>" (used by batch_orchestrator.py)
+parser = argparse.ArgumentParser(description="Process all new or changed batch response files (or the given runs) into workbooks in documentation/.")
+parser.add_argument("runs", nargs="*", help="run names or file names (default: all runs in Batch Response Files/)")
+parser.add_argument("--workers", type=int, default=1, help="number of worker processes (0 = one per CPU core)")
+parser.add_argument("--excel", action="store_true", help="also write the Excel workbook of every processed run, and of unchanged runs whose workbook is missing or outdated (otherwise: python run_artifacts.py)")
+parser.add_argument("--bootstrap", type=int, default=N_REPLICATES, help="bootstrap replicates of the confidence intervals (0 = no intervals)")
+parser.add_argument("--force", action="store_true", help="also reprocess runs that are unchanged since they were processed")
+parser.add_argument("--watch", type=float, nargs="?", const=30, default=None, metavar="SECONDS", help="keep running and process new response files as they land (checks every 30 s by default)")
+args = parser.parse_args()
+
 # Discover all .jsonl files in the batch folder
 BATCH_DIR = "Batch Response Files"
-jsonl_paths = sorted(glob.glob(os.path.join(BATCH_DIR, "*.jsonl")))
+
+# Files modified more recently are still being written (watch mode only)
+SETTLE_SECONDS = 5
 
 # Ensure output directory exists
 os.makedirs("documentation", exist_ok=True)
 
-# Load and prepare the original dataset once (shared across files)
-data = load_data()
-filtered_data = filter_data(data)
-grouped_data = group_data(data=filtered_data)
-student_responses = create_student_responses(grouped_data=grouped_data)
+# Load and prepare the original dataset once (shared across files, and inherited by forked worker processes)
+filtered_data, student_responses = load_filtered_dataset()
+dataset_signature = cache_signature()
 
-if not jsonl_paths:
-    print(f"No .jsonl files found in '{BATCH_DIR}'. Nothing to process.")
-else:
+while True:
+    jsonl_paths = sorted(glob.glob(os.path.join(BATCH_DIR, "*.jsonl")))
+    if not jsonl_paths and args.watch is None:
+        print(f"No .jsonl files found in '{BATCH_DIR}'. Nothing to process.")
+
+    # Grouping shard files of the same logical run, so every run is processed as one
+    runs = {}
     for jsonl_path in jsonl_paths:
-        file_name = os.path.basename(jsonl_path)
-        print(f"Processing: {file_name}")
-
-        # Extract model name and number of diagrams from file name
-        llm_model = file_name.split("_")[-2:][0]
-        n_diagrams = int(file_name.split("_")[-1:][0].replace(".jsonl", "").replace("n", ""))
-
-        # Get Batch Responses & tokens
-        responses, input_tokens, output_tokens = load_batch_responses(file_name)
-
-        # Calculating Costs
-        summed_input_tokens = token_sum(tokens=input_tokens)
-        summed_output_tokens = token_sum(tokens=output_tokens)
-        input_costs, output_costs, total_costs = cost_calc(input=summed_input_tokens, output=summed_output_tokens, model=llm_model)
-
-        # Integrating original student responses with llm codings
-        comparison_df = creating_comparison_df(responses, student_responses)
-
-        # Calculating Measures
-        ## For Extraction
-        Kappa_Ext, Accuracy_Ext, Precision_Ext, Recall_Ext, F_1_Ext, TP_Ext, FN_Ext, FP_Ext, TN_Ext = calculating_measures(comparison_df=comparison_df, ConMat_Field="Extraction ConMat")
-
-        ## For Position
-        ### filtering Comparison DF to only include rows where human and AI agreed that extraction was correct
-        position_DF = comparison_df[
-            (comparison_df["Code"] == "g") &
-            (comparison_df["Extraction Agreement"] == 1)
-        ]
-
-        ### Calculating Measures (kept exactly as in your original code)
-        Kappa_Pos, Accuracy_Pos, Precision_Pos, Recall_Pos, F_1_Pos, TP_Pos, FN_Pos, FP_Pos, TN_Pos = calculating_measures(comparison_df=comparison_df, ConMat_Field="PositionCode ConMat")
-
-        # Preparing Measures DF to write it to documentation file
-        measures_data = [
-            ("EXTRACTION DATA", ""),
-            ("Accuracy", round(Accuracy_Ext, 3)),
-            ("F_1", round(F_1_Ext, 3)),
-            ("Precision", round(Precision_Ext, 3)),
-            ("Recall", round(Recall_Ext, 3)),
-            ("ROC AUC", "N/A"),
-            ("Kappa H-H", "N/A"),
-            ("Kappa H-M", round(Kappa_Ext, 3)),
-            ("TP", TP_Ext),
-            ("FN", FN_Ext),
-            ("FP", FP_Ext),
-            ("TN", TN_Ext),
-            ("", ""),
-            ("POSITION DATA", ""),
-            ("Accuracy", round(Accuracy_Pos, 3)),
-            ("F_1", round(F_1_Pos, 3)),
-            ("Precision", round(Precision_Pos, 3)),
-            ("Recall", round(Recall_Pos, 3)),
-            ("ROC AUC", "N/A"),
-            ("Kappa H-H", "N/A"),
-            ("Kappa H-M", round(Kappa_Pos, 3)),
-            ("TP", TP_Pos),
-            ("FN", FN_Pos),
-            ("FP", FP_Pos),
-            ("TN", TN_Pos),
-            ("", ""),
-            ("COSTS", ""),
-            ("Input", round(input_costs, 3)),
-            ("Output", round(output_costs, 3)),
-            ("Total", round(total_costs, 3)),
-            ("Per Diagram", round(total_costs / n_diagrams, 4))
-        ]
-
-        # Create a DataFrame from the list of tuples
-        measures_df = pd.DataFrame(measures_data, columns=["Measure", "Value"])
-
-        # Reorder comparison_df for more logical variable order
-        comparison_df = comparison_df[[
-            "Dataset", "UUID", "Veld", "Code", "LLM_Code", "Extraction Agreement", "Extraction ConMat",
-            "Veldnummer", "Verbandnummer", "PositionCode", "LLM_PositionCode", "LLM_CorrectPosition",
-            "PositionCode Agreement","PositionCode ConMat", "Position Agreement"
-        ]]
-
-        # Write outputs per file
-        output_path = os.path.join("documentation", f"{file_name}.xlsx")
-        with pd.ExcelWriter(output_path, engine="xlsxwriter") as writer:
-            measures_df.to_excel(writer, sheet_name="Measures", index=False)
-            comparison_df.to_excel(writer, sheet_name="Data", index=False)
-            
-            workbook = writer.book
-            measures_sheet = writer.sheets["Measures"]
-            data_sheet = writer.sheets["Data"]
-            
-            measures_sheet.autofit()
-            data_sheet.autofit()
-            data_sheet.set_column("C:C", 80)
-
-        print(f"Wrote: {output_path}")
+        runs.setdefault(run_name_from_file(jsonl_path), []).append(os.path.basename(jsonl_path))
+
+    selected_runs = [run_name_from_file(run) for run in args.runs]
+    if selected_runs:
+        runs = {run_name: shard_files for run_name, shard_files in runs.items() if run_name in selected_runs}
+
+    if args.watch is not None:
+        runs = {
+            run_name: shard_files for run_name, shard_files in runs.items()
+            if all(time.time() - os.path.getmtime(os.path.join(BATCH_DIR, shard_file)) > SETTLE_SECONDS for shard_file in shard_files)
+        }
+
+    # Skipping runs whose response files, dataset, processing code and bootstrap replicates did not change since their tables were written (see processing_manifest.py)
+    processing_manifest = load_processing_manifest()
+    version = code_version()
+    states = {run_name: file_states(shard_files, (processing_manifest.get(run_name) or {}).get("files")) for run_name, shard_files in runs.items()}
+    if not args.force:
+        unchanged_runs = [run_name for run_name in runs if is_up_to_date(processing_manifest.get(run_name), states[run_name], dataset_signature, version, args.bootstrap)]
+        if unchanged_runs and args.watch is None:
+            print(f"{len(unchanged_runs)} unchanged runs skipped (--force reprocesses them)")
+        runs = {run_name: shard_files for run_name, shard_files in runs.items() if run_name not in unchanged_runs}
+
+        # Unchanged runs still get a workbook with --excel if theirs is missing or older than their tables
+        if args.excel:
+            for run_name in unchanged_runs:
+                if processing_manifest[run_name].get("status") != NO_VALID_CODINGS and not report_is_current(f"{run_name}.jsonl"):
+                    print(f"Wrote: {write_excel_report(f'{run_name}.jsonl')}")
+
+    if runs:
+        # Storing fresh responses in the response cache (see response_cache.py), so identical requests can be reused later;
+        # done here for all runs, as the cache is a single SQLite file
+        response_cache = open_cache()
+        for shard_files in runs.values():
+            for fresh_file in [shard_file for shard_file in shard_files if not is_cached_file(shard_file)]:
+                store_responses(fresh_file, response_cache)
+        response_cache.close()
+
+        workers = args.workers or os.cpu_count()
+        output_paths = {}
+        if workers > 1 and len(runs) > 1 and "fork" in multiprocessing.get_all_start_methods():
+            # Forked workers share student_responses with this process (copy-on-write) instead of receiving a pickled
+            # copy per run; every run writes its own tables and map() returns the results in run order
+            with ProcessPoolExecutor(max_workers=min(workers, len(runs)), mp_context=multiprocessing.get_context("fork")) as executor:
+                for run_name, (output_path, output) in zip(runs, executor.map(process_run_captured, [(run_name, shard_files, args.excel, args.bootstrap) for run_name, shard_files in runs.items()])):
+                    print(output, end="")
+                    output_paths[run_name] = output_path
+        else:
+            if workers > 1 and len(runs) > 1:
+                print("Parallel processing needs the 'fork' start method (not available on this platform), processing sequentially")
+            for run_name, shard_files in runs.items():
+                output_paths[run_name] = process_run(run_name, shard_files, excel=args.excel, bootstrap=args.bootstrap)
+
+        # Recording the processed runs; runs without valid codings are recorded without tables, so they are skipped until their inputs change
+        for run_name, output_path in output_paths.items():
+            record_run(processing_manifest, run_name, states[run_name], dataset_signature, version, output_path, args.bootstrap)
+        save_processing_manifest(processing_manifest)
+
+    if args.watch is None:
+        break
+
+    sys.stdout.flush()
+    time.sleep(args.watch)
+
+    # Reloading the dataset if the workbook changed (this also reprocesses all runs)
+    if cache_signature() != dataset_signature:
+        filtered_data, student_responses = load_filtered_dataset()
+        dataset_signature = cache_signature()
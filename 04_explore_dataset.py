@@ -1,14 +1,6 @@
 import pandas as pd
 import numpy as np
-
-def load_data(file_path):
-    """Load data from an Excel file."""
-    return pd.read_excel(file_path)
-
-def add_uuid(data):
-    data['UUID'] = data['Nummer'].astype(str) + '_' + data['Klas'].astype(str) + '_' + data['Tekstnaam'].astype(str)
-
-    return data
+from dataset_cache import load_dataset
 
 def add_participant_id(data):
     data['PID'] = data['Nummer'].astype(str) + '_' + data['Klas'].astype(str)
@@ -40,7 +32,8 @@ def filter_texts(data, text):
 
 def group_data(data):
     """Group data by 'Nummer', 'Klas', and 'Tekstnaam'."""
-    return data.groupby(["Nummer", "Klas", "Tekstnaam"])
+    # observed=True keeps the categorical columns of the cached dataset from producing empty combinations
+    return data.groupby(["Nummer", "Klas", "Tekstnaam"], observed=True)
 
 def create_student_responses(grouped_data):
     """Create a dictionary of student responses."""
@@ -75,10 +68,9 @@ def calculate_answer_lengths(data):
     
     return min(lengths), max(lengths), average_length, sd_length
 
-# Raw Dataset
-data = load_data("") # Paste path to data here
+# Raw Dataset (UUID is precomputed in the dataset cache)
+data = load_dataset("") # Paste path to data here
 data = add_participant_id(data=data)
-data = add_uuid(data=data)
 # Dataset filtered for fields that are good or fields that have an error of comission
 desar = filter_dataset(data=data)
 df_filtered = filter_responses(data=desar)
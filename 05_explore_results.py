@@ -1,88 +1,56 @@
 import pandas as pd
+from results_warehouse import measure_table
+
+# Overview columns and the (section, measure) of the Measures sheet they come from
+MEASURES = {
+    "Accuracy_E": ("EXTRACTION DATA", "Accuracy"),
+    "F_1_E": ("EXTRACTION DATA", "F_1"),
+    "Precision_E": ("EXTRACTION DATA", "Precision"),
+    "Recall_E": ("EXTRACTION DATA", "Recall"),
+    "Kappa H-M_E": ("EXTRACTION DATA", "Kappa H-M"),
+    "TP_E": ("EXTRACTION DATA", "TP"),
+    "FN_E": ("EXTRACTION DATA", "FN"),
+    "FP_E": ("EXTRACTION DATA", "FP"),
+    "TN_E": ("EXTRACTION DATA", "TN"),
+    "Accuracy_P": ("POSITION DATA", "Accuracy"),
+    "F_1_P": ("POSITION DATA", "F_1"),
+    "Precision_P": ("POSITION DATA", "Precision"),
+    "Recall_P": ("POSITION DATA", "Recall"),
+    "Kappa H-M_P": ("POSITION DATA", "Kappa H-M"),
+    "TP_P": ("POSITION DATA", "TP"),
+    "FN_P": ("POSITION DATA", "FN"),
+    "FP_P": ("POSITION DATA", "FP"),
+    "TN_P": ("POSITION DATA", "TN"),
+    "Input Cost": ("COSTS", "Input"),
+    "Output Cost": ("COSTS", "Output"),
+    "Total Cost": ("COSTS", "Total"),
+    "Cost per Diagram": ("COSTS", "Per Diagram")
+}
 
 
-def load_data(file_path):
-    """Load data from an Excel file."""
-    return pd.read_excel(file_path, sheet_name="Measures")
-
 def create_overview_data(settings):
+    """Overview of the given runs (all runs in the results warehouse if settings is empty), one query instead of a workbook per run."""
+    file_names = [setting.removesuffix(".xlsx") for setting in settings]
+    measures = measure_table(MEASURES, **({"file_name": file_names} if file_names else {}))
+    if file_names:
+        missing = sorted(set(file_names) - set(measures["file_name"]))
+        if missing:
+            raise ValueError(f"Not in the results warehouse (process them or run: python results_warehouse.py --import): {', '.join(missing)}")
+        # Keeping the order of settings
+        measures = measures.set_index("file_name").loc[file_names].reset_index()
+
     # Setup Dict to capture all data 
     overview_data = {
-        "setting": [],
-        "model": [],
-        "model diagram": [],
-        "diagram creation": [],
-        "examples": [],
-        "Accuracy_E": [],
-        "F_1_E": [],
-        "Precision_E": [],
-        "Recall_E": [],
-        "Kappa H-M_E": [],
-        "TP_E": [],
-        "FN_E": [],
-        "FP_E": [],
-        "TN_E": [],
-        "Accuracy_P": [],
-        "F_1_P": [],
-        "Precision_P": [],
-        "Recall_P": [],
-        "Kappa H-M_P": [],
-        "TP_P": [],
-        "FN_P": [],
-        "FP_P": [],
-        "TN_P": [],
-        "Input Cost": [],
-        "Output Cost": [],
-        "Total Cost": [],
-        "Cost per Diagram": []
+        "setting": [f"S {idx+1}" for idx in range(len(measures))],
+        "model": measures["model"].str.replace("gpt-", "").str.replace("-2024-07-18", "").str.replace("-2024-08-06", "").tolist(),
+        "model diagram": ["yes" if truth else "no" for truth in measures["truth"]],
+        "diagram creation": ["yes" if diagram_creation else "no" for diagram_creation in measures["diagram_creation"]],
+        "examples": measures["examples"].astype(str).tolist(),
+        "reasoning effort": measures["reasoning_effort"].fillna("n/a").tolist(),
     }
+    for column in MEASURES:
+        overview_data[column] = measures[column].tolist()
 
-    # Loop through files to extract relevant information
-    for idx, setting in enumerate(settings):
-        ## Load in Dataframe Measure Sheet
-        measures = load_data(file_path=f"documentation/{setting}")
-        
-        ## Extract Relevant Information in "Measures Sheet" and store in overview_data dict#
-        overview_data["diagram creation"].append("yes" if "wDiagramCreation" in setting else "no")
-        if "wDiagramCreation" in setting:
-            overview_data["model"].append(setting.split("_")[6].replace("gpt-", "").replace("-2024-07-18", "").replace("-2024-08-06", ""))
-            overview_data["model diagram"].append("yes" if setting.split("_")[2] == "wTruth" else "no")
-            overview_data["examples"].append(setting.split("_")[3].replace("Examples", ""))
-        else:
-            overview_data["model"].append(setting.split("_")[5].replace("gpt-", "").replace("-2024-07-18", "").replace("-2024-08-06", ""))
-            overview_data["model diagram"].append("yes" if setting.split("_")[2] == "wTruth" else "no")
-            overview_data["examples"].append(setting.split("_")[3].replace("Examples", ""))
-
-        overview_data["setting"].append(f"S {idx+1}")
-        
-        ### Extraction Data (E)
-        overview_data["Accuracy_E"].append(measures.iloc[1, 1])
-        overview_data["F_1_E"].append(measures.iloc[2, 1])
-        overview_data["Precision_E"].append(measures.iloc[3, 1])
-        overview_data["Recall_E"].append(measures.iloc[4, 1])
-        overview_data["Kappa H-M_E"].append(measures.iloc[7, 1])
-        overview_data["TP_E"].append(measures.iloc[8, 1])
-        overview_data["FN_E"].append(measures.iloc[9, 1])
-        overview_data["FP_E"].append(measures.iloc[10, 1])
-        overview_data["TN_E"].append(measures.iloc[11, 1])
-        
-        ### Position Data (P)
-        overview_data["Accuracy_P"].append(measures.iloc[14, 1])
-        overview_data["F_1_P"].append(measures.iloc[15, 1])
-        overview_data["Precision_P"].append(measures.iloc[16, 1])
-        overview_data["Recall_P"].append(measures.iloc[17, 1])
-        overview_data["Kappa H-M_P"].append(measures.iloc[20, 1])
-        overview_data["TP_P"].append(measures.iloc[21, 1])
-        overview_data["FN_P"].append(measures.iloc[22, 1])
-        overview_data["FP_P"].append(measures.iloc[23, 1])
-        overview_data["TN_P"].append(measures.iloc[24, 1])
-        
-        ### Cost
-        overview_data["Input Cost"].append(measures.iloc[27, 1])
-        overview_data["Output Cost"].append(measures.iloc[28, 1])
-        overview_data["Total Cost"].append(measures.iloc[29, 1])
-        overview_data["Cost per Diagram"].append(measures.iloc[30, 1])
-    
     return overview_data
     
 def append_averages(overview_data):
@@ -93,13 +61,13 @@ def append_averages(overview_data):
             overview_data["setting"].append("Avg.")
             continue
         
-        if key in ["model", "model diagram", "diagram creation", "examples"]:
+        if key in ["model", "model diagram", "diagram creation", "examples", "reasoning effort"]:
             overview_data[key].append("n/a")
             continue
         
-        # Calculate the average if the list is not empty
+        # Calculate the average if the list is not empty (measures without a number, e.g. costs of models without a known price, are NaN and left out)
         if overview_data[key]:
-            avg_value = sum(overview_data[key]) / len(overview_data[key])
+            avg_value = pd.Series(overview_data[key], dtype=float).mean()
         else:
             avg_value = 0  # Handle case where the list is empty
         
@@ -112,18 +80,12 @@ def append_averages(overview_data):
     return overview_data
 
 
-# Create selection of files to check
+# Create selection of files to check (empty: all runs in the results warehouse)
 settings = [
     # Results file names in "documentation" folder can be listed here    
 ]
 
 
-
-
-settings[7].split("_")
-
-
-
 # Getting Overview Data
 overview_data = create_overview_data(settings)
 
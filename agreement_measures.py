@@ -0,0 +1,186 @@
+"""Confusion matrices and agreement measures for any label set (used by 03.1 and 03.2).
+
+All matrices of a field are counted with a single np.bincount over (group, human code, LLM code), so
+measures for arbitrary groupings (text, box, strategy, model, ...) come from one pass over the rows.
+From the matrices follow accuracy, Cohen's kappa, per-class precision, recall and F1 and their macro and
+micro averages, and weighted kappa (linear or quadratic) for fields with an ordinal order. Every ratio with an empty denominator is 0,
+as in the original binary measures. Rows whose human or LLM code is not in the label set are left out
+(the matrices' total says how many rows were used).
+
+Usage (e.g. on the combined data of 06):
+    python agreement_measures.py r_analysis/data/combined_Data_with_strategy_and_model.xlsx --by Strategy "Model Used"
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+
+# Human code, LLM code, label set (the positive class of the binary measures first) and ordinal order of the
+# coded fields. Weighted kappa is only computed over an ordinal order: the boxes 1-4 of a diagram are ordered
+# (a neighbouring box is a smaller error), PositionCode (wrong/right position, incorrect extraction) and the
+# 9 code (no position) are nominal.
+FIELDS = {
+    "Extraction": ("Code", "LLM_Code", ["g", "c"], None),
+    "PositionCode": ("PositionCode", "LLM_PositionCode", [1, 0, 2, 9], None),
+    "Correct Position": ("Verbandnummer", "LLM_CorrectPosition", [1, 2, 3, 4, 9], [1, 2, 3, 4]),
+}
+
+
+def safe_divide(numerator, denominator):
+    """Element-wise numerator / denominator, 0 where the denominator is 0."""
+    numerator, denominator = np.broadcast_arrays(np.asarray(numerator, dtype=float), np.asarray(denominator, dtype=float))
+    return np.divide(numerator, denominator, out=np.zeros(numerator.shape), where=denominator != 0)
+
+def label_codes(values, labels):
+    """Position of every value in labels (-1 for values outside the label set, e.g. NaN)."""
+    return pd.Index(labels).get_indexer(np.asarray(values, dtype=object))
+
+def confusion_matrices(truth, predicted, labels, groups=None, n_groups=1):
+    """Confusion matrices (rows: human code, columns: LLM code) per group, shape (n_groups, k, k)."""
+    k = len(labels)
+    truth_codes = label_codes(truth, labels)
+    predicted_codes = label_codes(predicted, labels)
+    groups = np.zeros(len(truth_codes), dtype=np.int64) if groups is None else np.asarray(groups, dtype=np.int64)
+
+    valid = (truth_codes >= 0) & (predicted_codes >= 0) & (groups >= 0)
+    cells = (groups[valid] * k + truth_codes[valid]) * k + predicted_codes[valid]
+    return np.bincount(cells, minlength=n_groups * k * k).reshape(n_groups, k, k)
+
+def kappa_weights(k, weights=None):
+    """Disagreement weights of the cells: 0/1 (unweighted), |i - j| (linear) or (i - j)^2 (quadratic), scaled to 0..1."""
+    distance = np.abs(np.subtract.outer(np.arange(k), np.arange(k))).astype(float)
+    if weights is None:
+        return (distance > 0).astype(float)
+    if weights == "linear":
+        return distance / max(k - 1, 1)
+    if weights == "quadratic":
+        return distance ** 2 / max(k - 1, 1) ** 2
+    raise ValueError(f"Unknown kappa weights '{weights}' (use None, 'linear' or 'quadratic')")
+
+def kappa(matrices, weights=None):
+    """(Weighted) Cohen's kappa per matrix: 1 - observed / expected disagreement."""
+    matrices = np.asarray(matrices, dtype=float)
+    n = matrices.sum(axis=(-2, -1))
+    expected = safe_divide(matrices.sum(axis=-1)[..., :, None] * matrices.sum(axis=-2)[..., None, :], n[..., None, None])
+    w = kappa_weights(matrices.shape[-1], weights)
+
+    observed_disagreement = (w * matrices).sum(axis=(-2, -1))
+    expected_disagreement = (w * expected).sum(axis=(-2, -1))
+    return np.where(expected_disagreement != 0, 1 - safe_divide(observed_disagreement, expected_disagreement), 0.0)
+
+def matrix_measures(matrices):
+    """Measures of each matrix: arrays of shape (n_groups,) for the totals and (n_groups, k) per class."""
+    matrices = np.asarray(matrices)
+    n = matrices.sum(axis=(-2, -1))
+    correct = np.trace(matrices, axis1=-2, axis2=-1)
+    support = matrices.sum(axis=-1)
+    predicted = matrices.sum(axis=-2)
+    true_positives = np.diagonal(matrices, axis1=-2, axis2=-1)
+
+    precision = safe_divide(true_positives, predicted)
+    recall = safe_divide(true_positives, support)
+    f_1 = safe_divide(2 * precision * recall, precision + recall)
+
+    # Macro averages over the classes that occur in the human or LLM codes of a group
+    present = (support + predicted) > 0
+    n_present = present.sum(axis=-1)
+
+    micro_precision = safe_divide(true_positives.sum(axis=-1), predicted.sum(axis=-1))
+    micro_recall = safe_divide(true_positives.sum(axis=-1), support.sum(axis=-1))
+
+    return {
+        "n": n,
+        "Accuracy": safe_divide(correct, n),
+        "Kappa": kappa(matrices),
+        "Precision": precision,
+        "Recall": recall,
+        "F_1": f_1,
+        "Support": support,
+        "Macro Precision": safe_divide((precision * present).sum(axis=-1), n_present),
+        "Macro Recall": safe_divide((recall * present).sum(axis=-1), n_present),
+        "Macro F_1": safe_divide((f_1 * present).sum(axis=-1), n_present),
+        "Micro Precision": micro_precision,
+        "Micro Recall": micro_recall,
+        "Micro F_1": safe_divide(2 * micro_precision * micro_recall, micro_precision + micro_recall),
+    }
+
+def agreement_table(df, truth_field, predicted_field, labels, by=None, ordinal=None, weights="linear"):
+    """One row of measures (totals, averages and per class) per group of df (or for all rows if by is None),
+    with the weighted kappa over the ordinal order of the labels if there is one (other codes are left out)."""
+    by = [by] if isinstance(by, str) else list(by or [])
+    if by:
+        groups = df.groupby(by, observed=True, sort=True, dropna=False).ngroup().to_numpy()
+        # The grouping values of every group number (first row of each group)
+        first_rows = np.unique(groups, return_index=True)[1]
+        keys = df[by].iloc[first_rows].reset_index(drop=True)
+        n_groups = len(keys)
+    else:
+        groups, keys, n_groups = None, pd.DataFrame(index=[0]), 1
+
+    measures = matrix_measures(confusion_matrices(df[truth_field], df[predicted_field], labels, groups, n_groups))
+
+    table = keys.copy()
+    for name, values in measures.items():
+        if values.ndim == 1:
+            table[name] = values
+        if name == "Kappa":
+            # (empty for nominal fields)
+            table["Weighted Kappa"] = np.nan if ordinal is None else kappa(confusion_matrices(df[truth_field], df[predicted_field], ordinal, groups, n_groups), weights)
+    for index, label in enumerate(labels):
+        for name in ("Precision", "Recall", "F_1", "Support"):
+            table[f"{name} {label}"] = measures[name][:, index]
+
+    return table
+
+def field_agreement(df, by=None, fields=FIELDS, weights="linear"):
+    """agreement_table() of all coded fields, stacked with a "Field" column."""
+    tables = []
+    for field, (truth_field, predicted_field, labels, ordinal) in fields.items():
+        table = agreement_table(df, truth_field, predicted_field, labels, by=by, ordinal=ordinal, weights=weights)
+        table.insert(0, "Field", field)
+        tables.append(table)
+    return pd.concat(tables, ignore_index=True)
+
+def grouped_agreement(df, groupings, fields=FIELDS, weights="linear"):
+    """field_agreement() for all rows and for each grouping, stacked (grouping columns are empty in the other rows)."""
+    tables = [field_agreement(df, fields=fields, weights=weights)]
+    tables += [field_agreement(df, by=by, fields=fields, weights=weights) for by in groupings]
+    table = pd.concat(tables, ignore_index=True)
+
+    group_columns = list(dict.fromkeys(column for by in groupings for column in ([by] if isinstance(by, str) else by)))
+    return table[["Field", *group_columns, *[column for column in table.columns if column not in ["Field", *group_columns]]]]
+
+def binary_measures(comparison_df, truth_field, predicted_field, positive, negative):
+    """Kappa, accuracy, precision, recall, F1 and TP, FN, FP, TN of a binary code (rows with other codes are left out)."""
+    matrix = confusion_matrices(comparison_df[truth_field], comparison_df[predicted_field], [positive, negative])[0]
+    measures = matrix_measures(matrix[None])
+    (TP, FN), (FP, TN) = matrix.tolist()
+
+    return (
+        float(measures["Kappa"][0]), float(measures["Accuracy"][0]), float(measures["Precision"][0, 0]),
+        float(measures["Recall"][0, 0]), float(measures["F_1"][0, 0]), TP, FN, FP, TN
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Agreement measures per group for processed data (Data sheet of 03.x or the combined file of 06).")
+    parser.add_argument("file", help="Excel file with Code/LLM_Code, PositionCode/LLM_PositionCode and Verbandnummer/LLM_CorrectPosition columns")
+    parser.add_argument("--sheet", default=0, help="sheet to read (default: the first)")
+    parser.add_argument("--by", nargs="*", default=[], help="grouping columns, e.g. Strategy \"Model Used\" Tekst Veldnummer (Tekst is taken from the UUID)")
+    parser.add_argument("--weights", default="linear", choices=["linear", "quadratic"], help="weights of the weighted kappa (fields with an ordinal order only)")
+    parser.add_argument("--output", default=None, help="write the table to this .xlsx or .csv file")
+    args = parser.parse_args()
+
+    data = pd.read_excel(args.file, sheet_name=args.sheet)
+    if "Tekst" in args.by and "Tekst" not in data.columns:
+        data["Tekst"] = data["UUID"].str.split("_", n=2).str[2]
+
+    table = field_agreement(data, by=args.by, weights=args.weights)
+    if args.output is None:
+        with pd.option_context("display.max_rows", None, "display.max_columns", None, "display.width", 200):
+            print(table.round(3))
+    elif args.output.endswith(".csv"):
+        table.to_csv(args.output, index=False)
+    else:
+        table.to_excel(args.output, index=False)
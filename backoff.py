@@ -0,0 +1,24 @@
+"""Exponential backoff delays shared by realtime_executor.py (request retries) and batch_poller.py (polling rounds).
+
+The delay of attempt n is capped at max_delay and grows as base_delay * 2^n. Full jitter draws the delay
+uniformly from [0, cap], which spreads retries of many concurrent requests best but may come close to 0;
+equal jitter keeps half of the cap as a floor and only randomizes the other half, so a poller never
+asks again right away.
+"""
+import random
+
+
+JITTERS = ("full", "equal")
+
+
+def backoff_delay(attempt, base_delay, max_delay, retry_after=None, jitter="full"):
+    """Seconds to wait before the next attempt (or the server's Retry-After, if given)."""
+    if retry_after is not None:
+        return retry_after
+
+    cap = min(max_delay, base_delay * (2 ** attempt))
+    if jitter == "full":
+        return random.uniform(0, cap)
+    if jitter == "equal":
+        return cap / 2 + random.uniform(0, cap / 2)
+    raise ValueError(f"Unknown jitter '{jitter}' (use one of {', '.join(JITTERS)})")
@@ -0,0 +1,118 @@
+"""Streaming download of batch output and error files (used by 02_batch_retrieve.py and batch_orchestrator.py).
+
+Files are streamed to disk in chunks instead of being held in memory, written to '<file>.part' first and
+only renamed once the number of bytes matches the size the Files API reports. That size is the only check
+of the download itself: the Files API reports no checksum. The SHA-256 of every download is written next
+to it ('<file>.jsonl.sha256', sha256sum format) and guards the local copy: when the file is requested
+again it is only skipped if its size and its stored SHA-256 still match, a file that was changed or
+truncated on disk is downloaded again. iter_records() parses the lines of a file while it is streamed and
+yields them one by one, so memory stays constant regardless of the size of the batch.
+"""
+import os
+import json
+import hashlib
+
+
+RESPONSE_DIR = "Batch Response Files"
+ERROR_DIR = os.path.join(RESPONSE_DIR, "Errors")
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def checksum_path(path):
+    return f"{path}.sha256"
+
+def write_checksum(path, sha256):
+    with open(checksum_path(path), "w") as f:
+        f.write(f"{sha256}  {os.path.basename(path)}\n")
+
+def verified_sha256(path, expected_bytes):
+    """SHA-256 of a file that is on disk with the expected size and still matches its stored checksum, else None."""
+    if not os.path.exists(path) or not os.path.exists(checksum_path(path)):
+        return None
+    if expected_bytes is not None and os.path.getsize(path) != expected_bytes:
+        return None
+
+    with open(checksum_path(path), "r") as f:
+        stored_sha256 = f.read().split()[0]
+    sha256 = file_sha256(path)
+    if sha256 != stored_sha256:
+        print(f"Checksum of '{path}' does not match '{checksum_path(path)}', downloading it again")
+        return None
+    return sha256
+
+def download_file(client, file_id, path, chunk_size=CHUNK_SIZE):
+    """Stream a file of the Files API to disk and return its size and SHA-256 (skipped if it is already on disk, see verified_sha256())."""
+    expected_bytes = client.files.retrieve(file_id).bytes
+    sha256 = verified_sha256(path, expected_bytes)
+    if sha256 is not None:
+        return {"file_id": file_id, "path": path, "bytes": os.path.getsize(path), "sha256": sha256, "skipped": True}
+
+    sha256 = hashlib.sha256()
+    size = 0
+    with client.files.with_streaming_response.content(file_id) as response:
+        with open(f"{path}.part", "wb") as f:
+            for chunk in response.iter_bytes(chunk_size):
+                f.write(chunk)
+                sha256.update(chunk)
+                size += len(chunk)
+
+    if expected_bytes is not None and size != expected_bytes:
+        raise IOError(f"Incomplete download of {file_id}: {size} of {expected_bytes} bytes, '{path}.part' is kept for inspection")
+
+    os.replace(f"{path}.part", path)
+    write_checksum(path, sha256.hexdigest())
+
+    return {"file_id": file_id, "path": path, "bytes": size, "sha256": sha256.hexdigest(), "skipped": False}
+
+def iter_records(client, file_id, path=None, chunk_size=CHUNK_SIZE):
+    """Yield the JSON lines of a file of the Files API while it is streamed, so memory stays constant (and write
+    the file to path with its checksum, if given; only once all records were consumed and its size is complete)."""
+    expected_bytes = client.files.retrieve(file_id).bytes
+    f = open(f"{path}.part", "wb") if path is not None else None
+    sha256 = hashlib.sha256()
+    size = 0
+    rest = b""
+    try:
+        with client.files.with_streaming_response.content(file_id) as response:
+            for chunk in response.iter_bytes(chunk_size):
+                if f is not None:
+                    f.write(chunk)
+                sha256.update(chunk)
+                size += len(chunk)
+
+                # Complete lines of the chunk (the last, incomplete one waits for the next chunk)
+                lines = (rest + chunk).split(b"\n")
+                rest = lines.pop()
+                for line in lines:
+                    if line.strip():
+                        yield json.loads(line)
+        if rest.strip():
+            yield json.loads(rest)
+    finally:
+        if f is not None:
+            f.close()
+
+    if expected_bytes is not None and size != expected_bytes:
+        raise IOError(f"Incomplete download of {file_id}: {size} of {expected_bytes} bytes")
+    if path is not None:
+        os.replace(f"{path}.part", path)
+        write_checksum(path, sha256.hexdigest())
+
+def download_batch(client, batch, name, response_dir=RESPONSE_DIR, error_dir=ERROR_DIR):
+    """Download the output file (and the error file, if there is one) of a completed batch as '<name>.jsonl'."""
+    downloads = {}
+    if batch.output_file_id is not None:
+        downloads["output"] = download_file(client, batch.output_file_id, os.path.join(response_dir, f"{name}.jsonl"))
+    if batch.error_file_id is not None:
+        os.makedirs(error_dir, exist_ok=True)
+        downloads["error"] = download_file(client, batch.error_file_id, os.path.join(error_dir, f"{name}.jsonl"))
+
+    return downloads
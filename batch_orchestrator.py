@@ -0,0 +1,257 @@
+"""End-to-end batch orchestrator: build -> upload -> order -> poll -> download -> process.
+
+Runs the steps of 01_batch_request.py, 02_batch_retrieve.py and 03.2_batch_process_loop.py for many runs
+at once and records everything in the job ledger (see job_ledger.py), so it can be stopped and restarted
+at any time. In-flight batches are polled concurrently, and every run whose shards are all downloaded is
+handed to 03.2 right away.
+
+Usage:
+    python batch_orchestrator.py --spec grid_spec.json      build the runs of a grid spec with 01 and see them through
+    python batch_orchestrator.py --register <run> [<run>]   add runs that were already written to Batch Input Files
+    python batch_orchestrator.py                            resume all unfinished runs of the ledger
+    python batch_orchestrator.py --status                   print the ledger
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from openai import OpenAI
+
+from batch_shards import INPUT_DIR, load_manifest, is_retry_file
+from batch_retry import collect_failures, write_retry_file, summarize_failures, run_files
+from batch_poller import list_batches
+from batch_download import download_batch, RESPONSE_DIR, ERROR_DIR
+from processing_manifest import load_processing_manifest, file_states, has_same_files, NO_VALID_CODINGS
+from job_ledger import open_ledger, register_run, add_shard, update_shard, update_run, add_attempt, shards_with_status, runs_with_status, run_shards, print_ledger, IN_FLIGHT_STATUSES
+
+
+# 03.2 is run this often for a run before it is marked as failed
+MAX_PROCESSING_ATTEMPTS = 3
+
+
+def build_runs(spec_path):
+    """Write the batch input files of a grid spec with 01 (without uploading) and return the names of the new runs."""
+    with open(spec_path, "r") as f:
+        spec = json.load(f)
+
+    # Uploading and ordering is done by the orchestrator
+    spec["upload"] = False
+    spec["order"] = False
+    spec.pop("measure_serialization", None)
+
+    spec_file, temporary_spec_path = tempfile.mkstemp(suffix=".json")
+    with os.fdopen(spec_file, "w") as f:
+        json.dump(spec, f)
+
+    # 01 writes the names of the runs it built to this file
+    runs_file, runs_file_path = tempfile.mkstemp(suffix=".txt")
+    os.close(runs_file)
+    try:
+        subprocess.run([sys.executable, "01_batch_request.py", temporary_spec_path, "--runs-file", runs_file_path], check=True)
+        with open(runs_file_path, "r") as f:
+            run_names = [line.strip() for line in f if line.strip()]
+    finally:
+        os.remove(temporary_spec_path)
+        os.remove(runs_file_path)
+
+    return run_names
+
+def register_runs(connection, run_names):
+    for run_name in run_names:
+        run_name = run_name[:-len(".jsonl")] if run_name.endswith(".jsonl") else run_name
+        manifest = load_manifest(run_name)
+        if manifest is None:
+            raise FileNotFoundError(f"No manifest for run {run_name} in '{INPUT_DIR}', write the run with 01_batch_request.py first")
+
+        if register_run(connection, manifest):
+            print(f"Registered: {run_name} ({len(manifest['shards'])} shards)" if manifest["shards"] else f"Registered: {run_name} (answered from the response cache)")
+        else:
+            print(f"Already in the ledger: {run_name}")
+
+def find_batch(client, input_file_id):
+    """Find a batch that was already ordered for an uploaded file (e.g. when the orchestrator crashed right after ordering)."""
+    for batch in list_batches(client):
+        if batch.input_file_id == input_file_id:
+            return batch
+    return None
+
+def submit_shard(client, connection, shard):
+    """Upload a shard and order its batch; an already uploaded / ordered shard is not uploaded / ordered again."""
+    input_file_id = shard["input_file_id"]
+    batch = None
+
+    if input_file_id is None:
+        with open(os.path.join(INPUT_DIR, f"{shard['shard_name']}.jsonl"), "rb") as f:
+            input_file_id = client.files.create(file=f, purpose="batch").id
+        update_shard(connection, shard["shard_name"], status="uploaded", input_file_id=input_file_id)
+    else:
+        batch = find_batch(client, input_file_id)
+
+    if batch is None:
+        batch = client.batches.create(
+            input_file_id=input_file_id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+            metadata={"description": shard["shard_name"]}
+        )
+
+    update_shard(connection, shard["shard_name"], status=batch.status, batch_id=batch.id)
+    print(f"Ordered batch {batch.id} for {shard['shard_name']}")
+
+def poll_shard(client, shard):
+    """Retrieve the batch of a shard and download its output / error file once it is completed (runs in a worker thread)."""
+    batch = client.batches.retrieve(shard["batch_id"])
+    if batch.status == "completed":
+        download_batch(client, batch, shard["shard_name"])
+
+    return batch
+
+def update_runs(connection):
+    """Move submitted runs forward once all of their shards are downloaded (or one of them failed)."""
+    for run in runs_with_status(connection, ("created", "submitted")):
+        shards = run_shards(connection, run["run_name"])
+        statuses = [shard["status"] for shard in shards]
+
+        if not shards:
+            # Answered entirely from the response cache: there is nothing to submit or download
+            update_run(connection, run["run_name"], "downloaded")
+        elif any(status in ("failed", "expired", "cancelled") for status in statuses):
+            update_run(connection, run["run_name"], "failed")
+        elif all(status == "downloaded" for status in statuses):
+            update_run(connection, run["run_name"], "downloaded")
+        elif run["status"] == "created" and not any(shard["batch_id"] is None for shard in shards):
+            update_run(connection, run["run_name"], "submitted")
+
+def retry_failed_requests(connection, run_name, max_retries, max_completion_tokens=None):
+    """Add the failed requests of a downloaded run as a retry shard; returns False if there is nothing (more) to retry."""
+    retries = [shard for shard in run_shards(connection, run_name) if is_retry_file(shard["shard_name"])]
+    if len(retries) >= max_retries:
+        return False
+
+    failures = collect_failures(run_name)
+    if not failures:
+        return False
+
+    name = write_retry_file(run_name, failures, max_completion_tokens=max_completion_tokens)
+    if name is None:
+        return False
+
+    print(f"{run_name}: resubmitting {len(failures)} failed requests ({summarize_failures(failures)}) as {name}")
+    add_shard(connection, run_name, name, len(failures))
+    update_run(connection, run_name, "submitted")
+    return True
+
+def process_runs(connection, run_names, max_attempts=MAX_PROCESSING_ATTEMPTS):
+    """Process downloaded runs with 03.2 and record the data table of every run the processing manifest shows as
+    processed from its current response files (see processing_manifest.py); other runs are retried up to max_attempts times."""
+    result = subprocess.run([sys.executable, "03.2_batch_process_loop.py"] + run_names)
+    if result.returncode != 0:
+        print(f"Processing failed (exit code {result.returncode})")
+
+    manifest = load_processing_manifest()
+    for run_name in run_names:
+        entry = manifest.get(run_name)
+        shard_files = [os.path.basename(path) for path in run_files(run_name, RESPONSE_DIR)]
+        current = entry is not None and has_same_files(entry, file_states(shard_files, entry["files"]))
+
+        if current and entry.get("status") == NO_VALID_CODINGS:
+            # Processing it again would not change that
+            print(f"{run_name}: no valid codings, marked as failed (resubmit with: python batch_retry.py {run_name})")
+            update_run(connection, run_name, "failed")
+        elif current and os.path.exists(entry["artifact"]):
+            update_run(connection, run_name, "processed", artifact=entry["artifact"])
+        else:
+            # Not processed, or its tables are stale (older response files than the downloaded ones)
+            attempts = add_attempt(connection, run_name)
+            if attempts >= max_attempts:
+                print(f"{run_name}: not processed after {attempts} attempts, marked as failed")
+                update_run(connection, run_name, "failed")
+            else:
+                print(f"{run_name}: not processed (attempt {attempts} of {max_attempts}), retried on the next round")
+
+def orchestrate(client, connection, poll_interval=60, workers=8, once=False, process=True, max_retries=0, max_completion_tokens=None,
+                max_attempts=MAX_PROCESSING_ATTEMPTS):
+    """Submit, poll, download and process until no run of the ledger is unfinished (or after one round with once=True)."""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            # Shards that were uploaded but not ordered before a crash are ordered as well
+            for shard in shards_with_status(connection, ("created", "uploaded")):
+                if shard["batch_id"] is None:
+                    submit_shard(client, connection, shard)
+
+            # Polling all in-flight batches concurrently, the ledger itself is only written from this thread
+            in_flight = [shard for shard in shards_with_status(connection, IN_FLIGHT_STATUSES) if shard["batch_id"] is not None]
+            for shard, batch in zip(in_flight, executor.map(lambda shard: poll_shard(client, shard), in_flight)):
+                request_counts = batch.request_counts.model_dump() if batch.request_counts is not None else None
+
+                if batch.status == "completed" and batch.output_file_id is None:
+                    # Not a single request of the batch succeeded, see the error file
+                    status = "failed"
+                elif batch.status == "completed":
+                    status = "downloaded"
+                else:
+                    status = batch.status
+
+                if status != shard["status"]:
+                    print(f"{shard['shard_name']}: {shard['status']} -> {status}")
+                update_shard(connection, shard["shard_name"], status=status, output_file_id=batch.output_file_id,
+                             error_file_id=batch.error_file_id, request_counts=request_counts)
+
+            update_runs(connection)
+
+            # Failed, truncated or unparseable requests go into a follow-up batch of the same run first
+            downloaded_runs = [
+                run["run_name"] for run in runs_with_status(connection, ("downloaded",))
+                if not retry_failed_requests(connection, run["run_name"], max_retries, max_completion_tokens)
+            ]
+            if process and downloaded_runs:
+                process_runs(connection, downloaded_runs, max_attempts)
+
+            unfinished = runs_with_status(connection, ("created", "submitted") + (("downloaded",) if process else ()))
+            if once or not unfinished:
+                break
+
+            time.sleep(poll_interval)
+
+    print_ledger(connection)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build, submit, poll, download and process batch runs, tracked in a job ledger.")
+    parser.add_argument("--spec", help="grid spec (see grid_spec_example.json) whose runs are built with 01_batch_request.py")
+    parser.add_argument("--register", nargs="+", default=[], metavar="RUN", help="runs already written to Batch Input Files")
+    parser.add_argument("--status", action="store_true", help="only print the ledger")
+    parser.add_argument("--poll-interval", type=float, default=60, help="seconds between polling rounds")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent polls / downloads")
+    parser.add_argument("--once", action="store_true", help="run a single round (e.g. from a cron job)")
+    parser.add_argument("--no-process", action="store_true", help="only download, do not run 03.2")
+    parser.add_argument("--retries", type=int, default=0, help="resubmit failed requests of a run up to n times before processing it")
+    parser.add_argument("--max-attempts", type=int, default=MAX_PROCESSING_ATTEMPTS, help="runs of 03.2 for a run before it is marked as failed")
+    parser.add_argument("--max-completion-tokens", type=int, default=None, help="token budget for resubmitted requests")
+    parser.add_argument("--base-url", default=None, help="e.g. a local mock server: http://127.0.0.1:8000/v1")
+    args = parser.parse_args()
+
+    os.makedirs(ERROR_DIR, exist_ok=True)
+    connection = open_ledger()
+
+    if args.status:
+        print_ledger(connection)
+        sys.exit()
+
+    run_names = build_runs(args.spec) if args.spec else []
+    register_runs(connection, run_names + args.register)
+
+    # paste your OpenAI API key here or set as environmental variable (any value works for a local mock server)
+    client = OpenAI(
+        api_key=os.environ.get("OPENAI_API_KEY") or ("local" if args.base_url else None),
+        base_url=args.base_url
+    )
+
+    orchestrate(client, connection, poll_interval=args.poll_interval, workers=args.workers,
+                once=args.once, process=not args.no_process, max_retries=args.retries,
+                max_completion_tokens=args.max_completion_tokens, max_attempts=args.max_attempts)
@@ -0,0 +1,81 @@
+"""Listing and polling of OpenAI batches (used by 02_batch_retrieve.py and batch_orchestrator.py).
+
+list_batches() pages through all batches with the list cursor instead of only the latest 25, and can be
+restricted to our batches by the prefix of their description (the batch file name, e.g. the date
+'2025-09-01_'). wait_for_batches() polls until every batch reached a terminal status, with exponential
+backoff and equal jitter between rounds (at least half of the backoff delay, see backoff.py).
+"""
+import time
+
+from backoff import backoff_delay
+
+
+# All statuses of the Batch API, see https://platform.openai.com/docs/api-reference/batch/object
+ACTIVE_STATUSES = ("validating", "in_progress", "finalizing", "cancelling")
+FAILED_STATUSES = ("failed", "expired", "cancelled")
+TERMINAL_STATUSES = ("completed",) + FAILED_STATUSES
+
+
+def batch_description(batch):
+    return (batch.metadata or {}).get("description") or ""
+
+def list_batches(client, prefix="", created_after=None, page_size=100):
+    """Return all batches (newest first) whose description starts with prefix, optionally only those created after a unix timestamp."""
+    batches = []
+    params = {"limit": page_size}
+    while True:
+        page = client.batches.list(**params)
+        for batch in page.data:
+            # Batches are listed newest first, so everything after an older batch is older as well
+            if created_after is not None and batch.created_at < created_after:
+                return batches
+            if batch_description(batch).startswith(prefix):
+                batches.append(batch)
+
+        if not page.data or not page.has_next_page():
+            return batches
+        params["after"] = page.data[-1].id
+
+def batches_by_status(batches):
+    """Split batches into active, completed and failed (failed, expired or cancelled) batches."""
+    active_batches = [batch for batch in batches if batch.status in ACTIVE_STATUSES]
+    complete_batches = [batch for batch in batches if batch.status == "completed"]
+    failed_batches = [batch for batch in batches if batch.status in FAILED_STATUSES]
+
+    unknown = {batch.status for batch in batches} - set(ACTIVE_STATUSES + TERMINAL_STATUSES)
+    if unknown:
+        print(f"Warning: batches with unknown status {', '.join(sorted(unknown))} are treated as active")
+        active_batches += [batch for batch in batches if batch.status in unknown]
+
+    return active_batches, complete_batches, failed_batches
+
+def wait_for_batches(client, batch_ids, base_delay=10.0, max_delay=600.0, timeout=None):
+    """Poll the given batches until all of them reached a terminal status and return {batch ID: batch}.
+
+    The delay between polling rounds doubles up to max_delay and starts over whenever a batch finishes.
+    """
+    pending = list(batch_ids)
+    finished = {}
+    attempt = 0
+    started = time.monotonic()
+
+    while pending:
+        for batch_id in list(pending):
+            batch = client.batches.retrieve(batch_id)
+            if batch.status in TERMINAL_STATUSES:
+                print(f"{batch_description(batch) or batch_id}: {batch.status}")
+                finished[batch_id] = batch
+                pending.remove(batch_id)
+                attempt = 0
+
+        if not pending:
+            break
+
+        delay = backoff_delay(attempt, base_delay, max_delay, jitter="equal")
+        if timeout is not None and time.monotonic() - started + delay > timeout:
+            raise TimeoutError(f"{len(pending)} batches still not finished after {timeout} seconds: {', '.join(pending)}")
+
+        time.sleep(delay)
+        attempt += 1
+
+    return finished
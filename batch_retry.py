@@ -0,0 +1,199 @@
+"""Classification of batch response lines and resubmission of the failed requests of a run.
+
+Every line of a response file is classified as
+    "ok"              valid JSON content with all fields the request's response schema requires
+    "http_error"      the request itself failed (error object or status code other than 200)
+    "length"          the completion was cut off at the token limit (finish_reason = length)
+    "refusal"         the model refused (refusal message or content filter)
+    "schema_invalid"  the content is not valid JSON or misses required fields
+03.x only use the "ok" lines and report the others. This script collects the failed custom_ids of a run
+(plus requests without any response), rebuilds only those requests from the run's batch input files,
+optionally with a larger token budget, and writes them as '<run>.retry001.jsonl' (retry002, ...). The
+responses of the retry are downloaded under the same name and merged into the run by 03.2.
+
+Usage:
+    python batch_retry.py <run> [--max-completion-tokens 16000] [--submit] [--base-url ...]
+"""
+import os
+import json
+import glob
+import argparse
+
+from batch_shards import INPUT_DIR, run_name_from_file, retry_name
+
+
+RESPONSE_DIR = "Batch Response Files"
+ERROR_DIR = os.path.join(RESPONSE_DIR, "Errors")
+
+RESPONSE_STATUSES = ("ok", "http_error", "length", "refusal", "schema_invalid")
+
+
+def missing_required_fields(value, schema, definitions):
+    """Return True if a value lacks an object / required field of the (JSON) schema."""
+    if "$ref" in schema:
+        schema = definitions[schema["$ref"].split("/")[-1]]
+
+    if schema.get("type") != "object":
+        return False
+    if not isinstance(value, dict):
+        return True
+
+    properties = schema.get("properties", {})
+    for field in schema.get("required", []):
+        if field not in value or missing_required_fields(value[field], properties.get(field, {}), definitions):
+            return True
+
+    return False
+
+def classify_record(record, schema=None, loads=json.loads):
+    """Classify one line of a batch response file and return (status, parsed content or None)."""
+    response = record.get("response") or {}
+    if record.get("error") or response.get("status_code") != 200:
+        return "http_error", None
+
+    choice = response["body"]["choices"][0]
+    message = choice.get("message") or {}
+    if message.get("refusal") or choice.get("finish_reason") == "content_filter":
+        return "refusal", None
+    if choice.get("finish_reason") == "length":
+        return "length", None
+
+    try:
+        value = loads(message.get("content") or "")
+    except ValueError:
+        return "schema_invalid", None
+
+    if schema is not None and missing_required_fields(value, schema, schema.get("$defs", {})):
+        return "schema_invalid", None
+    if schema is None and not isinstance(value, dict):
+        return "schema_invalid", None
+
+    return "ok", value
+
+def load_request_schema(file_name, input_dir=INPUT_DIR):
+    """Response schema of the requests in the batch input file with the same name (None if there is no such file)."""
+    input_path = os.path.join(input_dir, file_name)
+    if not os.path.exists(input_path):
+        return None
+
+    with open(input_path, "r") as f:
+        first_line = f.readline()
+    if not first_line.strip():
+        return None
+
+    response_format = json.loads(first_line)["body"].get("response_format") or {}
+    return (response_format.get("json_schema") or {}).get("schema")
+
+def run_files(run_name, directory):
+    """All .jsonl files of a run in a directory (plain file, shards, cached responses and retries)."""
+    return sorted(
+        path for path in glob.glob(os.path.join(glob.escape(directory), "*.jsonl"))
+        if run_name_from_file(path) == run_name
+    )
+
+def collect_failures(run_name, input_dir=INPUT_DIR, response_dir=RESPONSE_DIR, error_dir=ERROR_DIR):
+    """Return {custom_id: status} of all requests of a run without an "ok" response (status "missing" if there is no line at all)."""
+    requested = set()
+    for input_path in run_files(run_name, input_dir):
+        with open(input_path, "r") as f:
+            requested.update(json.loads(line)["custom_id"] for line in f if line.strip())
+
+    statuses = {}
+    # Lines of the error files (requests the Batch API rejected) count as http errors
+    for response_path in run_files(run_name, response_dir) + run_files(run_name, error_dir):
+        schema = load_request_schema(os.path.basename(response_path), input_dir)
+        with open(response_path, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                status, _ = classify_record(record, schema)
+                # A successful retry replaces an earlier failure
+                if statuses.get(record["custom_id"]) != "ok":
+                    statuses[record["custom_id"]] = status
+
+    for custom_id in requested:
+        statuses.setdefault(custom_id, "missing")
+
+    return {custom_id: status for custom_id, status in sorted(statuses.items()) if status != "ok"}
+
+def next_retry_name(run_name, input_dir=INPUT_DIR):
+    index = 1
+    while os.path.exists(os.path.join(input_dir, f"{retry_name(run_name, index)}.jsonl")):
+        index += 1
+    return retry_name(run_name, index)
+
+def write_retry_file(run_name, failures, max_completion_tokens=None, input_dir=INPUT_DIR):
+    """Rebuild the failed requests of a run from its batch input files and write them as the next retry file; returns its name."""
+    requests = {}
+    for input_path in run_files(run_name, input_dir):
+        with open(input_path, "r") as f:
+            for line in f:
+                request = json.loads(line)
+                if request["custom_id"] in failures:
+                    requests[request["custom_id"]] = request
+
+    if not requests:
+        return None
+
+    name = next_retry_name(run_name, input_dir)
+    with open(os.path.join(input_dir, f"{name}.jsonl"), "w") as f:
+        for custom_id in sorted(requests):
+            request = requests[custom_id]
+            # A larger budget for completions (incl. reasoning tokens) that were cut off
+            if max_completion_tokens is not None:
+                request["body"]["max_completion_tokens"] = max_completion_tokens
+            json.dump(request, f)
+            f.write("\n")
+
+    return name
+
+def submit_retry(client, name, input_dir=INPUT_DIR):
+    """Upload a retry file and order its batch (the description is the file name, so 02 saves the responses under it)."""
+    with open(os.path.join(input_dir, f"{name}.jsonl"), "rb") as f:
+        batch_input_file = client.files.create(file=f, purpose="batch")
+
+    return client.batches.create(
+        input_file_id=batch_input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+        metadata={"description": name}
+    )
+
+def summarize_failures(failures):
+    counts = {}
+    for status in failures.values():
+        counts[status] = counts.get(status, 0) + 1
+    return ", ".join(f"{status} {count}" for status, count in sorted(counts.items()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resubmit the failed, truncated or unparseable requests of a run.")
+    parser.add_argument("runs", nargs="+", help="run names (batch file names without .jsonl)")
+    parser.add_argument("--max-completion-tokens", type=int, default=None, help="token budget for the resubmitted requests")
+    parser.add_argument("--submit", action="store_true", help="upload and order the retry batch right away")
+    parser.add_argument("--base-url", default=None, help="e.g. a local mock server: http://127.0.0.1:8000/v1")
+    args = parser.parse_args()
+
+    client = None
+    if args.submit:
+        from openai import OpenAI
+
+        # paste your OpenAI API key here or set as environmental variable (any value works for a local mock server)
+        client = OpenAI(
+            api_key=os.environ.get("OPENAI_API_KEY") or ("local" if args.base_url else None),
+            base_url=args.base_url
+        )
+
+    for run_name in [run_name_from_file(run) for run in args.runs]:
+        failures = collect_failures(run_name)
+        if not failures:
+            print(f"{run_name}: all requests succeeded")
+            continue
+
+        name = write_retry_file(run_name, failures, max_completion_tokens=args.max_completion_tokens)
+        print(f"{run_name}: {len(failures)} failed ({summarize_failures(failures)}) -> {INPUT_DIR}/{name}.jsonl")
+
+        if client is not None:
+            batch = submit_retry(client, name)
+            print(f"     Ordered batch {batch.id} for {name}")
@@ -0,0 +1,117 @@
+"""Splitting batch input files into uploadable shards.
+
+The Batch API limits the number of requests and the size of a single input file. The ShardWriter
+writes the requests of one logical run into as many shards as needed while writing, and records them
+in a manifest ('Batch Input Files/<run>.manifest.json'). A run that fits into one file keeps its plain
+name '<run>.jsonl'; otherwise the shards are named '<run>.shard001.jsonl', '<run>.shard002.jsonl', ...
+"""
+import os
+import re
+import json
+
+
+INPUT_DIR = "Batch Input Files"
+
+# Limits per batch input file, see https://platform.openai.com/docs/guides/batch
+MAX_REQUESTS_PER_FILE = 50000
+MAX_BYTES_PER_FILE = 200 * 1024 * 1024
+
+# '<run>.shard001' etc. are shards of a run, '<run>.cached' holds the responses reused from the response cache
+# and '<run>.retry001' etc. the resubmitted failed requests (see batch_retry.py)
+SHARD_PATTERN = re.compile(r"^(?P<run>.+)\.(shard(?P<index>\d{3})|cached|retry(?P<retry>\d{3}))$")
+
+
+def shard_name(run_name, index):
+    return f"{run_name}.shard{index:03d}"
+
+def cached_name(run_name):
+    return f"{run_name}.cached"
+
+def retry_name(run_name, index):
+    return f"{run_name}.retry{index:03d}"
+
+def is_cached_file(file_name):
+    return os.path.basename(file_name).endswith(".cached.jsonl")
+
+def is_retry_file(file_name):
+    name = os.path.basename(file_name)
+    match = SHARD_PATTERN.match(name[:-len(".jsonl")] if name.endswith(".jsonl") else name)
+    return match is not None and match.group("retry") is not None
+
+def run_name_from_file(file_name):
+    """Return the logical run a (shard / cached) file belongs to, e.g. '<run>.shard002.jsonl' -> '<run>'."""
+    name = os.path.basename(file_name)
+    if name.endswith(".jsonl"):
+        name = name[:-len(".jsonl")]
+
+    match = SHARD_PATTERN.match(name)
+    return match.group("run") if match else name
+
+def manifest_path(run_name, input_dir=INPUT_DIR):
+    return os.path.join(input_dir, f"{run_name}.manifest.json")
+
+def load_manifest(run_name, input_dir=INPUT_DIR):
+    """Load the manifest of a run, or None for runs written before sharding existed."""
+    path = manifest_path(run_name, input_dir)
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+class ShardWriter:
+    """Stream batch requests into size- and count-bounded shard files of one run."""
+
+    def __init__(self, run_name, input_dir=INPUT_DIR, max_requests=MAX_REQUESTS_PER_FILE, max_bytes=MAX_BYTES_PER_FILE):
+        self.run_name = run_name
+        self.input_dir = input_dir
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+        self.shards = []
+        self._file = None
+
+    def _open_next_shard(self):
+        if self._file is not None:
+            self._file.close()
+
+        name = shard_name(self.run_name, len(self.shards) + 1)
+        self.shards.append({"name": name, "requests": 0, "bytes": 0})
+        self._file = open(os.path.join(self.input_dir, f"{name}.jsonl"), "wb")
+
+    def write(self, request):
+        line = (json.dumps(request) + "\n").encode("utf-8")
+        if len(line) > self.max_bytes:
+            raise ValueError(f"Request {request['custom_id']} alone exceeds the maximum shard size of {self.max_bytes} bytes")
+
+        shard = self.shards[-1] if self.shards else None
+        if shard is None or shard["requests"] >= self.max_requests or shard["bytes"] + len(line) > self.max_bytes:
+            self._open_next_shard()
+            shard = self.shards[-1]
+
+        self._file.write(line)
+        shard["requests"] += 1
+        shard["bytes"] += len(line)
+
+    def close(self):
+        """Finish the last shard, write the manifest and return the shard names (file names without .jsonl)."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+        # A run that fits into one file keeps its plain name
+        if len(self.shards) == 1:
+            os.replace(os.path.join(self.input_dir, f"{self.shards[0]['name']}.jsonl"), os.path.join(self.input_dir, f"{self.run_name}.jsonl"))
+            self.shards[0]["name"] = self.run_name
+
+        manifest = {
+            "run": self.run_name,
+            "requests": sum(shard["requests"] for shard in self.shards),
+            "max requests per shard": self.max_requests,
+            "max bytes per shard": self.max_bytes,
+            "shards": self.shards,
+        }
+        with open(manifest_path(self.run_name, self.input_dir), "w") as f:
+            json.dump(manifest, f, indent=4)
+
+        return [shard["name"] for shard in self.shards]
@@ -0,0 +1,214 @@
+"""Benchmark of the columnar response parser (response_parser.py) against the previous implementations.
+
+Writes a synthetic batch response file of the requested size (default 300 MB) in the format of the Batch
+API and times
+    previous     json.loads per line and per content string, tokens in Python lists summed in a loop
+    classifying  the same with the classification of every line (see batch_retry.py), the loader of 03.x
+                 right before the columnar parser
+    columnar     parse_response_file() with the json module
+    orjson       parse_response_file() with orjson (if installed)
+and checks that all of them return the same codings and token sums.
+
+Usage:
+    python benchmark_response_parser.py [--size-mb 300] [--file <existing response file>] [--repeat 3]
+"""
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+import argparse
+
+import numpy as np
+
+import response_parser
+from batch_retry import classify_record
+from response_parser import parse_response_file, columns_to_responses, billed_tokens
+
+
+def previous_load_batch_responses(file_path):
+    """load_batch_responses() + token_sum() of 03.x before the columnar parser."""
+    responses = {}
+    input_tokens = []
+    output_tokens = []
+    cached_tokens = []
+
+    with open(file_path, "r") as f:
+        for line in f:
+            json_line = json.loads(line)
+
+            key = json_line["custom_id"].replace("request-", "")
+            value = json.loads(json_line["response"]["body"]["choices"][0]["message"]["content"])
+
+            input_token = json_line["response"]["body"]["usage"]["prompt_tokens"]
+            output_token = json_line["response"]["body"]["usage"]["completion_tokens"]
+            cached_token = (json_line["response"]["body"]["usage"].get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+
+            responses[key] = value
+
+            if json_line.get("from_cache"):
+                continue
+
+            input_tokens.append(input_token)
+            output_tokens.append(output_token)
+            cached_tokens.append(cached_token)
+
+    summed_tokens = []
+    for tokens in (input_tokens, output_tokens, cached_tokens):
+        summed = 0
+        for token in tokens:
+            summed += token
+        summed_tokens.append(summed)
+
+    return responses, summed_tokens
+
+def classifying_load_batch_responses(file_path):
+    """load_batch_responses() + token_sum() of 03.x with the classification of failed lines, before the columnar parser."""
+    responses = {}
+    input_tokens = []
+    output_tokens = []
+    cached_tokens = []
+    failures = {}
+
+    with open(file_path, "r") as f:
+        for line in f:
+            json_line = json.loads(line)
+
+            key = json_line["custom_id"].replace("request-", "")
+            status, value = classify_record(json_line)
+
+            if status == "ok":
+                responses[key] = value
+            else:
+                failures[json_line["custom_id"]] = status
+
+            usage = ((json_line.get("response") or {}).get("body") or {}).get("usage")
+            if json_line.get("from_cache") or usage is None:
+                continue
+
+            input_tokens.append(usage["prompt_tokens"])
+            output_tokens.append(usage["completion_tokens"])
+            cached_tokens.append((usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0)
+
+    summed_tokens = []
+    for tokens in (input_tokens, output_tokens, cached_tokens):
+        summed = 0
+        for token in tokens:
+            summed += token
+        summed_tokens.append(summed)
+
+    return responses, summed_tokens
+
+def columnar_load_batch_responses(file_path):
+    columns = parse_response_file(file_path)
+    responses, _ = columns_to_responses(columns)
+    return responses, [int(np.sum(tokens)) for tokens in billed_tokens(columns)]
+
+def write_synthetic_responses(file_path, size_mb, seed=1):
+    """Write batch output lines (with a realistic body size) until the file has size_mb megabytes."""
+    random.seed(seed)
+    target = size_mb * 1024 * 1024
+    written = 0
+    line_number = 0
+    with open(file_path, "w") as f:
+        while written < target:
+            coding = {
+                f"Box_{box}": {
+                    "Extraction": random.choice("gco"),
+                    "Position": random.choice([0, 1, 2, 9]),
+                    "Correct Position": random.choice([1, 2, 3, 4, 9])
+                }
+                for box in range(1, 5)
+            }
+            prompt_tokens = random.randint(1500, 9000)
+            record = {
+                "id": f"batch_req_{line_number:08d}",
+                "custom_id": f"request-{line_number}_Text{line_number % 12}_Klas{line_number % 40}",
+                "response": {
+                    "status_code": 200,
+                    "request_id": f"{line_number:032x}",
+                    "body": {
+                        "id": f"chatcmpl-{line_number:024x}",
+                        "object": "chat.completion",
+                        "created": 1750000000,
+                        "model": "gpt-5-2025-08-07",
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": json.dumps(coding), "refusal": None, "annotations": []},
+                            "finish_reason": "stop"
+                        }],
+                        "usage": {
+                            "prompt_tokens": prompt_tokens,
+                            "completion_tokens": random.randint(100, 3000),
+                            "total_tokens": 0,
+                            "prompt_tokens_details": {"cached_tokens": random.choice([0, 1024, 2048]), "audio_tokens": 0},
+                            "completion_tokens_details": {"reasoning_tokens": random.randint(0, 2500), "audio_tokens": 0,
+                                                          "accepted_prediction_tokens": 0, "rejected_prediction_tokens": 0}
+                        },
+                        "service_tier": "default",
+                        "system_fingerprint": None
+                    }
+                },
+                "error": None
+            }
+            line = json.dumps(record) + "\n"
+            f.write(line)
+            written += len(line)
+            line_number += 1
+
+    return line_number
+
+def timed(function, *args, repeat=1):
+    """Result and best time of repeat calls."""
+    seconds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function(*args)
+        seconds.append(time.perf_counter() - started)
+    return result, min(seconds)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the columnar response parser against the previous implementation.")
+    parser.add_argument("--size-mb", type=int, default=300, help="size of the synthetic response file")
+    parser.add_argument("--file", default=None, help="use an existing batch response file instead")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per implementation (the best time is reported)")
+    args = parser.parse_args()
+
+    file_path = args.file
+    if file_path is None:
+        file_path = os.path.join(tempfile.mkdtemp(prefix="benchmark_"), "responses.jsonl")
+        print(f"Writing {args.size_mb} MB of synthetic responses...")
+        lines = write_synthetic_responses(file_path, args.size_mb)
+    else:
+        with open(file_path, "rb") as f:
+            lines = sum(1 for _ in f)
+
+    size_mb = os.path.getsize(file_path) / 1024 / 1024
+    print(f"{file_path}: {lines} lines, {round(size_mb)} MB\n")
+
+    results = {}
+    installed_orjson = response_parser.orjson
+
+    results["previous"] = timed(previous_load_batch_responses, file_path, repeat=args.repeat)
+    results["classifying"] = timed(classifying_load_batch_responses, file_path, repeat=args.repeat)
+
+    response_parser.orjson = None
+    results["columnar"] = timed(columnar_load_batch_responses, file_path, repeat=args.repeat)
+    response_parser.orjson = installed_orjson
+
+    if installed_orjson is not None:
+        results["orjson"] = timed(columnar_load_batch_responses, file_path, repeat=args.repeat)
+    else:
+        print("orjson is not installed, skipping the orjson fast path\n")
+
+    (reference_responses, reference_tokens), reference_seconds = results["previous"]
+    for name, ((responses, tokens), seconds) in results.items():
+        same = responses == reference_responses and tokens == reference_tokens
+        print(f"{name:<12} {seconds:7.2f} s  {size_mb / seconds:7.1f} MB/s  x{reference_seconds / seconds:4.1f}  {'same results' if same else 'DIFFERENT RESULTS'}")
+
+    if args.file is None:
+        os.remove(file_path)
+
+    sys.exit(0 if all(result[0] == results["previous"][0] for result in results.values()) else 1)
@@ -0,0 +1,80 @@
+"""Comparison of the LLM codings with the human coding (used by 03.1 and 03.2).
+
+creating_comparison_df() flattens the LLM responses into a long frame keyed by (UUID, Veldnummer),
+merges it once with the rows of the coded diagrams and derives the agreement, confusion-matrix labels,
+PositionCode and Position Agreement as column expressions. It returns the same columns and values as the
+previous row-by-row implementation, which tests/test_comparison_table.py keeps as the reference.
+"""
+import numpy as np
+import pandas as pd
+
+from dataset_cache import GroupedResponses
+
+
+LLM_COLUMNS = {"Extraction": "LLM_Code", "Position": "LLM_PositionCode", "Correct Position": "LLM_CorrectPosition"}
+
+
+def confusion_labels(code, llm_code, correct, incorrect):
+    """Agreement (1/0) and confusion-matrix label (TP/FN/FP/TN) per row, NaN where one of the codes is neither correct nor incorrect."""
+    code = np.asarray(code, dtype=object)
+    llm_code = np.asarray(llm_code, dtype=object)
+    conditions = [
+        (code == correct) & (llm_code == correct),
+        (code == correct) & (llm_code == incorrect),
+        (code == incorrect) & (llm_code == correct),
+        (code == incorrect) & (llm_code == incorrect),
+    ]
+    agreement = np.select(conditions, [1, 0, 0, 1], default=np.nan)
+    labels = np.select(conditions, ["TP", "FN", "FP", "TN"], default=None)
+    labels = np.where(labels == None, np.nan, labels)  # noqa: E711 (element-wise comparison)
+
+    return agreement, labels
+
+def llm_codings_frame(responses):
+    """The LLM codings as a long frame with one row per (UUID, Veldnummer)."""
+    records = [
+        (key, int(box.replace("Box_", "")), coding.get("Extraction"), coding.get("Position"), coding.get("Correct Position"))
+        for key, value in responses.items()
+        for box, coding in value.items()
+        if box.startswith("Box_")
+    ]
+    return pd.DataFrame.from_records(records, columns=["UUID", "Veldnummer", *LLM_COLUMNS.values()])
+
+def coded_rows(responses, student_responses):
+    """The original rows of all coded diagrams, in the order of the responses."""
+    keys = list(responses)
+    if isinstance(student_responses, GroupedResponses):
+        return student_responses.rows(keys)
+    return pd.concat([student_responses[key] for key in keys])
+
+def creating_comparison_df(responses, student_responses):
+    # Original rows of the coded diagrams (keeping their index) joined with the llm coding of their field
+    original = coded_rows(responses, student_responses)
+    llm_codings = llm_codings_frame(responses)
+
+    comparison_df = original.merge(
+        llm_codings.astype({"Veldnummer": original["Veldnummer"].dtype}),
+        on=["UUID", "Veldnummer"], how="left", sort=False
+    )
+    comparison_df.index = original.index
+
+    # Adding columns for agreement (0, 1) and response categorisation (TP, TN, FP, FN)
+    comparison_df["Extraction Agreement"], comparison_df["Extraction ConMat"] = confusion_labels(
+        comparison_df["Code"], comparison_df["LLM_Code"], correct="g", incorrect="c"
+    )
+
+    # Adding PositionCode: 2 for incorrect extractions, otherwise whether Veldnummer & Verbandnummer match
+    comparison_df["PositionCode"] = np.where(
+        comparison_df["Code"] == "c", 2,
+        np.where(comparison_df["Veldnummer"] == comparison_df["Verbandnummer"], 1, 0)
+    )
+
+    ## Adding position Code Agreement
+    comparison_df["PositionCode Agreement"], comparison_df["PositionCode ConMat"] = confusion_labels(
+        comparison_df["PositionCode"], comparison_df["LLM_PositionCode"], correct=1, incorrect=0
+    )
+
+    ## Adding CorrectPosition Agreement
+    comparison_df["Position Agreement"] = (comparison_df["Verbandnummer"] == comparison_df["LLM_CorrectPosition"]).astype(int)
+
+    return comparison_df
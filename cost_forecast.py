@@ -0,0 +1,219 @@
+"""Offline token & cost forecast for a batch before it is uploaded.
+
+Input tokens are estimated from the UTF-8 size of each request (messages + response schema), using a
+linear bytes -> prompt_tokens fit per model that is calibrated on historical runs: every file in
+'Batch Input Files' that has a response file with the same name in 'Batch Response Files'.
+Output tokens are estimated from the average completion_tokens of those historical runs.
+"""
+import os
+import sys
+import json
+import glob
+
+import numpy as np
+
+from cost_ledger import token_cost
+
+# Optional: exact token counts with the local tokenizer of the GPT-4o / GPT-5 family
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+INPUT_DIR = "Batch Input Files"
+RESPONSE_DIR = "Batch Response Files"
+CALIBRATION_FILE = "documentation/token_calibration.json"
+
+# Used when there are no historical runs to calibrate on
+DEFAULT_BYTES_PER_TOKEN = 3.5
+DEFAULT_OUTPUT_TOKENS = {"reasoning": 2000, "standard": 150}
+
+
+def request_bytes(request):
+    """UTF-8 size of everything in a batch request that is billed as input."""
+    body = request["body"]
+    size = sum(len(message["content"].encode("utf-8")) for message in body["messages"])
+    size += len(json.dumps(body.get("response_format", {})).encode("utf-8"))
+    return size
+
+def is_reasoning_request(request):
+    return "reasoning_effort" in request["body"]
+
+def read_jsonl(file_path):
+    with open(file_path, "r") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def collect_history(input_dir=INPUT_DIR, response_dir=RESPONSE_DIR):
+    """Pair historical requests with their responses: returns {model: {"bytes": [...], "prompt": [...], "completion": [...]}}."""
+    history = {}
+    for input_path in sorted(glob.glob(os.path.join(input_dir, "*.jsonl"))):
+        response_path = os.path.join(response_dir, os.path.basename(input_path))
+        if not os.path.exists(response_path):
+            continue
+
+        request_sizes = {request["custom_id"]: (request["body"]["model"], request_bytes(request)) for request in read_jsonl(input_path)}
+
+        for record in read_jsonl(response_path):
+            response = record.get("response") or {}
+            usage = (response.get("body") or {}).get("usage")
+            if usage is None or record["custom_id"] not in request_sizes:
+                continue
+
+            model, size = request_sizes[record["custom_id"]]
+            model_history = history.setdefault(model, {"bytes": [], "prompt": [], "completion": []})
+            model_history["bytes"].append(size)
+            model_history["prompt"].append(usage["prompt_tokens"])
+            model_history["completion"].append(usage["completion_tokens"])
+
+    return history
+
+def fit_calibration(history):
+    """Fit prompt_tokens = slope * bytes + intercept per model (plus a pooled "*" fit over all models)."""
+    calibration = {}
+    pooled = {"bytes": [], "prompt": [], "completion": []}
+    for model, model_history in history.items():
+        for field in pooled:
+            pooled[field].extend(model_history[field])
+
+    for model, model_history in list(history.items()) + [("*", pooled)]:
+        sizes = np.asarray(model_history["bytes"], dtype=float)
+        prompt_tokens = np.asarray(model_history["prompt"], dtype=float)
+        if len(sizes) == 0:
+            continue
+
+        if len(np.unique(sizes)) > 1:
+            slope, intercept = np.polyfit(sizes, prompt_tokens, 1)
+        else:
+            slope, intercept = prompt_tokens.sum() / sizes.sum(), 0.0
+
+        calibration[model] = {
+            "slope": float(slope),
+            "intercept": float(intercept),
+            "mean completion tokens": float(np.mean(model_history["completion"])),
+            "requests": int(len(sizes)),
+        }
+
+    return calibration
+
+def load_calibration(calibration_file=CALIBRATION_FILE, refresh=False):
+    """Load the stored calibration, or (re)build it when it is missing or older than a response file."""
+    if not refresh and os.path.exists(calibration_file):
+        calibration_mtime = os.path.getmtime(calibration_file)
+        refresh = any(os.path.getmtime(path) > calibration_mtime for path in glob.glob(os.path.join(RESPONSE_DIR, "*.jsonl")))
+
+    if not refresh and os.path.exists(calibration_file):
+        with open(calibration_file, "r") as f:
+            return json.load(f)
+
+    calibration = fit_calibration(collect_history())
+    if calibration:
+        os.makedirs(os.path.dirname(calibration_file), exist_ok=True)
+        with open(calibration_file, "w") as f:
+            json.dump(calibration, f, indent=4)
+
+    return calibration
+
+def estimate_request_tokens(request, calibration):
+    """Estimate the input and output tokens of a single request (used for rate limiting)."""
+    model = request["body"]["model"]
+    model_calibration = calibration.get(model) or calibration.get("*")
+
+    if model_calibration is not None:
+        input_tokens = max(request_bytes(request) * model_calibration["slope"] + model_calibration["intercept"], 0)
+    else:
+        input_tokens = request_bytes(request) / DEFAULT_BYTES_PER_TOKEN
+
+    if model in calibration:
+        output_tokens = calibration[model]["mean completion tokens"]
+    else:
+        output_tokens = DEFAULT_OUTPUT_TOKENS["reasoning" if is_reasoning_request(request) else "standard"]
+
+    return round(input_tokens), round(output_tokens)
+
+def count_input_tokens(request):
+    """Count the input tokens of a request with tiktoken if it is installed, otherwise approximate them from its size."""
+    if tiktoken is None:
+        return round(request_bytes(request) / DEFAULT_BYTES_PER_TOKEN)
+
+    # Chat formatting adds a few tokens per message, which cancels out when comparing prompt encodings
+    encoding = tiktoken.get_encoding("o200k_base")
+    body = request["body"]
+    tokens = sum(len(encoding.encode(message["content"])) for message in body["messages"])
+    tokens += len(encoding.encode(json.dumps(body.get("response_format", {}))))
+    return tokens
+
+def forecast_batch(batch_requests, calibration=None):
+    """Estimate input/output tokens and costs for a list of batch requests (e.g. the output of processing_responses())."""
+    if calibration is None:
+        calibration = load_calibration()
+
+    if len(batch_requests) == 0:
+        raise ValueError("Cannot forecast an empty batch")
+
+    model = batch_requests[0]["body"]["model"]
+    model_calibration = calibration.get(model) or calibration.get("*")
+
+    sizes = np.fromiter((request_bytes(request) for request in batch_requests), dtype=float, count=len(batch_requests))
+
+    # Estimating input tokens per request
+    if model_calibration is not None:
+        input_tokens = np.maximum(sizes * model_calibration["slope"] + model_calibration["intercept"], 0)
+        calibrated = model in calibration
+    else:
+        input_tokens = sizes / DEFAULT_BYTES_PER_TOKEN
+        calibrated = False
+
+    # Estimating output tokens per request (reasoning tokens are billed as output)
+    if model in calibration:
+        output_per_request = calibration[model]["mean completion tokens"]
+    else:
+        output_per_request = DEFAULT_OUTPUT_TOKENS["reasoning" if is_reasoning_request(batch_requests[0]) else "standard"]
+
+    summed_input_tokens = float(input_tokens.sum())
+    summed_output_tokens = output_per_request * len(batch_requests)
+
+    forecast = {
+        "model": model,
+        "requests": len(batch_requests),
+        "calibrated": calibrated,
+        "input tokens": round(summed_input_tokens),
+        "output tokens": round(summed_output_tokens),
+        "max input tokens per request": round(float(input_tokens.max())),
+        "input cost": None,
+        "output cost": None,
+        "total cost": None,
+        "cost per diagram": None,
+    }
+
+    # Batch prices of today without prompt caching (see cost_ledger.py), so the forecast is an upper bound for the input
+    input_cost, output_cost, total_cost = token_cost(model, summed_input_tokens, summed_output_tokens, batch=True)
+    if total_cost is not None:
+        forecast["input cost"] = input_cost
+        forecast["output cost"] = output_cost
+        forecast["total cost"] = total_cost
+        forecast["cost per diagram"] = total_cost / len(batch_requests)
+
+    return forecast
+
+def print_forecast(forecast):
+    print("Cost forecast" + ("" if forecast["calibrated"] else " (uncalibrated, no historical runs for this model)") + ":")
+    print(f"     Requests: {forecast['requests']}")
+    print(f"     Input tokens: ~{forecast['input tokens']} (max per request ~{forecast['max input tokens per request']})")
+    print(f"     Output tokens: ~{forecast['output tokens']}")
+    if forecast["total cost"] is None:
+        print(f"     No price known for model {forecast['model']}")
+    else:
+        print(f"     Input: ${round(forecast['input cost'], 3)}, Output: ${round(forecast['output cost'], 3)}, Total: ${round(forecast['total cost'], 3)}")
+        print(f"     Per Diagram: ${round(forecast['cost per diagram'], 4)}")
+    print()
+
+
+if __name__ == "__main__":
+    # Usage: python cost_forecast.py "Batch Input Files/<file>.jsonl" [--recalibrate]
+    calibration = load_calibration(refresh="--recalibrate" in sys.argv)
+    for file_path in [arg for arg in sys.argv[1:] if not arg.startswith("--")]:
+        print(os.path.basename(file_path))
+        print_forecast(forecast_batch(list(read_jsonl(file_path)), calibration=calibration))
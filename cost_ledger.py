@@ -0,0 +1,190 @@
+"""Versioned model prices and the per-request cost ledger (used by 03.1, 03.2 and cost_forecast.py).
+
+PRICES holds the list prices per 1M tokens of the synchronous API for every model, each with the date
+from which it applies; a request is priced with the version that applied on the day its response was
+created. On top of that:
+    - cached input tokens (usage.prompt_tokens_details.cached_tokens) are billed at the cached input price,
+      the other prompt tokens at the input price,
+    - reasoning tokens (usage.completion_tokens_details.reasoning_tokens) are part of completion_tokens and
+      billed as output; the ledger shows their share of the output cost separately,
+    - responses of the Batch API are billed with BATCH_DISCOUNT off all prices (real-time responses of
+      realtime_executor.py are not),
+    - responses reused from the response cache and failed requests without usage cost nothing.
+Dated snapshots (e.g. "gpt-5-mini-2025-08-07") use the prices of the longest model name they start with.
+Requests of models without a known price get NaN costs instead of failing the run.
+
+    python cost_ledger.py [<run> ...] [--prices]
+prints the cost summary of processed runs from their cost tables (or the price table).
+"""
+import os
+import argparse
+from datetime import date, datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+
+BATCH_DISCOUNT = 0.5
+TOKENS_PER_PRICE = 1000000
+
+# Standard (synchronous) prices per 1M tokens, based on https://openai.com/api/pricing/, with the date they apply from
+PRICES = {
+    "gpt-4o-2024-08-06": [
+        ("2024-08-06", {"input": 2.5, "cached input": 1.25, "output": 10.0}),
+    ],
+    "o4-mini-2025-04-16": [
+        ("2025-04-16", {"input": 1.1, "cached input": 0.275, "output": 4.4}),
+    ],
+    "gpt-5": [
+        ("2025-08-07", {"input": 1.25, "cached input": 0.125, "output": 10.0}),
+    ],
+    "gpt-5-mini": [
+        ("2025-08-07", {"input": 0.25, "cached input": 0.025, "output": 2.0}),
+    ],
+}
+
+# Cost columns of the ledger (in dollars)
+COST_COLUMNS = ["input_cost", "cached_input_cost", "output_cost", "reasoning_cost", "batch_discount", "total_cost"]
+
+
+def price_model(model, prices=PRICES):
+    """Model name of the price table that applies to a (snapshot) model name, None if there is none."""
+    if model in prices:
+        return model
+    matches = [name for name in prices if str(model).startswith(f"{name}-")]
+    return max(matches, key=len) if matches else None
+
+def model_price(model, on=None, prices=PRICES):
+    """(version, prices per 1M tokens) of a model on a date ("YYYY-MM-DD", default today), None for unknown models."""
+    name = price_model(model, prices)
+    if name is None:
+        return None
+
+    on = on or date.today().isoformat()
+    versions = sorted(prices[name])
+    # Dates before the first version use the first version
+    valid_from, price = next((version for version in reversed(versions) if version[0] <= on), versions[0])
+    return f"{name}@{valid_from}", price
+
+def token_cost(model, input_tokens, output_tokens, cached_tokens=0, batch=True, on=None):
+    """Input, output and total cost of token counts, (None, None, None) for unknown models (e.g. for forecasts)."""
+    version = model_price(model, on)
+    if version is None:
+        return None, None, None
+
+    price = version[1]
+    discount = 1 - BATCH_DISCOUNT if batch else 1
+    input_costs = ((input_tokens - cached_tokens) * price["input"] + cached_tokens * price["cached input"]) * discount / TOKENS_PER_PRICE
+    output_costs = output_tokens * price["output"] * discount / TOKENS_PER_PRICE
+    return input_costs, output_costs, input_costs + output_costs
+
+def cost_ledger(columns, file_name, default_model=None):
+    """One row per response line (parsed columns of response_parser.py) with its tokens, price version and costs."""
+    created = pd.Series(columns["created"])
+    ledger = pd.DataFrame({
+        "file": file_name,
+        "custom_id": columns["custom_id"],
+        "status": columns["status"],
+        "model": pd.Series(columns["model"], dtype=object).where(pd.notna(columns["model"]), default_model),
+        "created": pd.to_datetime(created.where(created > 0), unit="s", utc=True),
+        "batch": columns["batch"],
+        "from_cache": columns["from_cache"],
+        # Only lines with usage that were not reused from the response cache were paid for in this run
+        "billed": columns["has_usage"] & ~columns["from_cache"],
+        "prompt_tokens": columns["prompt_tokens"],
+        "cached_tokens": columns["cached_tokens"],
+        "completion_tokens": columns["completion_tokens"],
+        "reasoning_tokens": columns["reasoning_tokens"],
+    })
+
+    # Looking up the prices once per model and day instead of per line
+    days = ledger["created"].dt.strftime("%Y-%m-%d").fillna(datetime.now(timezone.utc).date().isoformat())
+    keys, models_days = pd.MultiIndex.from_arrays([ledger["model"].astype(str), days]).factorize()
+    versions = [model_price(model, day) for model, day in models_days]
+    ledger["pricing"] = np.array([version[0] if version is not None else None for version in versions], dtype=object)[keys]
+
+    rates = np.array([[version[1][rate] if version is not None else np.nan for rate in ("input", "cached input", "output")] for version in versions]).reshape(-1, 3)
+    input_rate, cached_rate, output_rate = (rates[keys] / TOKENS_PER_PRICE).T
+
+    billed = ledger["billed"].to_numpy()
+    discount = np.where(ledger["batch"], BATCH_DISCOUNT, 0.0)
+    uncached_tokens = ledger["prompt_tokens"] - ledger["cached_tokens"]
+
+    ## Costs at list prices (unbilled lines cost 0, also for unknown models)
+    input_cost = np.where(billed, uncached_tokens * input_rate, 0.0)
+    cached_input_cost = np.where(billed, ledger["cached_tokens"] * cached_rate, 0.0)
+    output_cost = np.where(billed, ledger["completion_tokens"] * output_rate, 0.0)
+    reasoning_cost = np.where(billed, ledger["reasoning_tokens"] * output_rate, 0.0)
+
+    ## Discount of the Batch API, all costs in the ledger are after the discount
+    list_cost = input_cost + cached_input_cost + output_cost
+    ledger["input_cost"] = input_cost * (1 - discount)
+    ledger["cached_input_cost"] = cached_input_cost * (1 - discount)
+    ledger["output_cost"] = output_cost * (1 - discount)
+    ledger["reasoning_cost"] = reasoning_cost * (1 - discount)
+    ledger["batch_discount"] = list_cost * discount
+    ledger["total_cost"] = list_cost - ledger["batch_discount"]
+    return ledger
+
+def unpriced_models(ledger):
+    """Models of billed lines without a known price."""
+    return sorted(set(ledger.loc[ledger["billed"] & ledger["pricing"].isna(), "model"].astype(str)))
+
+def cost_summary(ledger):
+    """Tokens and costs of a run: totals of the billed lines (input cost includes cached input, output cost includes
+    reasoning), cost per returned diagram; NaN costs if a billed line has no known price."""
+    billed = ledger[ledger["billed"]]
+    summary = {
+        "input tokens": int(billed["prompt_tokens"].sum()),
+        "cached tokens": int(billed["cached_tokens"].sum()),
+        "output tokens": int(billed["completion_tokens"].sum()),
+        "reasoning tokens": int(billed["reasoning_tokens"].sum()),
+        "billed requests": len(billed),
+        # Diagrams with a returned record in the response files (fresh, cached or failed), each counted once over retries
+        "diagrams": int(ledger["custom_id"].nunique()),
+        "pricing": ", ".join(sorted(set(billed["pricing"].dropna()))),
+    }
+    costs = {}
+    for column in COST_COLUMNS:
+        # sum() would count unknown prices as 0
+        costs[column] = float(billed[column].sum()) if billed[column].notna().all() else np.nan
+
+    summary["input cost"] = costs["input_cost"] + costs["cached_input_cost"]
+    summary["cached input cost"] = costs["cached_input_cost"]
+    summary["output cost"] = costs["output_cost"]
+    summary["reasoning cost"] = costs["reasoning_cost"]
+    summary["batch discount"] = costs["batch_discount"]
+    summary["total cost"] = costs["total_cost"]
+    summary["cost per diagram"] = costs["total_cost"] / summary["diagrams"] if summary["diagrams"] else np.nan
+    return summary
+
+def cost_value(value, digits):
+    """A cost of cost_summary() for the Measures sheet ("N/A" for unknown prices)."""
+    return "N/A" if pd.isna(value) else round(value, digits)
+
+
+if __name__ == "__main__":
+    from run_artifacts import read_run_table, run_files, artifact_path
+
+    parser = argparse.ArgumentParser(description="Print the costs of processed runs (or the price table).")
+    parser.add_argument("runs", nargs="*", help="run names or file names (default: all processed runs)")
+    parser.add_argument("--prices", action="store_true", help="print the price table and exit")
+    args = parser.parse_args()
+
+    if args.prices:
+        for model, versions in PRICES.items():
+            for valid_from, price in sorted(versions):
+                print(f"{model:<20} from {valid_from}: " + ", ".join(f"{rate} ${value}" for rate, value in price.items()) + f" per 1M tokens (batch: -{BATCH_DISCOUNT:.0%})")
+        raise SystemExit
+
+    file_names = [f"{run.removesuffix('.xlsx').removesuffix('.jsonl')}.jsonl" for run in args.runs] or run_files()
+    for file_name in file_names:
+        if not os.path.exists(artifact_path(file_name, "costs")):
+            print(f"{file_name}: no cost table (process the run again)")
+            continue
+
+        summary = cost_summary(read_run_table(file_name, "costs"))
+        print(file_name)
+        print(f"     Tokens: {summary['input tokens']} input ({summary['cached tokens']} cached), {summary['output tokens']} output ({summary['reasoning tokens']} reasoning)")
+        print(f"     Input: ${cost_value(summary['input cost'], 3)}, Output: ${cost_value(summary['output cost'], 3)} (reasoning ${cost_value(summary['reasoning cost'], 3)}), Total: ${cost_value(summary['total cost'], 3)}")
+        print(f"     Batch discount: ${cost_value(summary['batch discount'], 3)}, Per Diagram: ${cost_value(summary['cost per diagram'], 4)} ({summary['diagrams']} diagrams, prices {summary['pricing'] or 'unknown'})")
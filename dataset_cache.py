@@ -0,0 +1,238 @@
+"""Shared loader for the student answers workbook.
+
+Parsing the workbook with openpyxl takes seconds, so the first load converts it into a Parquet
+cache in Data/cache/. The cache holds the full workbook (categorical Dataset/Code/Klas/Tekstnaam and a
+precomputed UUID column), the filtered Desar g/c rows ordered by diagram, and the diagram index
+(UUID -> row range). The cache is keyed on the modification time and SHA-256 hash of the source file
+and is rebuilt automatically whenever the workbook changes.
+"""
+import os
+import json
+import hashlib
+import datetime
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+
+DATA_PATH = "Data/20220704_student_answers_all_datasets.xlsx"  # Set path to data here
+CACHE_DIR = "Data/cache"
+CACHE_VERSION = 2
+
+CATEGORICAL_COLUMNS = ["Dataset", "Code", "Klas", "Tekstnaam"]
+GROUP_COLUMNS = ["Nummer", "Klas", "Tekstnaam"]
+
+
+def filter_data(data):
+    """Filter the data based on specific criteria."""
+    filtered_data = data[
+        ((data["Dataset"] == "Desar") & (data["Code"] == "g")) |
+        ((data["Dataset"] == "Desar") & (data["Code"] == "c"))
+    ].copy()
+
+    if "UUID" not in filtered_data.columns:
+        filtered_data['UUID'] = add_uuid(filtered_data)
+
+    return filtered_data
+
+def group_data(data):
+    """Group data by 'Nummer', 'Klas', and 'Tekstnaam'."""
+    # observed=True keeps categorical columns from producing empty Nummer x Klas x Tekstnaam combinations
+    return data.groupby(GROUP_COLUMNS, observed=True)
+
+def create_student_responses(grouped_data):
+    """Create a dictionary of student responses."""
+    # Defining empty student response object.
+    student_responses = {}
+
+    # Looping through grouped data to fill student_responses
+    for (Nummer, Klas, Tekstnaam), group in grouped_data:
+        # Setting unique ID, Class, and Text combination as Key
+        student_text_key = f"{Nummer}_{Klas}_{Tekstnaam}"
+        # Saving Group as value in student_response
+        student_responses[student_text_key] = group
+
+    return student_responses
+
+def add_uuid(data):
+    """Return the student-class-text UUID for every row."""
+    return data['Nummer'].astype(str) + '_' + data['Klas'].astype(str) + '_' + data['Tekstnaam'].astype(str)
+
+
+class GroupedResponses(Mapping):
+    """Read-only {UUID: diagram rows} mapping backed by the cached, diagram-ordered filtered data.
+
+    Behaves like the dict returned by create_student_responses(), but slices the rows of a diagram
+    only when it is accessed.
+    """
+
+    def __init__(self, filtered_data, groups):
+        self._data = filtered_data
+        self._ranges = dict(zip(groups["key"], zip(groups["start"], groups["stop"])))
+
+    def __getitem__(self, key):
+        start, stop = self._ranges[key]
+        return self._data.iloc[start:stop]
+
+    def __iter__(self):
+        return iter(self._ranges)
+
+    def __len__(self):
+        return len(self._ranges)
+
+    def __contains__(self, key):
+        return key in self._ranges
+
+    def rows(self, keys):
+        """The rows of several diagrams (in the order of keys) with a single slice."""
+        positions = [np.arange(*self._ranges[key]) for key in keys]
+        return self._data.iloc[np.concatenate(positions) if positions else []]
+
+
+def _file_hash(file_path):
+    """SHA-256 of a file, read in chunks."""
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def _cache_paths(file_path, cache_dir):
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    return {
+        "meta": os.path.join(cache_dir, f"{stem}.meta.json"),
+        "data": os.path.join(cache_dir, f"{stem}.data.parquet"),
+        "filtered": os.path.join(cache_dir, f"{stem}.filtered.parquet"),
+        "groups": os.path.join(cache_dir, f"{stem}.groups.parquet"),
+    }
+
+def _mixed_columns(data):
+    """Free-text object columns with mixed value types (e.g. numbers typed into Veld), which Parquet cannot store as such."""
+    return [
+        col for col in data.columns
+        if data[col].dtype == object and col not in CATEGORICAL_COLUMNS and data[col].dropna().map(type).nunique() > 1
+    ]
+
+def _encode_value(value):
+    if isinstance(value, datetime.datetime):
+        return json.dumps({"datetime": value.isoformat()})
+    if isinstance(value, datetime.time):
+        return json.dumps({"time": value.isoformat()})
+    return json.dumps(value.item() if isinstance(value, np.generic) else value)
+
+def _decode_value(text):
+    value = json.loads(text)
+    if isinstance(value, dict) and "datetime" in value:
+        return datetime.datetime.fromisoformat(value["datetime"])
+    if isinstance(value, dict) and "time" in value:
+        return datetime.time.fromisoformat(value["time"])
+    return value
+
+def _encode_mixed(data, columns):
+    """Store the values of mixed columns as JSON text, one value per row, so their types survive the cache."""
+    for col in columns:
+        data[col] = data[col].map(_encode_value, na_action="ignore").astype(object)
+    return data
+
+def _decode_mixed(data, columns):
+    """Restore the original values (numbers stay numbers) of the mixed columns written by _encode_mixed()."""
+    for col in columns:
+        if col in data.columns:
+            data[col] = data[col].astype(object).map(_decode_value, na_action="ignore").astype(object)
+    return data
+
+def _mixed_columns_of(paths):
+    with open(paths["meta"], "r") as f:
+        return json.load(f).get("mixed_columns", [])
+
+def _build_cache(file_path, paths, source_meta):
+    """Parse the workbook once and write the Parquet cache files."""
+    print(f"Building dataset cache for '{file_path}' (this happens only when the workbook changes)...")
+    data = pd.read_excel(file_path)
+    data["UUID"] = add_uuid(data)
+    for col in CATEGORICAL_COLUMNS:
+        data[col] = data[col].astype("category")
+    source_meta["mixed_columns"] = _mixed_columns(data)
+    data = _encode_mixed(data, source_meta["mixed_columns"])
+
+    # Ordering the filtered rows by diagram (stable, so rows keep their workbook order within a diagram)
+    filtered_data = filter_data(data)
+    filtered_data = filtered_data.dropna(subset=GROUP_COLUMNS).sort_values(GROUP_COLUMNS, kind="stable")
+
+    # Recording where each diagram starts and stops in the ordered filtered data
+    group_sizes = filtered_data.groupby(GROUP_COLUMNS, observed=True, sort=False).size()
+    stops = group_sizes.cumsum()
+    groups = pd.DataFrame({
+        "key": [f"{Nummer}_{Klas}_{Tekstnaam}" for (Nummer, Klas, Tekstnaam) in group_sizes.index],
+        "start": (stops - group_sizes).to_numpy(),
+        "stop": stops.to_numpy(),
+    })
+
+    os.makedirs(os.path.dirname(paths["meta"]), exist_ok=True)
+    data.to_parquet(paths["data"])
+    filtered_data.to_parquet(paths["filtered"])
+    groups.to_parquet(paths["groups"], index=False)
+
+    # Writing the meta file last, so an interrupted build is never picked up as valid
+    with open(paths["meta"], "w") as f:
+        json.dump(source_meta, f, indent=4)
+
+def ensure_cache(file_path=DATA_PATH, cache_dir=CACHE_DIR):
+    """Make sure an up-to-date cache exists for file_path and return the paths of its files.
+
+    A matching size + mtime is trusted without hashing; otherwise the file is hashed and the cache is
+    only rebuilt if the content actually changed.
+    """
+    paths = _cache_paths(file_path, cache_dir)
+    stat = os.stat(file_path)
+    source_meta = {
+        "source": os.path.abspath(file_path),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "sha256": None,
+        "cache_version": CACHE_VERSION,
+    }
+
+    cached_meta = None
+    if os.path.exists(paths["meta"]) and all(os.path.exists(p) for p in paths.values()):
+        with open(paths["meta"], "r") as f:
+            cached_meta = json.load(f)
+
+    if cached_meta is not None and cached_meta.get("cache_version") == CACHE_VERSION:
+        if cached_meta["size"] == source_meta["size"] and cached_meta["mtime"] == source_meta["mtime"]:
+            return paths
+
+        source_meta["sha256"] = _file_hash(file_path)
+        if cached_meta.get("sha256") == source_meta["sha256"]:
+            # Same content with a new mtime (e.g. copied file): only refresh the meta file
+            source_meta["mixed_columns"] = cached_meta.get("mixed_columns", [])
+            with open(paths["meta"], "w") as f:
+                json.dump(source_meta, f, indent=4)
+            return paths
+
+    if source_meta["sha256"] is None:
+        source_meta["sha256"] = _file_hash(file_path)
+    _build_cache(file_path, paths, source_meta)
+
+    return paths
+
+def cache_signature(file_path=DATA_PATH, cache_dir=CACHE_DIR):
+    """Return the hash and cache version identifying the dataset the cache was built from."""
+    paths = ensure_cache(file_path, cache_dir)
+    with open(paths["meta"], "r") as f:
+        meta = json.load(f)
+    return {"sha256": meta["sha256"], "cache_version": meta["cache_version"]}
+
+def load_dataset(file_path=DATA_PATH, cache_dir=CACHE_DIR, columns=None):
+    """Load the full workbook (with UUID column) from the cache."""
+    paths = ensure_cache(file_path, cache_dir)
+    return _decode_mixed(pd.read_parquet(paths["data"], columns=columns), _mixed_columns_of(paths))
+
+def load_filtered_dataset(file_path=DATA_PATH, cache_dir=CACHE_DIR):
+    """Load the filtered data and the student responses (UUID -> diagram rows) from the cache."""
+    paths = ensure_cache(file_path, cache_dir)
+    filtered_data = _decode_mixed(pd.read_parquet(paths["filtered"]), _mixed_columns_of(paths))
+    groups = pd.read_parquet(paths["groups"])
+
+    return filtered_data, GroupedResponses(filtered_data, groups)
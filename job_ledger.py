@@ -0,0 +1,153 @@
+"""SQLite job ledger of the batch orchestrator (see batch_orchestrator.py).
+
+Tracks every logical run (as written by 01_batch_request.py, see batch_shards.py), its shards with their
+input file, batch, output and error file IDs, every status transition and the processed artifact, so the
+orchestrator can pick up where it stopped after a crash or restart.
+
+Shard statuses: "created" (input file written) -> "uploaded" -> the Batch API statuses ("validating",
+"in_progress", "finalizing", "completed", "failed", "expired", "cancelling", "cancelled") -> "downloaded".
+Run statuses: "created" -> "submitted" -> "downloaded" -> "processed", or "failed". The processing
+attempts of a run are counted, so a run that 03.2 does not process is not handed to it forever.
+"""
+import os
+import json
+import sqlite3
+from datetime import datetime
+
+
+LEDGER_PATH = os.path.join("Batch Input Files", "job_ledger.sqlite")
+
+# Shard statuses that still need the Batch API (polling)
+IN_FLIGHT_STATUSES = ("uploaded", "validating", "in_progress", "finalizing", "cancelling")
+
+
+def now():
+    return datetime.now().isoformat(timespec="seconds")
+
+def open_ledger(ledger_path=LEDGER_PATH):
+    connection = sqlite3.connect(ledger_path)
+    connection.row_factory = sqlite3.Row
+    connection.executescript("""
+        CREATE TABLE IF NOT EXISTS runs (
+            run_name TEXT PRIMARY KEY,
+            status TEXT,
+            requests INTEGER,
+            artifact TEXT,
+            created TEXT,
+            updated TEXT,
+            attempts INTEGER DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS shards (
+            shard_name TEXT PRIMARY KEY,
+            run_name TEXT REFERENCES runs(run_name),
+            status TEXT,
+            requests INTEGER,
+            input_file_id TEXT,
+            batch_id TEXT,
+            output_file_id TEXT,
+            error_file_id TEXT,
+            request_counts TEXT,
+            updated TEXT
+        );
+        CREATE TABLE IF NOT EXISTS transitions (
+            name TEXT,
+            kind TEXT,
+            old_status TEXT,
+            new_status TEXT,
+            at TEXT
+        );
+    """)
+
+    # Ledgers written before processing attempts were counted
+    if "attempts" not in [column["name"] for column in connection.execute("PRAGMA table_info(runs)")]:
+        connection.execute("ALTER TABLE runs ADD COLUMN attempts INTEGER DEFAULT 0")
+    return connection
+
+def _record_transition(connection, name, kind, old_status, new_status):
+    if old_status != new_status:
+        connection.execute("INSERT INTO transitions VALUES (?, ?, ?, ?, ?)", (name, kind, old_status, new_status, now()))
+
+def register_run(connection, manifest):
+    """Add a run and its shards from its manifest; returns False if the run is already in the ledger."""
+    if connection.execute("SELECT 1 FROM runs WHERE run_name = ?", (manifest["run"],)).fetchone() is not None:
+        return False
+
+    with connection:
+        connection.execute(
+            "INSERT INTO runs (run_name, status, requests, artifact, created, updated) VALUES (?, ?, ?, ?, ?, ?)",
+            (manifest["run"], "created", manifest["requests"], None, now(), now())
+        )
+        _record_transition(connection, manifest["run"], "run", None, "created")
+        for shard in manifest["shards"]:
+            connection.execute(
+                "INSERT INTO shards (shard_name, run_name, status, requests, updated) VALUES (?, ?, ?, ?, ?)",
+                (shard["name"], manifest["run"], "created", shard["requests"], now())
+            )
+            _record_transition(connection, shard["name"], "shard", None, "created")
+
+    return True
+
+def add_shard(connection, run_name, shard_name, requests):
+    """Add a shard to a run that is already in the ledger (e.g. the resubmitted failed requests, see batch_retry.py)."""
+    with connection:
+        connection.execute(
+            "INSERT INTO shards (shard_name, run_name, status, requests, updated) VALUES (?, ?, ?, ?, ?)",
+            (shard_name, run_name, "created", requests, now())
+        )
+        _record_transition(connection, shard_name, "shard", None, "created")
+
+def update_shard(connection, shard_name, status=None, **fields):
+    """Update the status and/or IDs of a shard and record the status transition."""
+    old_status = connection.execute("SELECT status FROM shards WHERE shard_name = ?", (shard_name,)).fetchone()["status"]
+    if status is not None:
+        fields["status"] = status
+
+    if "request_counts" in fields and not isinstance(fields["request_counts"], str):
+        fields["request_counts"] = json.dumps(fields["request_counts"])
+
+    fields["updated"] = now()
+    with connection:
+        connection.execute(
+            f"UPDATE shards SET {', '.join(f'{field} = ?' for field in fields)} WHERE shard_name = ?",
+            list(fields.values()) + [shard_name]
+        )
+        _record_transition(connection, shard_name, "shard", old_status, fields.get("status", old_status))
+
+def update_run(connection, run_name, status, artifact=None):
+    old_status = connection.execute("SELECT status FROM runs WHERE run_name = ?", (run_name,)).fetchone()["status"]
+    with connection:
+        connection.execute(
+            "UPDATE runs SET status = ?, artifact = COALESCE(?, artifact), updated = ? WHERE run_name = ?",
+            (status, artifact, now(), run_name)
+        )
+        _record_transition(connection, run_name, "run", old_status, status)
+
+def add_attempt(connection, run_name):
+    """Count a processing attempt of a run and return the number of attempts so far."""
+    with connection:
+        connection.execute("UPDATE runs SET attempts = attempts + 1, updated = ? WHERE run_name = ?", (now(), run_name))
+    return connection.execute("SELECT attempts FROM runs WHERE run_name = ?", (run_name,)).fetchone()["attempts"]
+
+def shards_with_status(connection, statuses):
+    placeholders = ", ".join("?" for _ in statuses)
+    return connection.execute(f"SELECT * FROM shards WHERE status IN ({placeholders}) ORDER BY shard_name", list(statuses)).fetchall()
+
+def runs_with_status(connection, statuses):
+    placeholders = ", ".join("?" for _ in statuses)
+    return connection.execute(f"SELECT * FROM runs WHERE status IN ({placeholders}) ORDER BY run_name", list(statuses)).fetchall()
+
+def run_shards(connection, run_name):
+    return connection.execute("SELECT * FROM shards WHERE run_name = ? ORDER BY shard_name", (run_name,)).fetchall()
+
+def print_ledger(connection):
+    """Overview of all runs with the status of their shards."""
+    runs = connection.execute("SELECT * FROM runs ORDER BY created, run_name").fetchall()
+    if not runs:
+        print("The job ledger is empty")
+        return
+
+    for run in runs:
+        print(f"{run['run_name']}: {run['status']}" + (f" -> {run['artifact']}" if run["artifact"] else ""))
+        for shard in run_shards(connection, run["run_name"]):
+            print(f"     {shard['shard_name']}: {shard['status']}" + (f" (Batch ID: {shard['batch_id']})" if shard["batch_id"] else ""))
+    print()
@@ -0,0 +1,410 @@
+"""Local stand-in for the OpenAI Files, Batches and Chat Completions API (offline / load testing).
+
+Implements the endpoints the pipeline uses: files.create / retrieve / content, batches.create / list
+(with cursor pagination) / retrieve / cancel and chat.completions. Responses are synthetic codings that
+conform to the response schema sent with each request, with configurable latency, failure rate, truncated
+completions and token usage. Uploaded and generated files are kept on disk, so batches of 100k requests
+work on a laptop.
+
+Usage:
+    python mock_openai_server.py [--port 8000] [--batch-duration 30] [--failure-rate 0.01] [--length-rate 0.01]
+
+Then point the scripts at it, e.g.
+    OPENAI_API_KEY=local OPENAI_BASE_URL=http://127.0.0.1:8000/v1 python 01_batch_request.py grid_spec.json
+    python 02_batch_retrieve.py --base-url http://127.0.0.1:8000/v1 --wait --all
+    python batch_orchestrator.py --spec grid_spec.json --base-url http://127.0.0.1:8000/v1
+    python realtime_executor.py "Batch Input Files/<file>.jsonl" --base-url http://127.0.0.1:8000/v1
+"""
+import os
+import re
+import json
+import time
+import uuid
+import random
+import argparse
+import tempfile
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+# Synthetic values for the fields of response_schema_v0.1*.json
+FIELD_VALUES = {
+    "Extraction": ["g", "c", "o"],
+    "Position": [0, 1, 2, 9],
+    "Correct Position": [1, 2, 3, 4, 9],
+}
+
+# Reasoning tokens per reasoning effort (billed as completion tokens)
+REASONING_TOKENS = {"low": 500, "medium": 1500, "high": 4000}
+
+
+def synthetic_value(schema, name, definitions):
+    """Random value that conforms to a (JSON) schema."""
+    if "$ref" in schema:
+        schema = definitions[schema["$ref"].split("/")[-1]]
+
+    if "enum" in schema:
+        return random.choice(schema["enum"])
+    if name in FIELD_VALUES:
+        return random.choice(FIELD_VALUES[name])
+
+    schema_type = schema.get("type")
+    if schema_type == "object":
+        return {field: synthetic_value(field_schema, field, definitions) for field, field_schema in schema.get("properties", {}).items()}
+    if schema_type == "array":
+        return [synthetic_value(schema.get("items", {}), name, definitions)]
+    if schema_type in ("number", "integer"):
+        return random.randint(0, 9)
+    if schema_type == "boolean":
+        return random.random() < 0.5
+    return f"synthetic {name}".strip()
+
+def synthetic_completion(body, settings):
+    """Chat completion object with a synthetic coding for a request body."""
+    response_format = body.get("response_format") or {}
+    schema = (response_format.get("json_schema") or {}).get("schema") or {"type": "object", "properties": {}}
+    content = json.dumps(synthetic_value(schema, "", schema.get("$defs", {})))
+
+    finish_reason = "stop"
+    if random.random() < settings.length_rate:
+        # Cut off like a completion that hit the token limit
+        content = content[:len(content) // 2]
+        finish_reason = "length"
+
+    prompt_tokens = sum(len(message["content"].encode("utf-8")) for message in body["messages"]) // 4
+    reasoning_tokens = REASONING_TOKENS.get(body.get("reasoning_effort"), 0)
+    completion_tokens = settings.completion_tokens + reasoning_tokens
+
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body["model"],
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content, "refusal": None},
+            "finish_reason": finish_reason
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": 0},
+            "completion_tokens_details": {"reasoning_tokens": reasoning_tokens}
+        }
+    }
+
+
+class MockState:
+    """Files and batches of the mock server (files are stored in a directory, batches in memory)."""
+
+    def __init__(self, storage_dir, settings):
+        self.storage_dir = storage_dir
+        self.settings = settings
+        self.files = {}
+        self.batches = {}
+        self.lock = threading.RLock()
+
+    def add_file(self, data, filename, purpose):
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        with open(os.path.join(self.storage_dir, file_id), "wb") as f:
+            f.write(data)
+        return self._register_file(file_id, filename, purpose)
+
+    def _register_file(self, file_id, filename, purpose):
+        file_object = {
+            "id": file_id,
+            "object": "file",
+            "bytes": os.path.getsize(os.path.join(self.storage_dir, file_id)),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed"
+        }
+        with self.lock:
+            self.files[file_id] = file_object
+        return file_object
+
+    def file_path(self, file_id):
+        return os.path.join(self.storage_dir, file_id)
+
+    def create_batch(self, input_file_id, endpoint, completion_window, metadata):
+        batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+        batch = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": endpoint,
+            "errors": None,
+            "input_file_id": input_file_id,
+            "completion_window": completion_window,
+            "status": "validating",
+            "output_file_id": None,
+            "error_file_id": None,
+            "created_at": int(time.time()),
+            "in_progress_at": None,
+            "expires_at": int(time.time()) + 24 * 3600,
+            "finalizing_at": None,
+            "completed_at": None,
+            "failed_at": None,
+            "expired_at": None,
+            "cancelling_at": None,
+            "cancelled_at": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            "metadata": metadata,
+            "_started": time.monotonic(),
+            "_generated": False,
+            "_cancelled": False,
+        }
+        with self.lock:
+            self.batches[batch_id] = batch
+
+        threading.Thread(target=self._generate_output, args=(batch,), daemon=True).start()
+        return self.public_batch(batch)
+
+    def _generate_output(self, batch):
+        """Answer all requests of a batch, writing the output and the error file line by line."""
+        output_id = f"file-{uuid.uuid4().hex[:24]}"
+        error_id = f"file-{uuid.uuid4().hex[:24]}"
+        counts = {"total": 0, "completed": 0, "failed": 0}
+
+        with open(self.file_path(batch["input_file_id"]), "r") as input_file, \
+             open(self.file_path(output_id), "w") as output_file, \
+             open(self.file_path(error_id), "w") as error_file:
+            for line in input_file:
+                if not line.strip():
+                    continue
+                if batch["_cancelled"]:
+                    break
+
+                request = json.loads(line)
+                counts["total"] += 1
+                if random.random() < self.settings.failure_rate:
+                    record = {
+                        "id": f"batch_req_{uuid.uuid4().hex[:24]}",
+                        "custom_id": request["custom_id"],
+                        "response": {"status_code": 500, "request_id": uuid.uuid4().hex, "body": {"error": {"message": "Synthetic server error", "type": "server_error"}}},
+                        "error": None
+                    }
+                    error_file.write(json.dumps(record) + "\n")
+                    counts["failed"] += 1
+                else:
+                    record = {
+                        "id": f"batch_req_{uuid.uuid4().hex[:24]}",
+                        "custom_id": request["custom_id"],
+                        "response": {"status_code": 200, "request_id": uuid.uuid4().hex, "body": synthetic_completion(request["body"], self.settings)},
+                        "error": None
+                    }
+                    output_file.write(json.dumps(record) + "\n")
+                    counts["completed"] += 1
+
+        with self.lock:
+            batch["request_counts"] = counts
+            if counts["completed"] > 0:
+                batch["_output_file_id"] = output_id
+                self._register_file(output_id, "batch_output.jsonl", "batch_output")
+            if counts["failed"] > 0:
+                batch["_error_file_id"] = error_id
+                self._register_file(error_id, "batch_errors.jsonl", "batch_output")
+            batch["_generated"] = True
+
+    def public_batch(self, batch):
+        """The batch as the API returns it, with its status advanced by the time since it was created."""
+        with self.lock:
+            elapsed = time.monotonic() - batch["_started"]
+            duration = self.settings.batch_duration
+            now = int(time.time())
+
+            if batch["status"] in ("completed", "cancelled", "failed"):
+                pass
+            elif batch["_cancelled"]:
+                batch["status"] = "cancelled" if batch["_generated"] else "cancelling"
+                batch["cancelled_at"] = now if batch["_generated"] else None
+            elif elapsed < duration * 0.1:
+                batch["status"] = "validating"
+            elif elapsed < duration * 0.9 or (not batch["_generated"] and elapsed < duration):
+                batch["status"] = "in_progress"
+                batch["in_progress_at"] = batch["in_progress_at"] or now
+            elif not batch["_generated"]:
+                batch["status"] = "finalizing"
+                batch["finalizing_at"] = batch["finalizing_at"] or now
+            else:
+                batch["status"] = "completed"
+                batch["completed_at"] = now
+                batch["output_file_id"] = batch.get("_output_file_id")
+                batch["error_file_id"] = batch.get("_error_file_id")
+
+            return {field: value for field, value in batch.items() if not field.startswith("_")}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    state = None
+
+    def log_message(self, format, *args):
+        if self.state.settings.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status_code, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for header, value in (headers or {}).items():
+            self.send_header(header, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_error_json(self, status_code, message, headers=None):
+        self.send_json(status_code, {"error": {"message": message, "type": "invalid_request_error", "code": None, "param": None}}, headers)
+
+    def send_file(self, file_id):
+        path = self.state.file_path(file_id)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(os.path.getsize(path)))
+        self.end_headers()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                self.wfile.write(chunk)
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path = url.path.rstrip("/")
+
+        match = re.fullmatch(r".*/files/([\w-]+)/content", path)
+        if match:
+            if match.group(1) not in self.state.files:
+                return self.send_error_json(404, f"No such File object: {match.group(1)}")
+            return self.send_file(match.group(1))
+
+        match = re.fullmatch(r".*/files/([\w-]+)", path)
+        if match:
+            if match.group(1) not in self.state.files:
+                return self.send_error_json(404, f"No such File object: {match.group(1)}")
+            return self.send_json(200, self.state.files[match.group(1)])
+
+        match = re.fullmatch(r".*/batches/([\w-]+)", path)
+        if match:
+            if match.group(1) not in self.state.batches:
+                return self.send_error_json(404, f"No such Batch object: {match.group(1)}")
+            return self.send_json(200, self.state.public_batch(self.state.batches[match.group(1)]))
+
+        if path.endswith("/batches"):
+            query = parse_qs(url.query)
+            limit = int(query.get("limit", ["20"])[0])
+            after = query.get("after", [None])[0]
+
+            # Newest first, like the API
+            batches = sorted(self.state.batches.values(), key=lambda batch: batch["_started"], reverse=True)
+            if after is not None:
+                ids = [batch["id"] for batch in batches]
+                batches = batches[ids.index(after) + 1:] if after in ids else []
+
+            page = [self.state.public_batch(batch) for batch in batches[:limit]]
+            return self.send_json(200, {
+                "object": "list",
+                "data": page,
+                "first_id": page[0]["id"] if page else None,
+                "last_id": page[-1]["id"] if page else None,
+                "has_more": len(batches) > limit
+            })
+
+        self.send_error_json(404, f"Unknown endpoint: {path}")
+
+    def do_POST(self):
+        path = urlparse(self.path).path.rstrip("/")
+        body = self.read_body()
+
+        if path.endswith("/files"):
+            return self.create_file(body)
+
+        if path.endswith("/batches"):
+            payload = json.loads(body)
+            if payload.get("input_file_id") not in self.state.files:
+                return self.send_error_json(400, f"Invalid input_file_id: {payload.get('input_file_id')}")
+            return self.send_json(200, self.state.create_batch(
+                payload["input_file_id"], payload.get("endpoint"), payload.get("completion_window"), payload.get("metadata")
+            ))
+
+        match = re.fullmatch(r".*/batches/([\w-]+)/cancel", path)
+        if match:
+            if match.group(1) not in self.state.batches:
+                return self.send_error_json(404, f"No such Batch object: {match.group(1)}")
+            batch = self.state.batches[match.group(1)]
+            batch["_cancelled"] = True
+            batch["cancelling_at"] = int(time.time())
+            return self.send_json(200, self.state.public_batch(batch))
+
+        if path.endswith("/chat/completions"):
+            return self.chat_completion(json.loads(body))
+
+        self.send_error_json(404, f"Unknown endpoint: {path}")
+
+    def create_file(self, body):
+        """files.create: take the file part out of the multipart/form-data body."""
+        match = re.search(r"boundary=(?P<boundary>[^;]+)", self.headers.get("Content-Type", ""))
+        if match is None:
+            return self.send_error_json(400, "Expected multipart/form-data")
+
+        boundary = b"--" + match.group("boundary").strip('"').encode()
+        fields = {}
+        filename = "upload.jsonl"
+        data = None
+        for part in body.split(boundary)[1:-1]:
+            head, _, content = part.partition(b"\r\n\r\n")
+            content = content[:-2] if content.endswith(b"\r\n") else content
+            name = re.search(rb'name="([^"]*)"', head).group(1).decode()
+            if b"filename=" in head:
+                filename = re.search(rb'filename="([^"]*)"', head).group(1).decode()
+                data = content
+            else:
+                fields[name] = content.decode()
+
+        if data is None:
+            return self.send_error_json(400, "No file in upload")
+        self.send_json(200, self.state.add_file(data, filename, fields.get("purpose", "batch")))
+
+    def chat_completion(self, body):
+        settings = self.state.settings
+        if settings.latency > 0:
+            time.sleep(random.uniform(0.5, 1.5) * settings.latency)
+
+        if random.random() < settings.failure_rate:
+            if random.random() < 0.5:
+                return self.send_json(429, {"error": {"message": "Rate limit reached (synthetic)", "type": "requests", "code": "rate_limit_exceeded", "param": None}}, {"retry-after": str(settings.retry_after)})
+            return self.send_json(500, {"error": {"message": "Synthetic server error", "type": "server_error", "code": None, "param": None}})
+
+        self.send_json(200, synthetic_completion(body, settings))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local mock of the OpenAI Files / Batches / Chat Completions API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--batch-duration", type=float, default=30, help="seconds until a batch is completed")
+    parser.add_argument("--latency", type=float, default=0.2, help="average seconds per chat completion")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of requests that fail (500 in batches, 429 / 500 in real time)")
+    parser.add_argument("--retry-after", type=float, default=1, help="seconds in the Retry-After header of synthetic rate limits")
+    parser.add_argument("--length-rate", type=float, default=0.0, help="share of completions cut off with finish_reason = length")
+    parser.add_argument("--completion-tokens", type=int, default=150, help="completion tokens per response (plus reasoning tokens)")
+    parser.add_argument("--storage", default=None, help="directory for uploaded and generated files (default: a temporary directory)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    settings = parser.parse_args()
+
+    if settings.seed is not None:
+        random.seed(settings.seed)
+
+    storage_dir = settings.storage or tempfile.mkdtemp(prefix="mock_openai_")
+    os.makedirs(storage_dir, exist_ok=True)
+    MockHandler.state = MockState(storage_dir, settings)
+
+    server = ThreadingHTTPServer((settings.host, settings.port), MockHandler)
+    print(f"Mock OpenAI API on http://{settings.host}:{settings.port}/v1 (files in {storage_dir})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,106 @@
+"""Processing manifest of 03.2_batch_process_loop.py (incremental reprocessing).
+
+For every processed run the manifest (documentation/processing_manifest.json) records the size, mtime and
+SHA-256 of each of its response files, the signature of the dataset cache it was compared with (see
+dataset_cache.cache_signature()), the version of the processing code (hash of the modules that shape the
+results), the number of bootstrap replicates of its confidence intervals and the tables it produced. 03.2 skips a run when all of these are unchanged and its tables
+still exist, so adding one file to a folder with hundreds of runs only processes that run. Files whose
+size and mtime match the manifest are not hashed again. A run without valid codings is recorded with the
+status "no valid codings" (and no tables), so it is skipped as well until one of its inputs changes.
+"""
+import os
+import json
+import hashlib
+from datetime import datetime
+
+from batch_download import file_sha256
+
+
+MANIFEST_PATH = os.path.join("documentation", "processing_manifest.json")
+RESPONSE_DIR = "Batch Response Files"
+
+# Status of a run whose response files hold no valid codings (no tables were written)
+NO_VALID_CODINGS = "no valid codings"
+
+# Modules whose changes alter the results of 03.2 (a change reprocesses every run)
+CODE_FILES = [
+    "03.2_batch_process_loop.py",
+    "comparison_table.py",
+    "agreement_measures.py",
+    "response_parser.py",
+    "batch_retry.py",
+    "batch_shards.py",
+    "run_artifacts.py",
+    "bootstrap_ci.py",
+    "cost_ledger.py",
+    "results_warehouse.py",
+]
+
+
+def load_processing_manifest(manifest_path=MANIFEST_PATH):
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+def save_processing_manifest(manifest, manifest_path=MANIFEST_PATH):
+    # Writing to a temporary file first, so an interrupted run never leaves a broken manifest
+    with open(f"{manifest_path}.tmp", "w") as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+
+def code_version(code_files=CODE_FILES):
+    """Hash of the processing code (missing files count as empty)."""
+    sha256 = hashlib.sha256()
+    for code_file in code_files:
+        sha256.update(code_file.encode("utf-8"))
+        if os.path.exists(code_file):
+            with open(code_file, "rb") as f:
+                sha256.update(f.read())
+    return sha256.hexdigest()
+
+def file_states(shard_files, previous_files=None, response_dir=RESPONSE_DIR):
+    """Size, mtime and SHA-256 of the response files of a run (hashes are reused while size and mtime are unchanged)."""
+    previous_files = previous_files or {}
+    states = {}
+    for shard_file in shard_files:
+        stat = os.stat(os.path.join(response_dir, shard_file))
+        previous = previous_files.get(shard_file) or {}
+        if previous.get("size") == stat.st_size and previous.get("mtime") == stat.st_mtime:
+            sha256 = previous["sha256"]
+        else:
+            sha256 = file_sha256(os.path.join(response_dir, shard_file))
+        states[shard_file] = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": sha256}
+    return states
+
+def has_same_files(entry, states):
+    """True if a run was processed from response files with the given hashes (the same files, none added or removed)."""
+    recorded_hashes = {name: state["sha256"] for name, state in entry["files"].items()}
+    current_hashes = {name: state["sha256"] for name, state in states.items()}
+    return recorded_hashes == current_hashes
+
+def is_up_to_date(entry, states, dataset_signature, version, bootstrap):
+    """True if a run was processed from the same files, dataset, code and bootstrap replicates, and its tables still exist
+    (a run without valid codings has none)."""
+    if entry is None:
+        return False
+    if entry.get("status") != NO_VALID_CODINGS and not os.path.exists(entry.get("artifact") or ""):
+        return False
+
+    return (
+        has_same_files(entry, states) and entry["dataset"] == dataset_signature and entry["code_version"] == version
+        # Entries written before the replicates were recorded are processed again
+        and entry.get("bootstrap") == bootstrap
+    )
+
+def record_run(manifest, run_name, states, dataset_signature, version, artifact, bootstrap):
+    """Record a processed run; artifact is None for a run without valid codings."""
+    manifest[run_name] = {
+        "status": "processed" if artifact is not None else NO_VALID_CODINGS,
+        "files": states,
+        "dataset": dataset_signature,
+        "code_version": version,
+        "bootstrap": bootstrap,
+        "artifact": artifact,
+        "processed": datetime.now().isoformat(timespec="seconds"),
+    }
@@ -0,0 +1,78 @@
+"""Encodings for the diagrams, desired outputs and response schema that are sent to the model.
+
+- "repr": Python dict repr, the original format of the prompts
+- "json": minified JSON (no spaces after separators, no ASCII escaping)
+- "table": one line per box with a header row, e.g. "Box | Truth | Student Response | Affects"
+
+Non-default encodings are combined with a de-duplicated response schema (see compact_schema), in
+which the box evaluation is defined once under $defs and referenced by every box.
+"""
+import copy
+import json
+
+
+SERIALIZATIONS = ("repr", "json", "table")
+
+
+def _table_cell(value):
+    if isinstance(value, list):
+        value = ",".join(str(item) for item in value)
+    elif value is None:
+        value = ""
+    # Keeping one box per line and the column separator unambiguous
+    return str(value).replace("|", "/").replace("\r", " ").replace("\n", " ")
+
+def to_table(boxes):
+    """Render {box: {field: value}} as a table with one line per box."""
+    columns = []
+    for content in boxes.values():
+        for field in content:
+            if field not in columns:
+                columns.append(field)
+
+    lines = [" | ".join(["Box"] + columns)]
+    for box, content in boxes.items():
+        lines.append(" | ".join([box] + [_table_cell(content.get(field)) for field in columns]))
+
+    return "\n".join(lines)
+
+def serialize(boxes, serialization="repr"):
+    """Serialize a diagram (model input) or a desired output in the chosen encoding."""
+    if serialization == "repr":
+        return f"{boxes}"
+    if serialization == "json":
+        return json.dumps(boxes, ensure_ascii=False, separators=(",", ":"))
+    if serialization == "table":
+        return to_table(boxes)
+
+    raise ValueError(f"Unknown serialization: {serialization}")
+
+def compact_schema(response_schema):
+    """De-duplicate the response schema: the box evaluation (and the box content of 'Correct Diagram') is defined once under $defs."""
+    response_schema = copy.deepcopy(response_schema)
+    schema = response_schema["json_schema"]["schema"]
+    definitions = {}
+
+    # All boxes share the definition of Box_1, written for "the box" instead of box_1
+    box_evaluation = copy.deepcopy(schema["properties"]["Box_1"])
+    box_evaluation.pop("description", None)
+    for field in box_evaluation["properties"].values():
+        field["description"] = field["description"].replace("box_1", "the box").replace("Box_1", "the box")
+    definitions["box_evaluation"] = box_evaluation
+
+    for box in schema["properties"]:
+        if box.startswith("Box_"):
+            schema["properties"][box] = {"$ref": "#/$defs/box_evaluation"}
+
+    if "Correct Diagram" in schema["properties"]:
+        definitions["box_content"] = {
+            "type": "string",
+            "description": "The content that should be filled into this box based on the provided original text"
+        }
+        correct_diagram = schema["properties"]["Correct Diagram"]
+        for box in correct_diagram["properties"]:
+            correct_diagram["properties"][box] = {"$ref": "#/$defs/box_content"}
+
+    schema["$defs"] = definitions
+
+    return response_schema
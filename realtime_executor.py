@@ -0,0 +1,214 @@
+"""Real-time alternative to the 24h Batch API.
+
+Sends the request bodies of a batch input file (as written by 01_batch_request.py) concurrently to
+/v1/chat/completions, limited by a concurrency limit and a requests- and tokens-per-minute limiter,
+and retries rate limits, timeouts and server errors with exponential backoff and full jitter.
+Results are written to 'Batch Response Files/<file name>' in the batch output format that
+load_batch_responses() in 03.x reads; requests that still fail are written to
+'Batch Response Files/Errors/<file name>' like a batch error file. Every request gets exactly one
+record: custom_ids that already have a result or error record are skipped, so an interrupted run can
+simply be restarted, and failed requests are resubmitted with batch_retry.py.
+
+Usage:
+    python realtime_executor.py "Batch Input Files/<file>.jsonl" [--concurrency 8] [--rpm 500] [--tpm 200000]
+    python realtime_executor.py ... --base-url http://127.0.0.1:8000/v1    (e.g. a local mock server)
+"""
+import os
+import time
+import json
+import asyncio
+import argparse
+from collections import deque
+from datetime import datetime
+
+import openai
+from openai import AsyncOpenAI
+
+from backoff import backoff_delay
+from cost_forecast import load_calibration, estimate_request_tokens
+
+
+RESPONSE_DIR = "Batch Response Files"
+ERROR_DIR = os.path.join(RESPONSE_DIR, "Errors")
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+
+class RateLimiter:
+    """Sliding one-minute window limiter for requests per minute and tokens per minute."""
+
+    def __init__(self, requests_per_minute, tokens_per_minute, window=60.0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.window = window
+        self._events = deque()
+        self._tokens_in_window = 0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens):
+        # Holding the lock while waiting keeps the waiting requests in order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                while self._events and now - self._events[0][0] >= self.window:
+                    self._tokens_in_window -= self._events.popleft()[1]
+
+                fits_requests = len(self._events) < self.requests_per_minute
+                # A single request larger than the whole budget is let through once the window is empty
+                fits_tokens = self._tokens_in_window + tokens <= self.tokens_per_minute or not self._events
+                if fits_requests and fits_tokens:
+                    self._events.append((now, tokens))
+                    self._tokens_in_window += tokens
+                    return
+
+                await asyncio.sleep(self.window - (now - self._events[0][0]))
+
+
+def retry_after_seconds(error):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+async def send_request(client, request, limiter, semaphore, tokens, max_retries, base_delay, max_delay):
+    """Send one request and return (output record, error record); exactly one of both is None."""
+    async with semaphore:
+        for attempt in range(max_retries + 1):
+            await limiter.acquire(tokens)
+            try:
+                raw_response = await client.chat.completions.with_raw_response.create(**request["body"])
+                output_record = {
+                    "id": f"realtime_{request['custom_id']}",
+                    "custom_id": request["custom_id"],
+                    "response": {
+                        "status_code": raw_response.status_code,
+                        "request_id": raw_response.request_id,
+                        "body": json.loads(raw_response.text)
+                    },
+                    "error": None
+                }
+                return output_record, None
+
+            except RETRYABLE_ERRORS as e:
+                if attempt == max_retries:
+                    error = e
+                    break
+                await asyncio.sleep(backoff_delay(attempt, base_delay, max_delay, retry_after_seconds(e)))
+
+            except openai.APIStatusError as e:
+                # Client errors (e.g. 400 invalid request) will not succeed on a retry
+                error = e
+                break
+
+            except ValueError as e:
+                # A response body that is not valid JSON fails this request only
+                error = e
+                break
+
+            except Exception as e:
+                # Other errors (e.g. a connection reset surfacing as a transport error of the HTTP client) are retried
+                # like connection errors and then recorded, they never end the whole run
+                if attempt == max_retries:
+                    error = e
+                    break
+                await asyncio.sleep(backoff_delay(attempt, base_delay, max_delay))
+
+    error_record = {
+        "id": f"realtime_{request['custom_id']}",
+        "custom_id": request["custom_id"],
+        "response": None,
+        "error": {"code": type(error).__name__, "message": str(error)}
+    }
+    return None, error_record
+
+def recorded_ids(path):
+    """custom_ids with a record in an output or error file (a line cut off by an interruption is ignored)."""
+    if not os.path.exists(path):
+        return set()
+
+    custom_ids = set()
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                custom_ids.add(json.loads(line)["custom_id"])
+            except (ValueError, KeyError):
+                continue
+    return custom_ids
+
+async def run_realtime(input_path, client, concurrency=8, requests_per_minute=500, tokens_per_minute=200000,
+                       max_retries=6, base_delay=1.0, max_delay=60.0, response_dir=RESPONSE_DIR, error_dir=ERROR_DIR):
+    """Execute all requests of a batch input file and write the results in batch output format."""
+    file_name = os.path.basename(input_path)
+    output_path = os.path.join(response_dir, file_name)
+    error_path = os.path.join(error_dir, file_name)
+    os.makedirs(error_dir, exist_ok=True)
+
+    with open(input_path, "r") as f:
+        requests = [json.loads(line) for line in f if line.strip()]
+
+    # Skipping requests that already have a result or an error record from an earlier (interrupted) run, so no
+    # record is written twice; failed requests are resubmitted with batch_retry.py
+    done = recorded_ids(output_path) | recorded_ids(error_path)
+    requests = [request for request in requests if request["custom_id"] not in done]
+
+    calibration = load_calibration()
+    limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    tasks = [
+        asyncio.create_task(send_request(client, request, limiter, semaphore, sum(estimate_request_tokens(request, calibration)), max_retries, base_delay, max_delay))
+        for request in requests
+    ]
+
+    succeeded = 0
+    failed = 0
+    started = datetime.now()
+    with open(output_path, "a") as output_file, open(error_path, "a") as error_file:
+        # Writing every result as soon as it arrives, so nothing is lost when the run is interrupted
+        for task in asyncio.as_completed(tasks):
+            output_record, error_record = await task
+            if output_record is not None:
+                output_file.write(json.dumps(output_record) + "\n")
+                output_file.flush()
+                succeeded += 1
+            else:
+                error_file.write(json.dumps(error_record) + "\n")
+                error_file.flush()
+                failed += 1
+
+    # Removing an empty error file
+    if os.path.getsize(error_path) == 0:
+        os.remove(error_path)
+
+    seconds = (datetime.now() - started).total_seconds()
+    print(f"{file_name}: {succeeded} succeeded, {failed} failed, {len(done)} skipped ({round(seconds, 1)} s)")
+
+    return succeeded, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Execute batch input files in real time instead of through the Batch API.")
+    parser.add_argument("input_files", nargs="+", help="batch input file(s) / shards written by 01_batch_request.py")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rpm", type=int, default=500, help="requests per minute")
+    parser.add_argument("--tpm", type=int, default=200000, help="tokens per minute (estimated input + output)")
+    parser.add_argument("--max-retries", type=int, default=6)
+    parser.add_argument("--base-url", default=None, help="e.g. a local mock server: http://127.0.0.1:8000/v1")
+    args = parser.parse_args()
+
+    # paste your OpenAI API key here or set as environmental variable (any value works for a local mock server)
+    client = AsyncOpenAI(
+        api_key=os.environ.get("OPENAI_API_KEY") or ("local" if args.base_url else None),
+        base_url=args.base_url,
+        max_retries=0
+    )
+
+    async def main():
+        for input_file in args.input_files:
+            await run_realtime(input_file, client, concurrency=args.concurrency, requests_per_minute=args.rpm,
+                               tokens_per_minute=args.tpm, max_retries=args.max_retries)
+
+    asyncio.run(main())
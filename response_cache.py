@@ -0,0 +1,131 @@
+"""Content-addressed cache of LLM responses.
+
+Requests are keyed by the SHA-256 of their normalized body (model, messages, seed, schema, temperature /
+reasoning effort), so a rerun of the same setting, model and diagram produces the same key. 01 only
+writes cache misses into the batch input file and writes the cached hits into
+'Batch Response Files/<run>.cached.jsonl' in the regular batch output format; 03.2 processes that
+file together with the fresh shards of the run and stores the fresh responses in the cache.
+"""
+import os
+import json
+import sqlite3
+import hashlib
+from datetime import datetime
+
+from batch_shards import INPUT_DIR, cached_name
+
+
+RESPONSE_DIR = "Batch Response Files"
+CACHE_PATH = os.path.join(RESPONSE_DIR, "response_cache.sqlite")
+
+
+def request_hash(request):
+    """SHA-256 of the normalized request body (custom_id is not part of the key)."""
+    normalized = json.dumps(request["body"], sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+def open_cache(cache_path=CACHE_PATH):
+    connection = sqlite3.connect(cache_path)
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS responses (
+            request_hash TEXT PRIMARY KEY,
+            model TEXT,
+            content TEXT,
+            usage TEXT,
+            response_body TEXT,
+            created TEXT
+        )
+    """)
+    return connection
+
+def split_cached(batch_requests, connection):
+    """Split batch requests into cache misses (to be sent) and batch output records for the cache hits."""
+    misses = []
+    cached_records = []
+    for request in batch_requests:
+        hash_value = request_hash(request)
+        row = connection.execute("SELECT response_body FROM responses WHERE request_hash = ?", (hash_value,)).fetchone()
+
+        if row is None:
+            misses.append(request)
+        else:
+            cached_records.append({
+                "id": f"cache-{hash_value[:24]}",
+                "custom_id": request["custom_id"],
+                "response": {"status_code": 200, "request_id": None, "body": json.loads(row[0])},
+                "error": None,
+                "from_cache": True
+            })
+
+    return misses, cached_records
+
+def write_cached_responses(run_name, cached_records, response_dir=RESPONSE_DIR):
+    """Write the cache hits of a run next to the responses that will be downloaded for it.
+
+    The file of an earlier run with the same name is always replaced (or removed if there are no hits),
+    as 03.2 merges every '<run>.cached.jsonl' into the run.
+    """
+    path = os.path.join(response_dir, f"{cached_name(run_name)}.jsonl")
+    if not cached_records:
+        if os.path.exists(path):
+            os.remove(path)
+        return None
+
+    with open(path, "w") as f:
+        for record in cached_records:
+            json.dump(record, f)
+            f.write("\n")
+
+    return path
+
+def is_cacheable(record):
+    """Only store complete, successful responses whose content is valid JSON."""
+    response = record.get("response") or {}
+    if response.get("status_code") != 200 or record.get("from_cache"):
+        return False
+
+    # A malformed body (no choices, no message) is not cacheable
+    try:
+        choice = response["body"]["choices"][0]
+        content = choice["message"].get("content")
+        if choice.get("finish_reason") != "stop" or content is None:
+            return False
+        json.loads(content)
+    except (KeyError, IndexError, TypeError, AttributeError, ValueError):
+        return False
+
+    return True
+
+def store_responses(response_file, connection, input_dir=INPUT_DIR, response_dir=RESPONSE_DIR):
+    """Store the responses of a downloaded (shard) file, joined on custom_id with the input file of the same name."""
+    input_path = os.path.join(input_dir, response_file)
+    if not os.path.exists(input_path):
+        return 0
+
+    with open(input_path, "r") as f:
+        hashes = {}
+        for line in f:
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            hashes[request["custom_id"]] = (request["body"]["model"], request_hash(request))
+
+    rows = []
+    created = datetime.now().isoformat(timespec="seconds")
+    with open(os.path.join(response_dir, response_file), "r") as f:
+        for line in f:
+            # Blank lines are skipped like in the response parser (they would otherwise stop 03.2 for every run)
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record["custom_id"] not in hashes or not is_cacheable(record):
+                continue
+
+            model, hash_value = hashes[record["custom_id"]]
+            body = record["response"]["body"]
+            rows.append((hash_value, model, body["choices"][0]["message"]["content"], json.dumps(body.get("usage")), json.dumps(body), created))
+
+    with connection:
+        connection.executemany("INSERT OR IGNORE INTO responses VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    return len(rows)
@@ -0,0 +1,189 @@
+"""Streaming, columnar parser for batch response files (used by 03.1 and 03.2).
+
+Reads a response file line by line, classifies every line (see batch_retry.py) and fills custom_id, the
+status of the line, the 12 box fields (Extraction, Position and Correct Position of Box_1 to Box_4), the
+usage counters and the model, creation time and API (batch or real-time) of the response into typed NumPy
+columns that are preallocated for the lines of the file. The values of a line go into one list per
+column, which is copied into the columns every chunk_rows lines with a slice assignment (much faster
+than setting the array elements one by one), so memory grows with the number of lines only and token sums
+are a single NumPy sum. orjson is used when it is installed. See benchmark_response_parser.py for a
+comparison with the previous line-by-line loaders.
+"""
+import json
+
+import numpy as np
+
+from batch_retry import classify_record
+
+# orjson (see requirements.txt) parses the response lines and their content about twice as fast as the json module (the fallback)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+BOX_FIELDS = ("Extraction", "Position", "Correct Position")
+N_BOXES = 4
+
+USAGE_COLUMNS = ("prompt_tokens", "completion_tokens", "cached_tokens", "reasoning_tokens")
+
+# Columns of a line other than the box fields, in the order parse_response_file() fills them
+LINE_COLUMNS = ("custom_id", "status", "from_cache", "model", "created", "batch", "has_usage", *USAGE_COLUMNS)
+
+
+def count_lines(path, chunk_size=16 * 1024 * 1024):
+    """Number of lines of a file (counted in large binary chunks, used to preallocate the columns)."""
+    lines = 0
+    last_chunk = b""
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            lines += chunk.count(b"\n")
+            last_chunk = chunk
+    # A last line without line break
+    return lines + (1 if last_chunk and not last_chunk.endswith(b"\n") else 0)
+
+def box_column(box, field):
+    return f"Box_{box} {field}"
+
+def n_boxes_of(schema):
+    if schema is None:
+        return N_BOXES
+    return sum(1 for field in schema.get("properties", {}) if field.startswith("Box_")) or N_BOXES
+
+def empty_columns(n_lines, n_boxes=N_BOXES):
+    columns = {
+        "custom_id": np.empty(n_lines, dtype=object),
+        "status": np.empty(n_lines, dtype=object),
+        "from_cache": np.zeros(n_lines, dtype=bool),
+        "model": np.full(n_lines, None, dtype=object),
+        "created": np.zeros(n_lines, dtype=np.int64),
+        "batch": np.zeros(n_lines, dtype=bool),
+        "has_usage": np.zeros(n_lines, dtype=bool),
+    }
+    for usage_column in USAGE_COLUMNS:
+        columns[usage_column] = np.zeros(n_lines, dtype=np.int64)
+
+    for box in range(1, n_boxes + 1):
+        columns[box_column(box, "Extraction")] = np.full(n_lines, None, dtype=object)
+        columns[box_column(box, "Position")] = np.full(n_lines, np.nan)
+        columns[box_column(box, "Correct Position")] = np.full(n_lines, np.nan)
+
+    return columns
+
+def parse_response_file(path, schema=None, chunk_rows=65536):
+    """Parse a batch response file into a dict of NumPy columns (one row per line)."""
+    loads = orjson.loads if orjson is not None else json.loads
+    n_boxes = n_boxes_of(schema)
+    columns = empty_columns(count_lines(path), n_boxes)
+
+    # The values of the current chunk, one list per column
+    chunk = {name: [] for name in columns}
+    (add_custom_id, add_status, add_from_cache, add_model, add_created, add_batch, add_has_usage,
+     add_prompt_tokens, add_completion_tokens, add_cached_tokens, add_reasoning_tokens) = (chunk[name].append for name in LINE_COLUMNS)
+    boxes = [
+        (f"Box_{box}", *(chunk[box_column(box, field)].append for field in BOX_FIELDS))
+        for box in range(1, n_boxes + 1)
+    ]
+    nan = np.nan
+    filled = 0
+
+    def flush():
+        n_rows = len(chunk["custom_id"])
+        for name, values in chunk.items():
+            columns[name][filled:filled + n_rows] = values
+            values.clear()
+        return filled + n_rows
+
+    # orjson parses the bytes of a line, json.loads() is faster on str
+    with open(path, "rb" if orjson is not None else "r") as f:
+        for line in f:
+            if line.isspace():
+                continue
+
+            record = loads(line)
+            status, value = classify_record(record, schema, loads=loads)
+            body = (record.get("response") or {}).get("body") or {}
+
+            add_custom_id(record["custom_id"])
+            add_status(status)
+            add_from_cache(bool(record.get("from_cache")))
+            add_model(body.get("model"))
+            add_created(body.get("created") or 0)
+            # realtime_executor.py writes its responses with ids "realtime_<custom_id>", everything else came from the Batch API
+            add_batch(not str(record.get("id") or "").startswith("realtime_"))
+
+            usage = body.get("usage")
+            if usage is not None:
+                add_has_usage(True)
+                add_prompt_tokens(usage["prompt_tokens"])
+                add_completion_tokens(usage["completion_tokens"])
+                add_cached_tokens((usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0)
+                add_reasoning_tokens((usage.get("completion_tokens_details") or {}).get("reasoning_tokens") or 0)
+            else:
+                add_has_usage(False)
+                add_prompt_tokens(0)
+                add_completion_tokens(0)
+                add_cached_tokens(0)
+                add_reasoning_tokens(0)
+
+            # Box fields of the "ok" lines only (missing boxes and fields stay None / NaN)
+            codings = value if status == "ok" else {}
+            for box, add_extraction, add_position, add_correct_position in boxes:
+                box_value = codings.get(box)
+                if isinstance(box_value, dict):
+                    add_extraction(box_value.get("Extraction"))
+                    add_position(box_value.get("Position", nan))
+                    add_correct_position(box_value.get("Correct Position", nan))
+                else:
+                    add_extraction(None)
+                    add_position(nan)
+                    add_correct_position(nan)
+
+            if len(chunk["custom_id"]) == chunk_rows:
+                filled = flush()
+
+    filled = flush()
+    # Blank lines were counted but not filled
+    return {name: column[:filled] for name, column in columns.items()}
+
+def billed_tokens(columns):
+    """Input, output and cached tokens of the lines that were paid for in this run (not from the response cache)."""
+    billed = columns["has_usage"] & ~columns["from_cache"]
+    return columns["prompt_tokens"][billed], columns["completion_tokens"][billed], columns["cached_tokens"][billed]
+
+def _numbers(column):
+    """A float column as a list of Python numbers, whole numbers as int like json.loads returns them."""
+    whole = np.isfinite(column) & (np.mod(column, 1) == 0)
+    if whole.all():
+        return column.astype(np.int64).tolist()
+    return [int(value) if is_whole else value for value, is_whole in zip(column.tolist(), whole.tolist())]
+
+def columns_to_responses(columns):
+    """Return the codings per diagram ({key: {"Box_n": {field: value}}}) of the "ok" lines and {custom_id: status} of the others."""
+    n_boxes = sum(1 for name in columns if name.endswith(" Extraction"))
+    ok = columns["status"] == "ok"
+
+    failures = dict(zip(columns["custom_id"][~ok].tolist(), columns["status"][~ok].tolist()))
+
+    # One list per column (instead of indexing the arrays per row)
+    boxes = [
+        (f"Box_{box}", columns[box_column(box, "Extraction")][ok].tolist(),
+         _numbers(columns[box_column(box, "Position")][ok]), _numbers(columns[box_column(box, "Correct Position")][ok]))
+        for box in range(1, n_boxes + 1)
+    ]
+
+    responses = {}
+    for row, custom_id in enumerate(columns["custom_id"][ok].tolist()):
+        responses[custom_id.replace("request-", "")] = {
+            box: {"Extraction": extraction[row], "Position": position[row], "Correct Position": correct_position[row]}
+            for box, extraction, position, correct_position in boxes
+            if extraction[row] is not None
+        }
+
+    return responses, failures
+
+def to_frame(columns):
+    """The columns as a pandas DataFrame (or pass them to pyarrow.table() for Arrow)."""
+    import pandas as pd
+
+    return pd.DataFrame(columns)
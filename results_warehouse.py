@@ -0,0 +1,269 @@
+"""Results warehouse: one SQLite database with the measures and comparison rows of all processed runs.
+
+03.x append every processed run (replacing earlier rows of the same run), so cross-run comparisons (05)
+and the export for the R analysis (06) are queries instead of re-reading every workbook. Tables:
+    runs          one row per run (file name '<run>.jsonl') with its metadata as columns: date, setting,
+                  layout, model, reasoning_effort (from the batch input file), examples, truth,
+                  diagram_creation, strategy (1-9, see STRATEGIES) and the n of the file name
+    measures      the Measures sheet, one row per measure with its section (e.g. "EXTRACTION DATA"),
+                  value (or text) and confidence interval, so measures are selected by name, not position
+    comparisons   the comparison table (Data sheet columns and Nummer, Klas, Tekstnaam), in row order
+SQLite is part of Python and already used for the job ledger and the response cache.
+
+Query API: query() for any SQL, select_runs(), measure_table() and comparison_rows(), all returning
+DataFrames and filtered on run metadata, e.g. measure_table({"Kappa": ("EXTRACTION DATA", "Kappa H-M")}, model="gpt-5").
+
+    python results_warehouse.py --import             add all processed runs (Parquet tables or older workbooks)
+    python results_warehouse.py "SELECT ..."         run a query
+"""
+import os
+import re
+import json
+import glob
+import sqlite3
+import argparse
+from datetime import datetime
+
+import pandas as pd
+
+from batch_retry import run_files as run_input_files
+from run_artifacts import ARTIFACT_DIR, measures_to_table, measures_from_table, read_run_table, run_files, has_run_table
+
+
+WAREHOUSE_PATH = os.path.join("documentation", "results.sqlite")
+INPUT_DIR = "Batch Input Files"
+
+# Columns of the comparisons table (a run without one of them stores NULL)
+COMPARISON_COLUMNS = {
+    "Dataset": "TEXT", "UUID": "TEXT", "Veld": "TEXT", "Code": "TEXT", "LLM_Code": "TEXT",
+    "Extraction Agreement": "INTEGER", "Extraction ConMat": "TEXT", "Veldnummer": "INTEGER", "Verbandnummer": "INTEGER",
+    "PositionCode": "INTEGER", "LLM_PositionCode": "INTEGER", "LLM_CorrectPosition": "INTEGER",
+    "PositionCode Agreement": "INTEGER", "PositionCode ConMat": "TEXT", "Position Agreement": "INTEGER",
+    "Nummer": "INTEGER", "Klas": "TEXT", "Tekstnaam": "TEXT",
+}
+
+RUN_COLUMNS = [
+    "file_name", "run_name", "date", "setting", "layout", "model", "reasoning_effort",
+    "examples", "truth", "diagram_creation", "strategy", "n", "processed"
+]
+
+# Strategy number of (model given (Truth), model created (wDiagramCreation), examples), as in the R analysis
+STRATEGIES = {
+    (False, False, 0): 1, (False, False, 5): 2, (False, False, 25): 3,
+    (True, False, 0): 4, (True, False, 5): 5, (True, False, 25): 6,
+    (False, True, 0): 7, (False, True, 5): 8, (False, True, 25): 9,
+}
+
+# '<date>_<setting><layout tag>_<model>_n<n>' as written by 01_batch_request.py (see layout_tag() there)
+RUN_NAME_PATTERN = re.compile(
+    r"^(?P<date>\d{4}-\d{2}-\d{2})_(?P<setting>.+?)(?P<layout>(?:_prefixCache)?(?:_compact[A-Z][a-z]+)?)_(?P<model>[^_]+)_n(?P<n>\d+)$"
+)
+
+
+def open_warehouse(warehouse_path=WAREHOUSE_PATH):
+    # Worker processes of 03.2 may write at the same time, SQLite then waits for the lock
+    connection = sqlite3.connect(warehouse_path, timeout=60)
+    comparison_columns = ",\n            ".join(f'"{column}" {column_type}' for column, column_type in COMPARISON_COLUMNS.items())
+    connection.executescript(f"""
+        CREATE TABLE IF NOT EXISTS runs (
+            file_name TEXT PRIMARY KEY,
+            run_name TEXT,
+            date TEXT,
+            setting TEXT,
+            layout TEXT,
+            model TEXT,
+            reasoning_effort TEXT,
+            examples INTEGER,
+            truth INTEGER,
+            diagram_creation INTEGER,
+            strategy INTEGER,
+            n INTEGER,
+            processed TEXT
+        );
+        CREATE TABLE IF NOT EXISTS measures (
+            file_name TEXT REFERENCES runs(file_name),
+            position INTEGER,
+            section TEXT,
+            measure TEXT,
+            value REAL,
+            text TEXT,
+            ci_low REAL,
+            ci_high REAL
+        );
+        CREATE TABLE IF NOT EXISTS comparisons (
+            file_name TEXT REFERENCES runs(file_name),
+            row INTEGER,
+            {comparison_columns}
+        );
+        CREATE INDEX IF NOT EXISTS measures_run ON measures (file_name, section, measure);
+        CREATE INDEX IF NOT EXISTS comparisons_run ON comparisons (file_name, row);
+    """)
+    return connection
+
+def reasoning_effort_of(run_name, input_dir=INPUT_DIR):
+    """Reasoning effort of the requests of a run (None for standard models or without batch input file)."""
+    for input_path in run_input_files(run_name, input_dir):
+        with open(input_path, "r") as f:
+            first_line = f.readline()
+        if first_line.strip():
+            return json.loads(first_line)["body"].get("reasoning_effort")
+    return None
+
+def run_metadata(file_name, input_dir=INPUT_DIR):
+    """Metadata of a run from its file name (and batch input file); fields that cannot be derived are None."""
+    run_name = file_name.removesuffix(".jsonl")
+    metadata = dict.fromkeys(RUN_COLUMNS)
+    metadata.update(file_name=file_name, run_name=run_name, reasoning_effort=reasoning_effort_of(run_name, input_dir))
+
+    match = RUN_NAME_PATTERN.match(run_name)
+    if match is None:
+        return metadata
+
+    setting = match["setting"]
+    examples = re.search(r"(?:^|_)(\d+)Examples(?:_|$)", setting)
+    metadata.update(
+        date=match["date"], setting=setting, layout=match["layout"].lstrip("_") or "default", model=match["model"], n=int(match["n"]),
+        examples=int(examples[1]) if examples else None,
+        truth=True if "_wTruth_" in f"_{setting}_" else False if "_woTruth_" in f"_{setting}_" else None,
+        diagram_creation="_wDiagramCreation" in setting,
+    )
+    metadata["strategy"] = STRATEGIES.get((metadata["truth"], metadata["diagram_creation"], metadata["examples"]))
+    return metadata
+
+def _number(value):
+    return None if pd.isna(value) else float(value)
+
+def measure_rows(measures_df):
+    """The Measures sheet as rows (position, section, measure, value, text, CI low, CI high) without header and blank rows."""
+    table = measures_to_table(measures_df.fillna(""))
+    empty = pd.Series(float("nan"), index=table.index)
+    columns = [table["Measure"], table["Value"], table["Text"], table.get("CI Low", empty), table.get("CI High", empty)]
+
+    rows = []
+    section = None
+    for position, (measure, value, text, ci_low, ci_high) in enumerate(zip(*columns)):
+        if measure == "":
+            section = None
+        elif pd.isna(value) and text == "":
+            # Section headers (e.g. "COSTS") have neither a value nor a text
+            section = measure
+        else:
+            rows.append((position, section, measure, _number(value), text or None, _number(ci_low), _number(ci_high)))
+    return rows
+
+def store_run(file_name, measures_df, comparison_df, warehouse_path=WAREHOUSE_PATH, input_dir=INPUT_DIR):
+    """Add a processed run (replacing the rows of an earlier processing of the same run)."""
+    metadata = run_metadata(file_name, input_dir)
+    metadata["processed"] = datetime.now().isoformat(timespec="seconds")
+
+    comparisons = comparison_df.reindex(columns=list(COMPARISON_COLUMNS)).astype(object)
+    comparisons = comparisons.where(comparisons.notna(), None)
+    comparisons.insert(0, "row", range(len(comparisons)))
+    comparisons.insert(0, "file_name", file_name)
+
+    connection = open_warehouse(warehouse_path)
+    with connection:
+        for table in ("runs", "measures", "comparisons"):
+            connection.execute(f"DELETE FROM {table} WHERE file_name = ?", (file_name,))
+        connection.execute(f"INSERT INTO runs VALUES ({', '.join('?' * len(RUN_COLUMNS))})", [metadata[column] for column in RUN_COLUMNS])
+        connection.executemany("INSERT INTO measures VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [(file_name, *row) for row in measure_rows(measures_df)])
+        connection.executemany(
+            f"INSERT INTO comparisons VALUES ({', '.join('?' * len(comparisons.columns))})",
+            comparisons.itertuples(index=False, name=None)
+        )
+    connection.close()
+
+def import_runs(artifact_dir=ARTIFACT_DIR, warehouse_path=WAREHOUSE_PATH):
+    """Add all runs in artifact_dir: their Parquet tables, or the workbooks of runs processed before them."""
+    file_names = run_files(artifact_dir)
+    for file_name in file_names:
+        measures_df = measures_from_table(read_run_table(file_name, "measures", artifact_dir=artifact_dir))
+        store_run(file_name, measures_df, read_run_table(file_name, "data", artifact_dir=artifact_dir), warehouse_path)
+        print(f"Imported: {file_name}")
+
+    for path in sorted(glob.glob(os.path.join(glob.escape(artifact_dir), "*.jsonl.xlsx"))):
+        file_name = os.path.basename(path).removesuffix(".xlsx")
+        if file_name in file_names or has_run_table(file_name, "data", artifact_dir):
+            continue
+        # "N/A" values are texts, not missing values
+        measures_df = pd.read_excel(path, sheet_name="Measures", keep_default_na=False)
+        store_run(file_name, measures_df, pd.read_excel(path, sheet_name="Data"), warehouse_path)
+        print(f"Imported: {file_name} (workbook)")
+
+def query(sql, params=(), warehouse_path=WAREHOUSE_PATH):
+    """Result of any SQL query as a DataFrame."""
+    connection = open_warehouse(warehouse_path)
+    try:
+        return pd.read_sql_query(sql, connection, params=params)
+    finally:
+        connection.close()
+
+def run_filter(filters):
+    """WHERE clause and parameters for filters on run metadata, e.g. model="gpt-5" or examples=[0, 5]."""
+    conditions, params = [], []
+    for column, value in filters.items():
+        if column not in RUN_COLUMNS:
+            raise ValueError(f"Unknown run column '{column}' (use one of {', '.join(RUN_COLUMNS)})")
+        values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+        conditions.append(f"runs.{column} IN ({', '.join('?' * len(values))})")
+        params += values
+    return (f"WHERE {' AND '.join(conditions)}" if conditions else ""), params
+
+def select_runs(warehouse_path=WAREHOUSE_PATH, **filters):
+    """The runs (with their metadata) matching the filters."""
+    where, params = run_filter(filters)
+    return query(f"SELECT * FROM runs {where} ORDER BY file_name", params, warehouse_path)
+
+def measure_table(measures, warehouse_path=WAREHOUSE_PATH, **filters):
+    """One row per run with its metadata and the given measures as numeric columns: {column: (section, measure)};
+    measures without a number (e.g. "N/A" costs of models without a known price) are NaN."""
+    where, params = run_filter(filters)
+    selects = [
+        f"MAX(CASE WHEN measures.section = ? AND measures.measure = ? THEN measures.value END) AS \"{column}\""
+        for column in measures
+    ]
+    # The parameters of the CASE expressions come before those of the WHERE clause
+    case_params = [value for section, measure in measures.values() for value in (section, measure)]
+    sql = f"""
+        SELECT runs.*, {', '.join(selects)}
+        FROM runs LEFT JOIN measures ON measures.file_name = runs.file_name
+        {where}
+        GROUP BY runs.file_name
+        ORDER BY runs.file_name
+    """
+    table = query(sql, case_params + params, warehouse_path)
+    # (columns without any number come back as None)
+    return table.astype({column: float for column in measures})
+
+def comparison_rows(columns=None, warehouse_path=WAREHOUSE_PATH, **filters):
+    """The comparison rows (all COMPARISON_COLUMNS or the given ones) of the matching runs with their run metadata, in run and row order."""
+    where, params = run_filter(filters)
+    selected = ", ".join(f'comparisons."{column}"' for column in (columns or COMPARISON_COLUMNS))
+    sql = f"""
+        SELECT {selected}, runs.*
+        FROM comparisons JOIN runs ON runs.file_name = comparisons.file_name
+        {where}
+        ORDER BY comparisons.file_name, comparisons.row
+    """
+    return query(sql, params, warehouse_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill or query the results warehouse (documentation/results.sqlite).")
+    parser.add_argument("sql", nargs="?", help="SQL query to run, e.g. \"SELECT model, AVG(value) FROM measures JOIN runs USING (file_name) WHERE measure = 'Total' GROUP BY model\"")
+    parser.add_argument("--import", dest="import_runs", action="store_true", help="add all processed runs in documentation/ (Parquet tables or older workbooks)")
+    parser.add_argument("--output", default=None, help="write the query result to this .xlsx or .csv file")
+    args = parser.parse_args()
+
+    if args.import_runs:
+        import_runs()
+
+    if args.sql:
+        result = query(args.sql)
+        if args.output is None:
+            with pd.option_context("display.max_rows", None, "display.max_columns", None, "display.width", 200):
+                print(result)
+        elif args.output.endswith(".csv"):
+            result.to_csv(args.output, index=False)
+        else:
+            result.to_excel(args.output, index=False)
@@ -0,0 +1,138 @@
+"""Parquet artifacts of the processed runs and the Excel reports generated from them (used by 03.x, 05 and 06).
+
+03.x write the tables of a run as Parquet files next to each other in documentation/:
+    <run>.jsonl.measures.parquet    Measures (Measure, Value, the Text of non-numeric values and the CI columns)
+    <run>.jsonl.data.parquet        comparison table (the columns of the Data sheet first, then the others)
+    <run>.jsonl.agreement.parquet   multi-class agreement (see agreement_measures.py)
+    <run>.jsonl.costs.parquet       cost ledger, one row per response line (see cost_ledger.py)
+Parquet is written and read much faster than a workbook and readers can load single columns. The Excel
+workbook with the Measures, Data, Agreement and Costs sheets ('<run>.jsonl.xlsx', as before) is only a report,
+written by 03.2 with --excel or afterwards with:
+    python run_artifacts.py [<run> ...] [--force]
+which (re)generates the reports of the given runs (default: all) whose Parquet files are newer.
+"""
+import os
+import glob
+import argparse
+
+import numpy as np
+import pandas as pd
+
+
+ARTIFACT_DIR = "documentation"
+TABLES = ("measures", "data", "agreement", "costs")
+
+# Columns (and order) of the Data sheet
+DATA_COLUMNS = [
+    "Dataset", "UUID", "Veld", "Code", "LLM_Code", "Extraction Agreement", "Extraction ConMat",
+    "Veldnummer", "Verbandnummer", "PositionCode", "LLM_PositionCode", "LLM_CorrectPosition",
+    "PositionCode Agreement", "PositionCode ConMat", "Position Agreement"
+]
+
+
+def artifact_path(file_name, table, artifact_dir=ARTIFACT_DIR):
+    return os.path.join(artifact_dir, f"{file_name}.{table}.parquet")
+
+def report_path(file_name, artifact_dir=ARTIFACT_DIR):
+    return os.path.join(artifact_dir, f"{file_name}.xlsx")
+
+def measures_to_table(measures_df):
+    """Measures with a numeric Value column (Parquet columns hold one type); texts such as "" or "N/A" go to Text."""
+    values = pd.to_numeric(measures_df["Value"], errors="coerce")
+    table = pd.DataFrame({
+        "Measure": measures_df["Measure"].astype(str),
+        "Value": values.astype(float),
+        "Text": np.where(values.isna(), measures_df["Value"].astype(str), ""),
+    })
+    # Further numeric columns (e.g. the confidence intervals of bootstrap_ci.py), empty cells as NaN
+    for column in measures_df.columns.drop(["Measure", "Value"]):
+        table[column] = pd.to_numeric(measures_df[column], errors="coerce").astype(float)
+    return table
+
+def measures_from_table(table):
+    """The Measures sheet (Measure, Value) of a measures table."""
+    values = [text if pd.isna(value) else value for value, text in zip(table["Value"], table["Text"])]
+    measures_df = pd.DataFrame({"Measure": table["Measure"], "Value": values})
+    for column in table.columns.drop(["Measure", "Value", "Text"]):
+        measures_df[column] = table[column].astype(object).where(table[column].notna(), "")
+    return measures_df
+
+def write_run_artifacts(file_name, measures_df, comparison_df, agreement_df, costs_df=None, artifact_dir=ARTIFACT_DIR):
+    """Write the Parquet tables of a run (the cost ledger if given) and return the path of its data table."""
+    other_columns = [column for column in comparison_df.columns if column not in DATA_COLUMNS]
+    tables = {
+        "measures": measures_to_table(measures_df),
+        "data": comparison_df[DATA_COLUMNS + other_columns],
+        "agreement": agreement_df,
+    }
+    if costs_df is not None:
+        tables["costs"] = costs_df
+    for table, df in tables.items():
+        # Writing to a temporary file first, so readers never see a half-written table
+        path = artifact_path(file_name, table, artifact_dir)
+        df.to_parquet(f"{path}.tmp", index=False)
+        os.replace(f"{path}.tmp", path)
+
+    return artifact_path(file_name, "data", artifact_dir)
+
+def read_run_table(file_name, table, columns=None, artifact_dir=ARTIFACT_DIR):
+    """Read one table of a run (only the given columns)."""
+    return pd.read_parquet(artifact_path(file_name, table, artifact_dir), columns=columns)
+
+def has_run_table(file_name, table, artifact_dir=ARTIFACT_DIR):
+    return os.path.exists(artifact_path(file_name, table, artifact_dir))
+
+def run_files(artifact_dir=ARTIFACT_DIR):
+    """File names ('<run>.jsonl') of all runs with Parquet artifacts."""
+    suffix = ".data.parquet"
+    return sorted(os.path.basename(path)[:-len(suffix)] for path in glob.glob(os.path.join(glob.escape(artifact_dir), f"*{suffix}")))
+
+def write_excel_report(file_name, artifact_dir=ARTIFACT_DIR):
+    """Write the workbook (Measures, Data, Agreement and, if there is a cost ledger, Costs sheets) of a run from its Parquet tables."""
+    measures_df = measures_from_table(read_run_table(file_name, "measures", artifact_dir=artifact_dir))
+    comparison_df = read_run_table(file_name, "data", columns=DATA_COLUMNS, artifact_dir=artifact_dir)
+    agreement_df = read_run_table(file_name, "agreement", artifact_dir=artifact_dir)
+    costs_df = read_run_table(file_name, "costs", artifact_dir=artifact_dir) if has_run_table(file_name, "costs", artifact_dir) else None
+
+    output_path = report_path(file_name, artifact_dir)
+    with pd.ExcelWriter(output_path, engine="xlsxwriter") as writer:
+        measures_df.to_excel(writer, sheet_name="Measures", index=False)
+        comparison_df.to_excel(writer, sheet_name="Data", index=False)
+        agreement_df.to_excel(writer, sheet_name="Agreement", index=False)
+        if costs_df is not None:
+            # Excel has no time zones
+            costs_df.assign(created=costs_df["created"].dt.tz_localize(None)).to_excel(writer, sheet_name="Costs", index=False)
+            writer.sheets["Costs"].autofit()
+
+        measures_sheet = writer.sheets["Measures"]
+        data_sheet = writer.sheets["Data"]
+        agreement_sheet = writer.sheets["Agreement"]
+
+        measures_sheet.autofit()
+        data_sheet.autofit()
+        agreement_sheet.autofit()
+        data_sheet.set_column("C:C", 80)
+
+    return output_path
+
+def report_is_current(file_name, artifact_dir=ARTIFACT_DIR):
+    output_path = report_path(file_name, artifact_dir)
+    if not os.path.exists(output_path):
+        return False
+    return all(
+        os.path.getmtime(output_path) >= os.path.getmtime(artifact_path(file_name, table, artifact_dir))
+        for table in TABLES if has_run_table(file_name, table, artifact_dir)
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the Excel reports of processed runs from their Parquet tables.")
+    parser.add_argument("runs", nargs="*", help="run names or file names (default: all processed runs)")
+    parser.add_argument("--force", action="store_true", help="also rewrite reports that are newer than their Parquet tables")
+    args = parser.parse_args()
+
+    file_names = [f"{run.removesuffix('.xlsx').removesuffix('.jsonl')}.jsonl" for run in args.runs] or run_files()
+    for file_name in file_names:
+        if not args.force and report_is_current(file_name):
+            continue
+        print(f"Wrote: {write_excel_report(file_name)}")
@@ -0,0 +1,88 @@
+"""Streaming download and incremental parse of Files API files (batch_download.py) with a stand-in client
+that serves the file in small chunks.
+"""
+import os
+import sys
+import json
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_download import iter_records, download_file, checksum_path, file_sha256
+
+
+class FakeFiles:
+    """client.files of the OpenAI SDK for one file: retrieve() and with_streaming_response.content()."""
+
+    def __init__(self, data, chunk_size=7, reported_bytes=None):
+        self.data = data
+        self.chunk_size = chunk_size
+        self.reported_bytes = len(data) if reported_bytes is None else reported_bytes
+        self.downloads = 0
+        self.with_streaming_response = SimpleNamespace(content=self.content)
+
+    def retrieve(self, file_id):
+        return SimpleNamespace(id=file_id, bytes=self.reported_bytes)
+
+    def content(self, file_id):
+        self.downloads += 1
+        return FakeResponse(self.data, self.chunk_size)
+
+class FakeResponse:
+    def __init__(self, data, chunk_size):
+        self.data = data
+        self.chunk_size = chunk_size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def iter_bytes(self, chunk_size=None):
+        for start in range(0, len(self.data), self.chunk_size):
+            yield self.data[start:start + self.chunk_size]
+
+
+RECORDS = [{"custom_id": f"request-{index}", "response": {"status_code": 200, "body": {"text": "é" * index}}} for index in range(5)]
+DATA = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in RECORDS).encode("utf-8")
+
+
+@pytest.mark.parametrize("data", [DATA, DATA.rstrip(b"\n"), DATA.replace(b"\n", b"\n\n", 1)])
+def test_iter_records_yields_the_lines_while_streaming(tmp_path, data):
+    client = SimpleNamespace(files=FakeFiles(data))
+    path = str(tmp_path / "run.jsonl")
+
+    records = iter_records(client, "file-1", path)
+    assert next(records) == RECORDS[0]
+    # The file is only complete (and renamed) once all records were consumed
+    assert not os.path.exists(path)
+    assert list(records) == RECORDS[1:]
+
+    with open(path, "rb") as f:
+        assert f.read() == data
+    with open(checksum_path(path)) as f:
+        assert f.read().split()[0] == file_sha256(path)
+
+def test_iter_records_without_path_and_incomplete_stream():
+    assert list(iter_records(SimpleNamespace(files=FakeFiles(DATA)), "file-1")) == RECORDS
+
+    with pytest.raises(IOError):
+        list(iter_records(SimpleNamespace(files=FakeFiles(DATA, reported_bytes=len(DATA) + 1)), "file-1"))
+
+def test_download_file_skips_only_unchanged_files(tmp_path):
+    files = FakeFiles(DATA)
+    client = SimpleNamespace(files=files)
+    path = str(tmp_path / "run.jsonl")
+
+    assert not download_file(client, "file-1", path)["skipped"]
+    assert download_file(client, "file-1", path)["skipped"]
+
+    # Same size, other content: the stored checksum no longer matches
+    with open(path, "r+b") as f:
+        f.write(b"[")
+    download = download_file(client, "file-1", path)
+    assert not download["skipped"] and files.downloads == 2
+    assert download["sha256"] == file_sha256(path)
@@ -0,0 +1,168 @@
+"""creating_comparison_df() against the previous row-by-row implementation, on a small generated dataset
+with random codings (including values outside the g/c and 0/1 codes), so the student answers workbook is
+not needed.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dataset_cache import GroupedResponses, filter_data, group_data, create_student_responses
+from comparison_table import creating_comparison_df
+
+
+def calculating_confusion_matrix(row, Code_Field, LLM_Code_Field, Agreement_Field, ConMat_Field, Correct, Incorrect):
+    if row[Code_Field] == Correct and row[LLM_Code_Field] == Correct:
+        row[Agreement_Field] = 1
+        row[ConMat_Field] = "TP"
+    elif row[Code_Field] == Correct and row[LLM_Code_Field] == Incorrect:
+        row[Agreement_Field] = 0
+        row[ConMat_Field] = "FN"
+    elif row[Code_Field] == Incorrect and row[LLM_Code_Field] == Correct:
+        row[Agreement_Field] = 0
+        row[ConMat_Field] = "FP"
+    elif row[Code_Field] == Incorrect and row[LLM_Code_Field] == Incorrect:
+        row[Agreement_Field] = 1
+        row[ConMat_Field] = "TN"
+
+def creating_comparison_df_rowwise(responses, student_responses):
+    """Previous implementation of creating_comparison_df() (one pass per row), the reference of the tests."""
+    # Setting up rows to capture each row with original response and llm coding
+    rows = []
+
+    # Looping through llm responses to attach the llm coding to the right row
+    for key, value in responses.items():
+        # Determining correct original responses for current llm coding
+        original_response = student_responses[key]
+        llm_response = value
+
+        # Looping through the rows of the current response to add the llm coding to the right field (i.e., row)
+        for row in original_response.iterrows():
+            content = row[1]
+            field_number = content["Veldnummer"]
+
+            content["LLM_Code"] = llm_response[f"Box_{field_number}"]["Extraction"]
+            content["LLM_PositionCode"] = llm_response[f"Box_{field_number}"]["Position"]
+            content["LLM_CorrectPosition"] = llm_response[f"Box_{field_number}"]["Correct Position"]
+            rows.append(content)
+
+    for row in rows:
+        # Adding columns for agreement (0, 1) and response categorisation (TP, TN, FP, FN)
+        calculating_confusion_matrix(row=row, Code_Field="Code", LLM_Code_Field="LLM_Code", Agreement_Field="Extraction Agreement", ConMat_Field="Extraction ConMat", Correct="g", Incorrect="c")
+
+        # Adding columns for Position to compare coding between
+        ## Adding PositionCode clolumn with boolean whether Veldnummer & Verbandnummer match
+        if row["Code"] == "c":
+            row["PositionCode"] = 2
+        elif row["Veldnummer"] == row["Verbandnummer"]:
+            row["PositionCode"] = 1
+        else:
+            row["PositionCode"] = 0
+
+        ## Adding position Code Agreement
+        calculating_confusion_matrix(row=row, Code_Field="PositionCode", LLM_Code_Field="LLM_PositionCode", Agreement_Field="PositionCode Agreement", ConMat_Field="PositionCode ConMat", Correct=1, Incorrect=0)
+
+        ## Adding CorrectPosition Agreemant
+        if row["Verbandnummer"] == row["LLM_CorrectPosition"]:
+            row["Position Agreement"] = 1
+        else:
+            row["Position Agreement"] = 0
+
+    return pd.DataFrame(rows)
+
+def generated_data(n_students=12, seed=1):
+    """Rows in the layout of the student answers workbook: 4 fields per diagram, other datasets and codes mixed in."""
+    rng = random.Random(seed)
+    rows = []
+    for nummer in range(1, n_students + 1):
+        for klas in ("K1", "K2"):
+            for tekstnaam in ("Metro", "Brood"):
+                for veldnummer in range(1, 5):
+                    rows.append({
+                        "Dataset": rng.choice(["Desar", "Desar", "Desar", "Other"]),
+                        "Nummer": nummer,
+                        "Klas": klas,
+                        "Tekstnaam": tekstnaam,
+                        "Veldnummer": veldnummer,
+                        "Verbandnummer": rng.choice([1, 2, 3, 4, 9]),
+                        "Code": rng.choice(["g", "g", "c", "o"]),
+                        "Antwoord": f"answer {nummer} {veldnummer}",
+                    })
+    data = pd.DataFrame(rows)
+    # Row labels as in a filtered workbook (not 0..n-1)
+    data.index = data.index * 3 + 7
+    return data
+
+def random_responses(student_responses, n_diagrams, seed=1):
+    """Random codings (including values outside the g/c and 0/1 codes) for n diagrams."""
+    rng = random.Random(seed)
+    keys = rng.sample(sorted(student_responses), min(n_diagrams, len(student_responses)))
+    return {
+        key: {
+            f"Box_{box}": {
+                "Extraction": rng.choice(["g", "c", "o", None]),
+                "Position": rng.choice([0, 1, 2, 9]),
+                "Correct Position": rng.choice([1, 2, 3, 4, 9])
+            }
+            for box in range(1, 5)
+        }
+        for key in keys
+    }
+
+def grouped_responses(student_responses):
+    """The same diagrams as a GroupedResponses mapping (the cached dataset of dataset_cache.py)."""
+    frames = list(student_responses.values())
+    stops = np.cumsum([len(frame) for frame in frames])
+    groups = pd.DataFrame({"key": list(student_responses), "start": stops - [len(frame) for frame in frames], "stop": stops})
+    return GroupedResponses(pd.concat(frames), groups)
+
+def assert_same_rows(result, expected):
+    # The row-wise column order depends on which fields the first rows got, so only the set of columns is compared
+    assert sorted(result.columns) == sorted(expected.columns)
+    assert list(result.index) == list(expected.index)
+    for column in expected.columns:
+        for expected_value, value in zip(expected[column].tolist(), result[column].tolist()):
+            assert (pd.isna(expected_value) and pd.isna(value)) or expected_value == value, (column, expected_value, value)
+
+
+@pytest.fixture(scope="module")
+def student_responses():
+    return create_student_responses(group_data(filter_data(generated_data())))
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_matches_rowwise_implementation(student_responses, seed):
+    responses = random_responses(student_responses, 20, seed=seed)
+    expected = creating_comparison_df_rowwise(responses, student_responses)
+
+    assert_same_rows(creating_comparison_df(responses, student_responses), expected)
+    assert_same_rows(creating_comparison_df(responses, grouped_responses(student_responses)), expected)
+
+def test_agreement_and_labels():
+    data = pd.DataFrame({
+        "Dataset": "Desar", "Nummer": 1, "Klas": "K1", "Tekstnaam": "Metro",
+        "Veldnummer": [1, 2, 3, 4], "Verbandnummer": [1, 3, 3, 2], "Code": ["g", "g", "c", "c"],
+    })
+    student_responses = create_student_responses(group_data(filter_data(data)))
+    responses = {"1_K1_Metro": {
+        "Box_1": {"Extraction": "g", "Position": 1, "Correct Position": 1},
+        "Box_2": {"Extraction": "c", "Position": 1, "Correct Position": 2},
+        "Box_3": {"Extraction": "g", "Position": 2, "Correct Position": 3},
+        "Box_4": {"Extraction": "c", "Position": 9, "Correct Position": 9},
+    }}
+
+    result = creating_comparison_df(responses, student_responses)
+
+    assert result["Extraction ConMat"].tolist() == ["TP", "FN", "FP", "TN"]
+    assert result["Extraction Agreement"].tolist() == [1, 0, 0, 1]
+    assert result["PositionCode"].tolist() == [1, 0, 2, 2]
+    assert result["PositionCode ConMat"].tolist()[:2] == ["TP", "FP"]
+    assert result["PositionCode Agreement"].isna().tolist() == [False, False, True, True]
+    assert result["Position Agreement"].tolist() == [1, 0, 1, 0]
@@ -0,0 +1,40 @@
+"""The Parquet cache of dataset_cache.py returns the values of the workbook with their original types, also in
+free-text columns that mix numbers, text and dates (such as Veld).
+"""
+import os
+import sys
+import datetime
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dataset_cache import load_dataset, load_filtered_dataset
+
+
+VELD = [7, "tekst", 2.5, None, datetime.datetime(2022, 7, 4, 9, 30), "8"]
+
+
+def write_workbook(path):
+    rows = [
+        {"Dataset": "Desar", "Nummer": 1, "Klas": "K1", "Tekstnaam": "Metro", "Veldnummer": veldnummer,
+         "Verbandnummer": veldnummer, "Veld": veld, "Code": "g"}
+        for veldnummer, veld in enumerate(VELD, start=1)
+    ]
+    pd.DataFrame(rows).to_excel(path, index=False)
+
+def assert_same_values(values, expected):
+    assert [type(value) for value in values] == [type(value) for value in expected]
+    assert all((pd.isna(value) and pd.isna(other)) or value == other for value, other in zip(values, expected))
+
+
+def test_mixed_columns_keep_their_types(tmp_path):
+    workbook = str(tmp_path / "answers.xlsx")
+    write_workbook(workbook)
+    expected = pd.read_excel(workbook)["Veld"].tolist()
+
+    # The first load builds the cache, the second one reads it
+    for _ in range(2):
+        assert_same_values(load_dataset(workbook, str(tmp_path / "cache"))["Veld"].tolist(), expected)
+        filtered_data, student_responses = load_filtered_dataset(workbook, str(tmp_path / "cache"))
+        assert_same_values(student_responses["1_K1_Metro"]["Veld"].tolist(), expected)
@@ -0,0 +1,150 @@
+"""The pipeline against the local mock of the OpenAI API (mock_openai_server.py), started on an ephemeral port:
+real-time retries of rate limits and server errors (realtime_executor.py), paging through the batch list
+(batch_poller.py) and the retry file of the requests a batch failed (batch_download.py, batch_retry.py).
+"""
+import os
+import sys
+import json
+import asyncio
+import threading
+from types import SimpleNamespace
+from urllib.parse import urlparse
+from http.server import ThreadingHTTPServer
+
+import pytest
+from openai import OpenAI, AsyncOpenAI
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_openai_server import MockHandler, MockState
+from realtime_executor import run_realtime
+from batch_poller import list_batches, wait_for_batches
+from batch_download import download_batch
+from batch_retry import collect_failures, write_retry_file
+
+
+SCHEMA = {
+    "type": "object",
+    "properties": {"Box_1": {"type": "object", "properties": {"Extraction": {"type": "string"}}, "required": ["Extraction"]}},
+    "required": ["Box_1"],
+}
+
+
+class RecordingHandler(MockHandler):
+    """MockHandler that records the method, path and status code of every response."""
+    responses = []
+
+    def send_json(self, status_code, payload, headers=None):
+        self.responses.append((self.command, urlparse(self.path).path, status_code))
+        super().send_json(status_code, payload, headers)
+
+
+@pytest.fixture
+def mock_server(tmp_path, monkeypatch):
+    # The scripts write to relative directories (and the token calibration), so the tests run in an empty directory
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("storage")
+
+    settings = SimpleNamespace(batch_duration=0.5, latency=0, failure_rate=0.0, retry_after=0, length_rate=0.0, completion_tokens=10, verbose=False)
+    handler = type("Handler", (RecordingHandler,), {"state": MockState(str(tmp_path / "storage"), settings), "responses": []})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield SimpleNamespace(base_url=f"http://127.0.0.1:{server.server_address[1]}/v1", settings=settings, responses=handler.responses)
+
+    server.shutdown()
+    server.server_close()
+
+def write_requests(path, n):
+    requests = [
+        {
+            "custom_id": f"request-{index}",
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": "gpt-4o-2024-08-06",
+                "messages": [{"role": "user", "content": f"diagram {index}"}],
+                "response_format": {"type": "json_schema", "json_schema": {"name": "coding", "schema": SCHEMA}},
+            },
+        }
+        for index in range(n)
+    ]
+    with open(path, "w") as f:
+        f.writelines(json.dumps(request) + "\n" for request in requests)
+    return [request["custom_id"] for request in requests]
+
+def custom_ids(path):
+    with open(path, "r") as f:
+        return sorted(json.loads(line)["custom_id"] for line in f if line.strip())
+
+
+def test_realtime_executor_retries_rate_limits_and_server_errors(mock_server):
+    os.makedirs("Batch Input Files")
+    requested = write_requests(os.path.join("Batch Input Files", "run.jsonl"), 20)
+    # Half of the attempts fail, half of those with a rate limit (429) and half with a server error (500)
+    mock_server.settings.failure_rate = 0.5
+
+    client = AsyncOpenAI(api_key="local", base_url=mock_server.base_url, max_retries=0)
+    succeeded, failed = asyncio.run(run_realtime(os.path.join("Batch Input Files", "run.jsonl"), client, concurrency=4, max_retries=50, base_delay=0.01, max_delay=0.05))
+
+    statuses = [status for method, path, status in mock_server.responses if path.endswith("/chat/completions")]
+    assert 429 in statuses and 500 in statuses
+    assert (succeeded, failed) == (20, 0) and statuses.count(200) == 20
+    assert custom_ids(os.path.join("Batch Response Files", "run.jsonl")) == sorted(requested)
+    assert not os.path.exists(os.path.join("Batch Response Files", "Errors", "run.jsonl"))
+
+def test_realtime_executor_records_requests_that_keep_failing(mock_server):
+    os.makedirs("Batch Input Files")
+    requested = write_requests(os.path.join("Batch Input Files", "run.jsonl"), 3)
+    mock_server.settings.failure_rate = 1.0
+
+    client = AsyncOpenAI(api_key="local", base_url=mock_server.base_url, max_retries=0)
+    succeeded, failed = asyncio.run(run_realtime(os.path.join("Batch Input Files", "run.jsonl"), client, concurrency=3, max_retries=0))
+
+    assert (succeeded, failed) == (0, 3)
+    assert custom_ids(os.path.join("Batch Response Files", "Errors", "run.jsonl")) == sorted(requested)
+
+def test_list_batches_pages_through_all_batches(mock_server):
+    client = OpenAI(api_key="local", base_url=mock_server.base_url)
+    write_requests("requests.jsonl", 1)
+    with open("requests.jsonl", "rb") as f:
+        input_file_id = client.files.create(file=f, purpose="batch").id
+
+    created = [
+        client.batches.create(input_file_id=input_file_id, endpoint="/v1/chat/completions", completion_window="24h", metadata={"description": f"2026-01-0{index}_run"}).id
+        for index in range(1, 6)
+    ]
+
+    batches = list_batches(client, page_size=2)
+    pages = [path for method, path, status in mock_server.responses if method == "GET" and path.endswith("/batches")]
+    assert len(pages) == 3
+    assert [batch.id for batch in batches] == created[::-1]
+    assert [batch.id for batch in list_batches(client, prefix="2026-01-03", page_size=2)] == [created[2]]
+
+def test_failed_batch_requests_are_written_to_a_retry_file(mock_server):
+    os.makedirs("Batch Input Files")
+    os.makedirs("Batch Response Files")
+    requested = write_requests(os.path.join("Batch Input Files", "run.jsonl"), 20)
+    mock_server.settings.failure_rate = 0.5
+
+    client = OpenAI(api_key="local", base_url=mock_server.base_url)
+    with open(os.path.join("Batch Input Files", "run.jsonl"), "rb") as f:
+        input_file_id = client.files.create(file=f, purpose="batch").id
+    batch = client.batches.create(input_file_id=input_file_id, endpoint="/v1/chat/completions", completion_window="24h", metadata={"description": "run"})
+
+    batch = wait_for_batches(client, [batch.id], base_delay=0.1, max_delay=0.2, timeout=30)[batch.id]
+    assert batch.status == "completed" and batch.error_file_id is not None
+    download_batch(client, batch, "run")
+
+    failures = collect_failures("run")
+    failed_ids = custom_ids(os.path.join("Batch Response Files", "Errors", "run.jsonl"))
+    assert sorted(failures) == failed_ids and set(failures.values()) == {"http_error"}
+    assert sorted(custom_ids(os.path.join("Batch Response Files", "run.jsonl")) + failed_ids) == sorted(requested)
+
+    name = write_retry_file("run", failures, max_completion_tokens=4000)
+    assert name == "run.retry001"
+    with open(os.path.join("Batch Input Files", f"{name}.jsonl"), "r") as f:
+        retried = [json.loads(line) for line in f]
+    assert [request["custom_id"] for request in retried] == failed_ids
+    assert all(request["body"]["max_completion_tokens"] == 4000 for request in retried)
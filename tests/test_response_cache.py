@@ -0,0 +1,48 @@
+"""Which responses response_cache.py stores, and the '<run>.cached.jsonl' file of a rebuilt run."""
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from response_cache import is_cacheable, write_cached_responses, open_cache, store_responses
+
+
+def record(body, status_code=200):
+    return {"custom_id": "request-1", "response": {"status_code": status_code, "body": body}, "error": None}
+
+def completion(content='{"Box_1": {}}', finish_reason="stop"):
+    return {"choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": finish_reason}]}
+
+
+def test_only_complete_valid_responses_are_cacheable():
+    assert is_cacheable(record(completion()))
+    assert not is_cacheable(record(completion(), status_code=500))
+    assert not is_cacheable(record(completion(finish_reason="length")))
+    assert not is_cacheable(record(completion(content="not json")))
+    assert not is_cacheable(record(completion(content=None)))
+    assert not is_cacheable({**record(completion()), "from_cache": True})
+
+@pytest.mark.parametrize("body", [None, {}, {"choices": []}, {"choices": None}, {"choices": [{}]}, {"choices": [{"message": None}]}, "error"])
+def test_malformed_bodies_are_not_cacheable(body):
+    assert not is_cacheable(record(body))
+
+def test_rebuilt_run_replaces_the_cached_file(tmp_path):
+    path = write_cached_responses("run", [record(completion())], response_dir=str(tmp_path))
+    assert os.path.exists(path)
+
+    # Rebuilt without cache hits: the hits of the earlier run must not be merged into it
+    assert write_cached_responses("run", [], response_dir=str(tmp_path)) is None
+    assert not os.path.exists(path)
+
+def test_store_responses_skips_blank_lines(tmp_path):
+    request = {"custom_id": "request-1", "method": "POST", "url": "/v1/chat/completions", "body": {"model": "gpt-4o", "messages": []}}
+    (tmp_path / "run.jsonl").write_text(json.dumps(request) + "\n\n")
+    (tmp_path / "responses").mkdir()
+    (tmp_path / "responses" / "run.jsonl").write_text(json.dumps(record(completion())) + "\n\n")
+
+    connection = open_cache(str(tmp_path / "cache.sqlite"))
+    assert store_responses("run.jsonl", connection, input_dir=str(tmp_path), response_dir=str(tmp_path / "responses")) == 1
+    connection.close()